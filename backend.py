@@ -0,0 +1,408 @@
+"""Console backends.  The game draws to consoles and reads keys through the current backend, which is either the native
+libtcod library or an in-memory console with scripted input, which needs no display (or native library) at all.
+
+Backends have the same interface as the parts of libtcodpy they replace, eg backend.current.console_print(0, x, y, s),
+so that screens are written the same way for either.
+"""
+
+#
+# Imports
+#
+import libtcodpy as libtcod
+from common import *
+
+#
+# LibtcodBackend
+#
+class LibtcodBackend(object):
+    """Backend which draws with the native libtcod library."""
+
+    #
+    # __getattr__()
+    #
+    def __getattr__(self, name):
+        """Everything goes straight through to libtcodpy."""
+        return getattr(libtcod, name)
+
+#
+# MemoryConsole
+#
+class MemoryConsole(object):
+    """A console held in memory as grids of characters, foreground and background colours, indexed [y][x].  Colours are
+    stored as (r, g, b) tuples and characters as character codes."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, width, height):
+        """Create console, cleared to black.
+
+        Arguments:
+        width - width of console
+        height - height of console
+
+        """
+        self.width = width
+        self.height = height
+        self.default_fore = (255, 255, 255)
+        self.default_back = (0, 0, 0)
+        self.background_flag = libtcod.BKGND_NONE
+        self.clear()
+
+    #
+    # clear()
+    #
+    def clear(self):
+        """Clear every cell to a space, in the default colours."""
+        self.chars = [[ord(' ')] * self.width for y in range(self.height)]
+        self.fore = [[self.default_fore] * self.width for y in range(self.height)]
+        self.back = [[self.default_back] * self.width for y in range(self.height)]
+
+    #
+    # in_bounds()
+    #
+    def in_bounds(self, x, y):
+        """Whether a cell is on the console."""
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    #
+    # text()
+    #
+    def text(self):
+        """Get the characters on the console as a string, one line per row."""
+        return "\n".join("".join(chr(c) if 32 <= c < 127 else ' ' for c in row) for row in self.chars)
+
+#
+# MemoryImage
+#
+class MemoryImage(object):
+    """An image held in memory as (r, g, b) tuples, indexed [y][x]."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, width, height):
+        """Create image, cleared to black.
+
+        Arguments:
+        width - width of image, in pixels
+        height - height of image, in pixels
+
+        """
+        self.width = width
+        self.height = height
+        self.pixels = [[(0, 0, 0)] * width for y in range(height)]
+
+#
+# ScriptedInput
+#
+class ScriptedInput(object):
+    """A fixed sequence of key presses.  Keys are given as a string of space-separated names: single characters (eg
+    'g'), libtcod key names without the KEY_ prefix (eg 'UP', 'KP7', 'ESCAPE'), optionally with modifiers 'C-' (left
+    control), 'A-' (left alt) and 'S-' (shift), eg "UP UP C-o KP3 i ESCAPE ESCAPE".
+    """
+
+    #
+    # __init__()
+    #
+    def __init__(self, script = ""):
+        """Create input source.
+
+        Arguments:
+        script - keys to press, in order
+
+        """
+        self.keys = [self.parse_key(name) for name in script.split()]
+        self.position = 0
+
+    #
+    # parse_key()
+    #
+    @staticmethod
+    def parse_key(name):
+        """Parse one key name (see the class docstring).
+
+        Returns:
+        tuple of (vk, c, lalt, lctrl, shift)
+
+        """
+        lalt = lctrl = shift = False
+        while len(name) > 2 and name[1] == '-' and name[0] in "CAS":
+            lctrl = lctrl or name[0] == 'C'
+            lalt = lalt or name[0] == 'A'
+            shift = shift or name[0] == 'S'
+            name = name[2:]
+
+        if len(name) == 1:
+            return libtcod.KEY_CHAR, ord(name), lalt, lctrl, shift
+        vk = getattr(libtcod, "KEY_" + name.upper(), None)
+        if vk is None:
+            raise LogicException("Unknown key name '%s' in input script." % name)
+        return vk, 0, lalt, lctrl, shift
+
+    #
+    # finished
+    #
+    @property
+    def finished(self):
+        """Gets whether every key has been pressed."""
+        return self.position >= len(self.keys)
+
+    #
+    # next_key()
+    #
+    def next_key(self, key):
+        """Fill in a libtcod Key with the next key press.  Once the script is finished, this returns KEY_NONE.
+
+        Arguments:
+        key - the libtcod.Key to fill in
+
+        """
+        if self.finished:
+            vk, c, lalt, lctrl, shift = libtcod.KEY_NONE, 0, False, False, False
+        else:
+            vk, c, lalt, lctrl, shift = self.keys[self.position]
+            self.position += 1
+
+        key.vk, key.c, key.pressed = vk, c, vk != libtcod.KEY_NONE
+        key.lalt, key.lctrl, key.ralt, key.rctrl, key.shift = lalt, lctrl, False, False, shift
+
+#
+# HeadlessBackend
+#
+class HeadlessBackend(object):
+    """Backend which draws to MemoryConsoles and reads keys from a ScriptedInput.  The window counts as closed once the
+    script has run out, so the main loop ends by itself.  Only the console functions the game uses are provided.
+    """
+
+    #
+    # __init__()
+    #
+    def __init__(self, input = None):
+        """Create backend.  There is no root console until console_init_root() is called.
+
+        Arguments:
+        input - the ScriptedInput to read keys from.  Defaults to no keys at all.
+
+        """
+        self.input = input if input is not None else ScriptedInput()
+        self.consoles = {}      # console id -> MemoryConsole.  The root console is 0.
+        self.images = {}        # image id -> MemoryImage
+        self.next_id = 1
+        self.colour_controls = {}  # COLCTRL_n -> (fore, back)
+        self.frames = 0         # number of times console_flush() has been called
+        self.fullscreen = False
+
+    #
+    # root
+    #
+    @property
+    def root(self):
+        """Gets the root MemoryConsole."""
+        return self.consoles[0]
+
+    #
+    # _con()
+    #
+    def _con(self, con):
+        """Look up a console by id."""
+        return self.consoles[con]
+
+    #
+    # Setup
+    #
+    def console_set_custom_font(self, fontFile, flags = 0, nb_char_horiz = 0, nb_char_vertic = 0):
+        pass
+
+    def console_init_root(self, w, h, title, fullscreen = False, renderer = 0):
+        self.consoles[0] = MemoryConsole(w, h)
+        self.fullscreen = fullscreen
+
+    def sys_set_fps(self, fps):
+        pass
+
+    def console_is_window_closed(self):
+        return self.input.finished
+
+    def console_is_fullscreen(self):
+        return self.fullscreen
+
+    def console_set_fullscreen(self, fullscreen):
+        self.fullscreen = fullscreen
+
+    def console_flush(self):
+        self.frames += 1
+
+    #
+    # Off-screen consoles
+    #
+    def console_new(self, w, h):
+        con = self.next_id
+        self.next_id += 1
+        self.consoles[con] = MemoryConsole(w, h)
+        return con
+
+    def console_delete(self, con):
+        del self.consoles[con]
+
+    def console_blit(self, src, x, y, w, h, dst, xdst, ydst, ffade = 1.0, bfade = 1.0):
+        source, dest = self._con(src), self._con(dst)
+        w = w or source.width
+        h = h or source.height
+        for sy in range(max(0, y), min(source.height, y + h)):
+            dy = ydst + sy - y
+            for sx in range(max(0, x), min(source.width, x + w)):
+                dx = xdst + sx - x
+                if dest.in_bounds(dx, dy):
+                    dest.chars[dy][dx] = source.chars[sy][sx]
+                    dest.fore[dy][dx] = source.fore[sy][sx]
+                    dest.back[dy][dx] = source.back[sy][sx]
+
+    #
+    # Drawing
+    #
+    def console_set_default_foreground(self, con, col):
+        self._con(con).default_fore = (col.r, col.g, col.b)
+
+    def console_set_default_background(self, con, col):
+        self._con(con).default_back = (col.r, col.g, col.b)
+
+    def console_set_background_flag(self, con, flag):
+        self._con(con).background_flag = flag
+
+    def console_set_color_control(self, con, fore, back):
+        # Note that libtcod's first argument here is the control code, not a console.
+        self.colour_controls[con] = (fore.r, fore.g, fore.b), (back.r, back.g, back.b)
+
+    def console_clear(self, con):
+        self._con(con).clear()
+
+    def console_put_char(self, con, x, y, c, flag = libtcod.BKGND_DEFAULT):
+        console = self._con(con)
+        if console.in_bounds(x, y):
+            console.chars[y][x] = ord(c) if isinstance(c, str) else c
+            console.fore[y][x] = console.default_fore
+            if (console.background_flag if flag == libtcod.BKGND_DEFAULT else flag) != libtcod.BKGND_NONE:
+                console.back[y][x] = console.default_back
+
+    def console_put_char_ex(self, con, x, y, c, fore, back):
+        console = self._con(con)
+        if console.in_bounds(x, y):
+            console.chars[y][x] = ord(c) if isinstance(c, str) else c
+            console.fore[y][x] = fore.r, fore.g, fore.b
+            console.back[y][x] = back.r, back.g, back.b
+
+    def console_set_char_background(self, con, x, y, col, flag = libtcod.BKGND_SET):
+        console = self._con(con)
+        if console.in_bounds(x, y) and flag != libtcod.BKGND_NONE:
+            console.back[y][x] = col.r, col.g, col.b
+
+    def console_rect(self, con, x, y, w, h, clr, flag = libtcod.BKGND_DEFAULT):
+        console = self._con(con)
+        set_back = (console.background_flag if flag == libtcod.BKGND_DEFAULT else flag) != libtcod.BKGND_NONE
+        for cy in range(max(0, y), min(console.height, y + h)):
+            for cx in range(max(0, x), min(console.width, x + w)):
+                if clr:
+                    console.chars[cy][cx] = ord(' ')
+                if set_back:
+                    console.back[cy][cx] = console.default_back
+
+    def console_print(self, con, x, y, fmt):
+        """Print a string, left-aligned, handling the colour control codes."""
+        console = self._con(con)
+        fore, back = console.default_fore, console.default_back
+        set_back = console.background_flag != libtcod.BKGND_NONE
+        for ch in fmt:
+            code = ord(ch)
+            if libtcod.COLCTRL_1 <= code <= libtcod.COLCTRL_NUMBER:
+                fore, back = self.colour_controls.get(code, (fore, back))
+                set_back = True
+            elif code == libtcod.COLCTRL_STOP:
+                fore, back = console.default_fore, console.default_back
+                set_back = console.background_flag != libtcod.BKGND_NONE
+            else:
+                if console.in_bounds(x, y):
+                    console.chars[y][x] = code
+                    console.fore[y][x] = fore
+                    if set_back:
+                        console.back[y][x] = back
+                x += 1
+
+    #
+    # Bulk fills.  Arrays are row by row, as for libtcod.
+    #
+    def console_fill_foreground(self, con, r, g, b):
+        console = self._con(con)
+        colours = zip([int(v) for v in r], [int(v) for v in g], [int(v) for v in b])
+        for y in range(console.height):
+            console.fore[y] = colours[y * console.width:(y + 1) * console.width]
+
+    def console_fill_background(self, con, r, g, b):
+        console = self._con(con)
+        colours = zip([int(v) for v in r], [int(v) for v in g], [int(v) for v in b])
+        for y in range(console.height):
+            console.back[y] = colours[y * console.width:(y + 1) * console.width]
+
+    def console_fill_char(self, con, arr):
+        console = self._con(con)
+        chars = [ord(c) if isinstance(c, str) else int(c) for c in arr]
+        for y in range(console.height):
+            console.chars[y] = chars[y * console.width:(y + 1) * console.width]
+
+    #
+    # Images
+    #
+    def image_new(self, width, height):
+        image = self.next_id
+        self.next_id += 1
+        self.images[image] = MemoryImage(width, height)
+        return image
+
+    def image_delete(self, image):
+        del self.images[image]
+
+    def image_put_pixel(self, image, x, y, col):
+        img = self.images[image]
+        if 0 <= x < img.width and 0 <= y < img.height:
+            img.pixels[y][x] = col.r, col.g, col.b
+
+    def image_blit_2x(self, image, console, dx, dy, sx = 0, sy = 0, w = -1, h = -1):
+        """Draw an image at two pixels per cell each way.  Rather than picking subcell characters as libtcod does, each
+        cell is drawn as a space on the average colour of its four pixels."""
+        img, con = self.images[image], self._con(console)
+        w = img.width - sx if w < 0 else w
+        h = img.height - sy if h < 0 else h
+        for cy in range((h + 1) // 2):
+            for cx in range((w + 1) // 2):
+                x, y = dx + cx, dy + cy
+                if not con.in_bounds(x, y):
+                    continue
+                block = [img.pixels[py][px] for py in range(sy + cy * 2, min(sy + h, sy + cy * 2 + 2))
+                                            for px in range(sx + cx * 2, min(sx + w, sx + cx * 2 + 2))]
+                con.chars[y][x] = ord(' ')
+                con.back[y][x] = tuple(sum(p[i] for p in block) // len(block) for i in range(3))
+
+    #
+    # Input
+    #
+    def sys_wait_for_event(self, mask, k, m, flush):
+        self.input.next_key(k)
+        return libtcod.EVENT_KEY_PRESS if k.vk != libtcod.KEY_NONE else 0
+
+#
+# The backend in use.  Set this before creating any consoles.
+#
+current = LibtcodBackend()
+
+#
+# use()
+#
+def use(new_backend):
+    """Switch to a different backend.
+
+    Arguments:
+    new_backend - the backend to draw to and read input from from now on
+
+    """
+    global current
+    current = new_backend
@@ -9,11 +9,56 @@ INVENTORY_WINDOW = MAP_WINDOW
 MINIMAP_WINDOW = 1, 1, MAP_WINDOW[0] - 2, MAP_WINDOW[0] - 2
 MSG_WINDOW = SCREEN_WIDTH - SCREEN_HEIGHT, SCREEN_HEIGHT - 5, SCREEN_HEIGHT, 5
 
+#
+# How much remembered (seen but not visible) tiles are desaturated: 0 for full colour, 1 for greyscale.
+#
+MEMORY_DESATURATION = 0.7
+
+#
+# Number of messages kept in the message log (see message_log).
+#
+MESSAGE_HISTORY = 500
+
+#
+# Lighting (see lighting).  Light levels run from 0 (dark) to LIGHT_MAX (full colour).  AMBIENT_LIGHT is the level
+# everywhere before any light sources are added, and tiles beyond arm's reach darker than VISIBLE_LIGHT cannot be seen
+# even when in view.
+#
+LIGHT_MAX = 255
+AMBIENT_LIGHT = 48
+VISIBLE_LIGHT = 64
+
+#
+# Simulation timing (see sim).  Each of the player's turns is TURN_TICKS long, and an entity at NORMAL_SPEED takes one
+# action per turn.
+#
+TURN_TICKS = 100
+NORMAL_SPEED = 100
+
+#
+# Active zone (see sim.ActiveZone).  Entities further than ACTIVE_RADIUS from the player, and from any recent event, are
+# put to sleep.  Events keep the area around them active for EVENT_TICKS, and a sleeping entity catches up on at most
+# FAST_FORWARD_ACTIONS actions when it wakes.
+#
+ACTIVE_RADIUS = 30
+EVENT_TICKS = 10 * TURN_TICKS
+FAST_FORWARD_ACTIONS = 20
+
+#
+# How far a grunt wanders from its post - where it started - before heading back to it.
+#
+POST_RANGE = 8
+
 #
 # Program name
 #
 PROGRAM_NAME = "Citadel"
 
+#
+# Level generation.  Levels built with a given seed are cached in LEVEL_CACHE_DIR (see level_cache).
+#
+LEVEL_CACHE_DIR = "level_cache"
+
 #
 # Debug message
 #
@@ -26,6 +26,28 @@ class Door(Entity):
         self.blocks_sight = True
         self.blocks_move = True
  
+    #
+    # open()
+    #
+    def open(self):
+        """Open the door, without telling the player (eg when an NPC opens it)."""
+        self.closed = False
+        self.blocks_sight = False
+        self.blocks_move = False
+        self.char = '.'
+        self.tile_changed()
+
+    #
+    # close()
+    #
+    def close(self):
+        """Close the door, without telling the player."""
+        self.closed = True
+        self.blocks_sight = True
+        self.blocks_move = True
+        self.char = '+'
+        self.tile_changed()
+
     #
     # action_open()
     #
@@ -35,10 +57,7 @@ class Door(Entity):
             ui.Screens.msg.add_message("This door is already open.")
             return
 
-        self.closed = False
-        self.blocks_sight = False
-        self.blocks_move = False
-        self.char = '.'
+        self.open()
         ui.Screens.msg.add_message("You open the door.")
       
     #
@@ -50,10 +69,7 @@ class Door(Entity):
             ui.Screens.msg.add_message("This door is already closed.")
             return
 
-        self.closed = True
-        self.blocks_sight = True
-        self.blocks_move = True
-        self.char = '+'
+        self.close()
         ui.Screens.msg.add_message("You close the door.")
       
     #
@@ -66,6 +82,7 @@ class Door(Entity):
             return
       
         self.locked = True
+        self.tile_changed()
         ui.Screens.msg.add_message("You lock the door.")
       
     #
@@ -78,4 +95,5 @@ class Door(Entity):
             return
       
         self.locked = False
+        self.tile_changed()
         ui.Screens.msg.add_message("You unlock the door.")
@@ -133,3 +133,37 @@ class QuantumAnalyser(Entity):
         super(QuantumAnalyser, self).__init__("quantum analyser", EntityType.OTHER, '?', libtcod.white)
         self.blocks_move = False
         self.blocks_sight = False
+
+#
+# Lamp
+#
+class Lamp(Entity):
+    """Desk lamp.  Lights up the area around it, wherever it is put."""
+    
+    #
+    # __init__()
+    #
+    def __init__(self):
+        """Create lamp."""
+        super(Lamp, self).__init__("desk lamp", EntityType.OTHER, '!', libtcod.light_yellow)
+        self.blocks_move = False
+        self.blocks_sight = False
+        self.light_radius = 5
+        self.light_level = 220
+
+#
+# Torch
+#
+class Torch(Entity):
+    """Torch.  Lights up the area around whoever is carrying it."""
+    
+    #
+    # __init__()
+    #
+    def __init__(self):
+        """Create torch."""
+        super(Torch, self).__init__("torch", EntityType.OTHER, '|', libtcod.light_yellow)
+        self.blocks_move = False
+        self.blocks_sight = False
+        self.light_radius = 8
+        self.light_level = 255
@@ -5,6 +5,8 @@
 #
 import random
 import libtcodpy as libtcod
+from common import *
+from tile import TileType
 from human import Human
 
 #
@@ -21,10 +23,97 @@ class Grunt(Human):
         """
         super(Grunt, self).__init__("grunt", "male" if random.randint(0, 1) else "female", 10, 10)
         self.colour = libtcod.red
+        self.last_seen = None  # where the player was last seen, to search for them there
+        self.post = None       # where the grunt started, which it wanders near (see POST_RANGE)
         
     #
     # turn()
     #
     def turn(self):
-        pass
+        """Take a turn: head for the player if they can be seen (using the shared goal map, see goal_map), otherwise go to
+        where they were last seen (using the map's cached routes, see pathfinding), otherwise head back to the grunt's
+        post if it has strayed too far from it, otherwise wander to a random neighbouring tile, if nothing is in the way.
+        
+        Returns:
+        ticks the action took (see sim)
+        
+        """
+        map = self.owner
+        player = map.player
+        if self.post is None:
+            self.post = self.x, self.y
+        near = player is not None and player.owner is map and max(abs(player.x - self.x), abs(player.y - self.y)) <= self.view_radius
+        if near and map.can_see(self, player.x, player.y):
+            self.last_seen = player.x, player.y
+            step = map.goal_maps.approach_player().next_step(self.x, self.y)
+            if step is not None:
+                map.move_entity(self, step[0], step[1])
+            return TURN_TICKS
+
+        if self.last_seen is not None:
+            step = map.paths.next_step(self.x, self.y, self.last_seen[0], self.last_seen[1])
+            if step is None:
+                self.last_seen = None  # there, or no way there - give up
+            elif not map.tiles[step[0]][step[1]].blocks_movement:
+                map.move_entity(self, step[0], step[1])
+            return TURN_TICKS
+
+        if max(abs(self.post[0] - self.x), abs(self.post[1] - self.y)) > POST_RANGE:
+            self.return_to_post()
+        else:
+            self.wander()
+        return TURN_TICKS
+
+    #
+    # return_to_post()
+    #
+    def return_to_post(self):
+        """Take a step back towards the grunt's post.  When the post is nearby, or in the same room, the route is found
+        with the map's cached routes (see pathfinding), whose search only looks at the tiles around the way there.
+        Otherwise it may be across the level, so the route is found from room to room (see rooms), opening closed doors
+        on the way.  If there is no way back, the grunt wanders instead."""
+        map = self.owner
+        px, py = self.post
+        step = None
+        near = max(abs(px - self.x), abs(py - self.y)) <= 2 * POST_RANGE
+        if near or (map.rooms is not None and map.rooms.same_room(self.x, self.y, px, py)):
+            step = map.paths.next_step(self.x, self.y, px, py)
+        if step is None:
+            step = map.room_graph().next_step(self.x, self.y, px, py)
+        if step is None:
+            self.wander()
+            return
+
+        tile = map.tiles[step[0]][step[1]]
+        if tile.type == TileType.DOOR and tile.door.closed:
+            tile.door.open()
+        elif not tile.blocks_movement:
+            map.move_entity(self, step[0], step[1])
+
+    #
+    # wander()
+    #
+    def wander(self):
+        """Move to a random neighbouring tile, if nothing is in the way."""
+        map = self.owner
+        dx, dy = random.randint(-1, 1), random.randint(-1, 1)
+        x, y = self.x + dx, self.y + dy
+        if (dx or dy) and 0 <= x < map.x_max and 0 <= y < map.y_max and not map.tiles[x][y].blocks_movement:
+            map.move_entity(self, x, y)
+
+    #
+    # fast_forward()
+    #
+    def fast_forward(self, actions):
+        """Catch up on actions missed while asleep (see sim.ActiveZone).  Asleep, the grunt is away from the player and
+        anything else of interest, so it is taken to have been wandering.  Wandering has no lasting effect, so only the
+        last few steps are taken, to leave the grunt somewhere near where a full simulation might have.  The player is
+        not looked for, or chased, until the grunt's next real turn.
+        
+        Arguments:
+        actions - number of actions missed
+        
+        """
+        for i in range(min(actions, FAST_FORWARD_ACTIONS)):
+            self.wander()
         
\ No newline at end of file
@@ -4,6 +4,7 @@
 # Imports
 #
 import libtcodpy as libtcod
+from common import *
 from entity import Entity, ReportType
 from inventory import Inventory
 import entity_actions as ea
@@ -31,6 +32,7 @@ class Human(Entity):
 
         self.gender = gender
         self.view_radius = view_radius
+        self.speed = NORMAL_SPEED  # how quickly they act (see sim)
         self.inventory = Inventory(inventory_size)
         
         self.report = ReportType.VISIBLE_NPC
@@ -24,6 +24,10 @@ class Window(Entity):
         self.closed = True
         self.blocks_sight = False
         self.blocks_move = True
+
+        # Daylight comes in through windows.
+        self.light_radius = 6
+        self.light_level = 200
 	
     #
     # action_open()
@@ -37,6 +41,7 @@ class Window(Entity):
         self.closed = False
         self.blocks_move = False
         self.char = '*'
+        self.tile_changed()
         ui.Screens.msg.add_message("You open the window.")
         
     #
@@ -51,4 +56,5 @@ class Window(Entity):
         self.closed = True
         self.blocks_move = True
         self.char = libtcod.CHAR_CHECKBOX_UNSET
+        self.tile_changed()
         ui.Screens.msg.add_message("You close the window.")
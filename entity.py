@@ -3,6 +3,7 @@
 #
 # Imports
 #
+import itertools
 import libtcodpy as libtcod
 from common import *
 import ui
@@ -34,6 +35,8 @@ ReportType = enum(
 class Entity(object):
     """Base entity.  Used for all entities, and only contains the most basic attributes."""
 
+    _ids = itertools.count(1)  # source of unique entity ids
+
     #
     # __init__()
     #
@@ -47,6 +50,7 @@ class Entity(object):
         colour - the colour to print the character in
         
         """
+        self.id = next(Entity._ids)
         self.name = name
         self.type = type
         self.x = -1
@@ -55,9 +59,19 @@ class Entity(object):
         self.colour = colour
         self.blocks_move = True
         self.blocks_sight = False
+        self.light_radius = 0  # radius of the light given off, or 0 if this entity is not a light source
+        self.light_level = 0   # light level at the source, fading to nothing at light_radius + 1 (see lighting)
         self.owner = None
         self.report = ReportType.NONE # don't print messages on actions
 
+    #
+    # __setstate__()
+    #
+    def __setstate__(self, state):
+        """Restore a pickled entity.  It is given a new id, as ids are only unique within a run."""
+        self.__dict__.update(state)
+        self.id = next(Entity._ids)
+
     #
     # indef_name
     #
@@ -77,6 +91,14 @@ class Entity(object):
         """Get the definite name, ie 'the' object."""
         return "the " + self.name
     
+    #
+    # tile_changed()
+    #
+    def tile_changed(self):
+        """Tell the map this entity is on that its tile's sight or movement blocking may have changed."""
+        if self.owner is not None and hasattr(self.owner, "update_tile"):
+            self.owner.update_tile(self.x, self.y)
+
     #
     # add_message()
     #
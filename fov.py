@@ -0,0 +1,253 @@
+"""Field of view.  A pure-Python implementation of symmetric shadowcasting, which works directly on a map's transparency
+data and so does not need the native libtcod library."""
+
+#
+# Imports
+#
+from common import *
+
+try:  # NumPy is optional - if it is available, visibility is returned as a boolean array
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+#
+# FovEngine
+#
+FovEngine = enum(
+    LIBTCOD    = 0,
+    SHADOWCAST = 1
+)
+
+#
+# Quadrant transforms.  For each of the four quadrants (north, east, south, west), a tile at (depth, col) relative to the
+# origin is transformed to world offsets as (col * xx + depth * xy, col * yx + depth * yy).
+#
+QUADRANTS = (
+    ( 1,  0,  0, -1),  # north
+    ( 0,  1,  1,  0),  # east
+    ( 1,  0,  0,  1),  # south
+    ( 0, -1,  1,  0),  # west
+)
+
+#
+# new_visibility_array()
+#
+def new_visibility_array(x_max, y_max):
+    """Create an array of booleans, all False, indexed as [x][y].  This is a NumPy array if NumPy is available,
+    otherwise a jagged list.
+
+    Arguments:
+    x_max - max x-dimension of map
+    y_max - max y-dimension of map
+
+    """
+    if numpy_available:
+        return numpy.zeros((x_max, y_max), dtype = numpy.bool_)
+    else:
+        return [[False] * y_max for x in range(x_max)]
+
+#
+# FovResult
+#
+class FovResult(object):
+    """What a viewer can see.  Only the square window of the map within the view radius is stored, so a result takes
+    the same memory however big the map is.  Tiles outside the window are not visible.
+    """
+
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'visible')
+
+    #
+    # __init__()
+    #
+    def __init__(self, x0, y0, x1, y1):
+        """Create a result with nothing visible.
+
+        Arguments:
+        x0, y0, x1, y1 - window of the map covered (x1 and y1 exclusive)
+
+        """
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = max(x0, x1)
+        self.y1 = max(y0, y1)
+        self.visible = new_visibility_array(self.x1 - x0, self.y1 - y0)  # indexed [x][y] relative to (x0, y0)
+
+    #
+    # is_visible()
+    #
+    def is_visible(self, x, y):
+        """Whether a tile is visible."""
+        return self.x0 <= x < self.x1 and self.y0 <= y < self.y1 and bool(self.visible[x - self.x0][y - self.y0])
+
+    #
+    # region()
+    #
+    def region(self, x0, y0, x1, y1):
+        """Get the visibility of a region of the map, which need not be inside the window.
+
+        Arguments:
+        x0, y0, x1, y1 - region of the map (x1 and y1 exclusive)
+
+        Returns:
+        array of booleans indexed [x][y] relative to (x0, y0) (see new_visibility_array())
+
+        """
+        region = new_visibility_array(x1 - x0, y1 - y0)
+        ix0, iy0 = max(x0, self.x0), max(y0, self.y0)
+        ix1, iy1 = min(x1, self.x1), min(y1, self.y1)
+        if ix0 >= ix1 or iy0 >= iy1:
+            return region
+
+        if numpy_available and isinstance(self.visible, numpy.ndarray):
+            region[ix0 - x0:ix1 - x0, iy0 - y0:iy1 - y0] = self.visible[ix0 - self.x0:ix1 - self.x0, iy0 - self.y0:iy1 - self.y0]
+        else:
+            for x in range(ix0, ix1):
+                region[x - x0][iy0 - y0:iy1 - y0] = self.visible[x - self.x0][iy0 - self.y0:iy1 - self.y0]
+        return region
+
+    #
+    # cells()
+    #
+    def cells(self):
+        """Get the visible tiles.
+
+        Returns:
+        list of (x, y), ordered by x then y
+
+        """
+        if numpy_available and isinstance(self.visible, numpy.ndarray):
+            xs, ys = numpy.nonzero(self.visible)
+            return zip((xs + self.x0).tolist(), (ys + self.y0).tolist())
+        return [(self.x0 + x, self.y0 + y) for x, column in enumerate(self.visible) for y, v in enumerate(column) if v]
+
+#
+# fov_window()
+#
+def fov_window(x_max, y_max, ox, oy, radius):
+    """Get the window of the map a viewer might see: the square around them within their view radius, clipped to the
+    map, or the whole map if the radius is unlimited.
+
+    Arguments:
+    x_max - max x-dimension of map
+    y_max - max y-dimension of map
+    ox - x-position of viewer
+    oy - y-position of viewer
+    radius - view radius, or 0 for unlimited
+
+    Returns:
+    tuple of (x0, y0, x1, y1), x1 and y1 exclusive
+
+    """
+    if radius > 0:
+        return max(0, ox - radius), max(0, oy - radius), min(x_max, ox + radius + 1), min(y_max, oy + radius + 1)
+    return 0, 0, x_max, y_max
+
+#
+# compute_fov()
+#
+def compute_fov(transparent, x_max, y_max, ox, oy, radius):
+    """Compute field of view using symmetric shadowcasting.  Walls are lit, and visibility is symmetric: if A can see B
+    then B can see A.  Slopes are kept as integer fractions so that the result is exact.
+
+    Arguments:
+    transparent - array of booleans indexed [x][y], True where the tile does not block sight
+    x_max - max x-dimension of map
+    y_max - max y-dimension of map
+    ox - x-position of viewer
+    oy - y-position of viewer
+    radius - view radius, or 0 for unlimited
+
+    Returns:
+    FovResult covering the viewer's window of the map (see fov_window())
+
+    """
+    result = FovResult(*fov_window(x_max, y_max, ox, oy, radius))
+    for x, y in visible_cells(transparent, x_max, y_max, ox, oy, radius):
+        result.visible[x - result.x0][y - result.y0] = True
+
+    return result
+
+#
+# visible_cells()
+#
+def visible_cells(transparent, x_max, y_max, ox, oy, radius):
+    """Compute field of view as a set of cells, rather than an array covering the whole map.  Used where only the
+    neighbourhood of the viewer is wanted, eg lighting.
+
+    Arguments:
+    transparent - array of booleans indexed [x][y], True where the tile does not block sight, or ChunkedFlags (see
+                  tile_chunks)
+    x_max - max x-dimension of map
+    y_max - max y-dimension of map
+    ox - x-position of viewer
+    oy - y-position of viewer
+    radius - view radius, or 0 for unlimited
+
+    Returns:
+    set of (x, y) of the visible tiles
+
+    """
+    if ox < 0 or ox >= x_max or oy < 0 or oy >= y_max:
+        return set()
+
+    # Work on a window of the map around the viewer as plain lists, which are much quicker to index than NumPy
+    # arrays from Python.
+    x0, y0, x1, y1 = fov_window(x_max, y_max, ox, oy, radius)
+    max_depth = radius if radius > 0 else max(x_max, y_max)
+
+    if numpy_available and isinstance(transparent, numpy.ndarray):
+        window = transparent[x0:x1, y0:y1].tolist()
+    elif hasattr(transparent, "window"):
+        window = transparent.window(x0, y0, x1, y1)
+    else:
+        window = [column[y0:y1] for column in transparent[x0:x1]]
+
+    width = x1 - x0
+    height = y1 - y0
+    wx = ox - x0
+    wy = oy - y0
+    radius_sq = radius * radius
+
+    lit = set()
+    lit.add((wx, wy))
+
+    for xx, xy, yx, yy in QUADRANTS:
+        # Each row to scan is (depth, start slope numerator, start slope denominator, end numerator, end denominator)
+        rows = [(1, -1, 1, 1, 1)]
+        while rows:
+            depth, start_num, start_den, end_num, end_den = rows.pop()
+            if depth > max_depth:
+                continue
+
+            # Columns covered by this row, rounding ties towards the centre of the row.
+            min_col = (2 * depth * start_num + start_den) // (2 * start_den)
+            max_col = -((end_den - 2 * depth * end_num) // (2 * end_den))
+
+            prev_wall = None
+            for col in range(min_col, max_col + 1):
+                x = wx + col * xx + depth * xy
+                y = wy + col * yx + depth * yy
+
+                inside = 0 <= x < width and 0 <= y < height
+                wall = not inside or not window[x][y]
+
+                # Reveal walls, and floors which are symmetrically visible.
+                if inside and (radius_sq == 0 or (x - wx) * (x - wx) + (y - wy) * (y - wy) <= radius_sq):
+                    if wall or (col * start_den >= depth * start_num and col * end_den <= depth * end_num):
+                        lit.add((x, y))
+
+                if prev_wall is not None:
+                    if prev_wall and not wall:
+                        # Leaving a wall - this row's visible section now starts at the tile's left edge.
+                        start_num, start_den = 2 * col - 1, 2 * depth
+                    elif not prev_wall and wall:
+                        # Entering a wall - scan the next row up to this tile's left edge.
+                        rows.append((depth + 1, start_num, start_den, 2 * col - 1, 2 * depth))
+                prev_wall = wall
+
+            if prev_wall is not None and not prev_wall:
+                rows.append((depth + 1, start_num, start_den, end_num, end_den))
+
+    return set((x0 + x, y0 + y) for x, y in lit)
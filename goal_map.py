@@ -0,0 +1,176 @@
+"""Goal maps (also known as Dijkstra maps).  A goal map holds, for every tile within range, the number of steps to the
+nearest of a set of goals, eg the player.  It is worked out once and shared by every NPC, each of which then finds its
+next step by looking at its neighbours' distances - O(1) per NPC, however many there are.  A goal map is only worked out
+again when its goals move or the map's passability changes (see Map.passage_revision).
+
+Goal maps are worked out in Python, only as far as GOAL_MAP_RANGE steps from the goals.  Diagonal steps may not cut the
+corner of an impassable tile, as with the player's movement and pathfinding.astar() - libtcod's Dijkstra pathfinder
+cannot be told this, so it is not used.
+"""
+
+#
+# Imports
+#
+import heapq
+from common import *
+
+#
+# How many steps from its goals a goal map reaches.  NPCs further away than this get no step.
+#
+GOAL_MAP_RANGE = 40
+
+#
+# Neighbouring steps, straight and diagonal.  Both cost one step, as they take one move.
+#
+NEIGHBOURS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+#
+# GoalMap
+#
+class GoalMap(object):
+    """Distances to a set of goals."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, map, max_distance = GOAL_MAP_RANGE):
+        """Create empty goal map.  Nothing is worked out until update() is called.
+
+        Arguments:
+        map - the map to work on
+        max_distance - how far from the goals to work distances out
+
+        """
+        self.map = map
+        self.max_distance = max_distance
+        self.key = None       # (goals, passage revision) the distances were worked out for
+        self.distances = {}   # (x, y) -> distance
+
+    #
+    # update()
+    #
+    def update(self, goals):
+        """Work the distances out again if the goals or the map's passability have changed.
+
+        Arguments:
+        goals - sequence of (x, y) goal positions
+
+        Returns:
+        whether the distances were worked out again
+
+        """
+        key = tuple(goals), self.map.passage_revision
+        if key == self.key:
+            return False
+        self.key = key
+        self.distances = self.relax([(0, x, y) for x, y in key[0]], self.max_distance)
+        return True
+
+    #
+    # relax()
+    #
+    def relax(self, seeds, limit):
+        """Dijkstra's algorithm over the passable tiles of the map, from seeds with starting values.  Diagonal steps may
+        not cut corners.
+
+        Arguments:
+        seeds - list of (value, x, y)
+        limit - don't go further than this value
+
+        Returns:
+        dictionary of (x, y) -> lowest value reached
+
+        """
+        passable = self.map.passable
+        x_max, y_max = self.map.x_max, self.map.y_max
+        distances = {}
+        heap = list(seeds)
+        heapq.heapify(heap)
+        while heap:
+            value, x, y = heapq.heappop(heap)
+            if (x, y) in distances:
+                continue
+            distances[(x, y)] = value
+            if value + 1 > limit:
+                continue
+            for dx, dy in NEIGHBOURS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < x_max and 0 <= ny < y_max) or not passable[nx][ny] or (nx, ny) in distances:
+                    continue
+                if dx and dy and not (passable[x][ny] and passable[nx][y]):
+                    continue
+                heapq.heappush(heap, (value + 1, nx, ny))
+        return distances
+
+    #
+    # distance()
+    #
+    def distance(self, x, y):
+        """Get the distance from a tile to the nearest goal.
+
+        Returns:
+        distance, or None if the goals cannot be reached or the tile is out of range
+
+        """
+        return self.distances.get((x, y))
+
+    #
+    # next_step()
+    #
+    def next_step(self, x, y):
+        """Get the best step from a tile towards the goals: the neighbour with the lowest distance, if it is lower than
+        the tile's own and nothing (eg another NPC) is standing in it.  Diagonal steps may not cut corners.
+
+        Arguments:
+        x - x-position of the tile
+        y - y-position of the tile
+
+        Returns:
+        (x, y) of the step, or None if there is no better tile to step to
+
+        """
+        best = self.distance(x, y)
+        if best is None:
+            return None
+
+        step = None
+        tiles = self.map.tiles
+        passable = self.map.passable
+        for dx, dy in NEIGHBOURS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.map.x_max and 0 <= ny < self.map.y_max:
+                distance = self.distance(nx, ny)
+                if distance is None or distance >= best or tiles[nx][ny].blocks_movement:
+                    continue
+                if dx and dy and not (passable[x][ny] and passable[nx][y]):
+                    continue
+                best, step = distance, (nx, ny)
+        return step
+
+#
+# GoalMaps
+#
+class GoalMaps(object):
+    """The goal maps of a map, shared by all its NPCs.  Each is kept up to date as it is asked for, so it costs nothing
+    when no NPC needs it, and at most one update per change however many NPCs use it."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, map):
+        """Create goal maps for a map.
+
+        Arguments:
+        map - the map
+
+        """
+        self.map = map
+        self.approach_map = GoalMap(map)
+
+    #
+    # approach_player()
+    #
+    def approach_player(self):
+        """Get the goal map for approaching the player (see Map.player)."""
+        self.approach_map.update([(self.map.player.x, self.map.player.y)])
+        return self.approach_map
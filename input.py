@@ -4,6 +4,8 @@
 # Imports
 #
 import libtcodpy as libtcod
+import backend
+import profiler
 from common import *
 import player_actions as pa
 import ui
@@ -89,11 +91,19 @@ def handle_input(entity, input_type, delayed_action):
     mouse = libtcod.Mouse()
 
     # We currently ignore mouse events.
-    event_type = libtcod.sys_wait_for_event(libtcod.EVENT_KEY_PRESS, key, mouse, True)
+    event_type = backend.current.sys_wait_for_event(libtcod.EVENT_KEY_PRESS, key, mouse, True)
  
     # Do we want to toggle fullscreen?
     if key.vk == libtcod.KEY_ENTER and key.lalt:
-        libtcod.console_set_fullscreen(not libtcod.console_is_fullscreen())
+        backend.current.console_set_fullscreen(not backend.current.console_is_fullscreen())
+        ui.invalidate_all()
+        return [pa.action_none, input_type, delayed_action]
+
+    # Do we want to toggle the profiling overlay?
+    if key.vk == libtcod.KEY_F3:
+        profiler.current.enable()
+        profiler.current.show_overlay = not profiler.current.show_overlay
+        ui.invalidate_all()
         return [pa.action_none, input_type, delayed_action]
     
     if input_type == InputType.IMMEDIATE:
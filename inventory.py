@@ -27,6 +27,7 @@ class Inventory:
         self.cur_capacity = 0
         self.max_capacity = max_capacity
         self.items = []
+        self.revision = 0  # incremented whenever items are added or removed, so views of the inventory can be updated
 
     #
     # __iter__()
@@ -70,6 +71,7 @@ class Inventory:
         TODO: check we have enough capacity!
         """
         self.items.append(item)
+        self.revision += 1
         
     #
     # remove_item()
@@ -82,6 +84,7 @@ class Inventory:
         
         """
         self.items.remove(item)
+        self.revision += 1
 #
 # InventoryIterator
 #        
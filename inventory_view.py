@@ -0,0 +1,91 @@
+"""View model for showing an inventory.  Items are grouped into sections by EntityType and given a selection character
+in one pass, and which items each action (use, drop, etc) applies to is worked out once per action.  A view is only
+rebuilt when its inventory changes (see Inventory.revision).
+"""
+
+#
+# Imports
+#
+from common import *
+from entity import EntityType
+
+#
+# Sections shown, in order: (EntityType, heading, column).  Column 0 is on the left, 1 on the right.
+#
+INVENTORY_SECTIONS = (
+    (EntityType.WEAPON,     "WEAPONS",     0),
+    (EntityType.CLOTHING,   "CLOTHING",    1),
+    (EntityType.COMESTIBLE, "COMESTIBLES", 0),
+    (EntityType.MEDECINE,   "MEDECINE",    1),
+    (EntityType.OTHER,      "OTHER",       0)
+)
+
+#
+# Characters used to select items, in order.  Items beyond these cannot be selected.
+#
+ITEM_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+#
+# InventoryView
+#
+class InventoryView(object):
+    """Sections of an inventory, ready to be drawn."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, inventory):
+        """Build the view.
+
+        Arguments:
+        inventory - the Inventory to show
+
+        """
+        self.inventory = inventory
+        self.revision = inventory.revision
+        self.eligible = {}  # action name -> set of ids of the items it applies to
+
+        # Group items by type in one pass, keeping their order within each type
+        groups = dict((type, []) for type, name, column in INVENTORY_SECTIONS)
+        for item in inventory.items:
+            if item.type in groups:
+                groups[item.type].append(item)
+
+        # Hand out selection characters in section order
+        self.sections = []         # (heading, column, list of (char, item)).  char is None once ITEM_CHARS run out.
+        self.char_entity_map = {}  # character code -> item
+        index = 0
+        for type, name, column in INVENTORY_SECTIONS:
+            entries = []
+            for item in groups[type]:
+                char = ITEM_CHARS[index] if index < len(ITEM_CHARS) else None
+                if char is not None:
+                    self.char_entity_map[ord(char)] = item
+                entries.append((char, item))
+                index += 1
+            self.sections.append((name, column, entries))
+
+    #
+    # current
+    #
+    @property
+    def current(self):
+        """Gets whether the view still matches its inventory."""
+        return self.revision == self.inventory.revision
+
+    #
+    # applies()
+    #
+    def applies(self, item, action):
+        """Whether an action can be performed on an item, ie whether it has an <action>_me method.
+
+        Arguments:
+        item - item in the inventory
+        action - action name, eg "drop"
+
+        """
+        ids = self.eligible.get(action)
+        if ids is None:
+            func = action.lower() + "_me"
+            ids = self.eligible[action] = set(i.id for i in self.inventory.items if hasattr(i, func))
+        return item.id in ids
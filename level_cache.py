@@ -0,0 +1,265 @@
+"""Compiled level cache.  The first time a level function is run with a given seed, the resulting map is written out in
+a packed binary format, and loaded directly on later runs.  The cache is invalidated automatically when the level
+function's source, any file it was built from (see Map.source_files), the code that builds levels and the objects
+stored in them (see BUILD_SOURCES) or the tile definitions change.
+
+File layout:
+    header - magic, format version, map size, entry point, default tile definition, length of each section below
+    dependencies - pickled (files the level was built from, list of (path, SHA-1) of everything the level depends on)
+    tiles - TileDef index per cell (uint16, x-major), then a seen flag per cell
+    objects - pickled list of (x, y, name, object) for doors and windows
+    entities - pickled list of (is_inventory, entity) for entities on the map, and the RNG state after building
+Everything after the header is zlib-compressed per section.
+"""
+
+#
+# Imports
+#
+import os
+import glob
+import array
+import hashlib
+import inspect
+import random
+import struct
+import zlib
+import cPickle as pickle
+from cStringIO import StringIO
+from common import *
+from tile import Tile, TileDef
+from tile_grid import TileGrid
+
+try:  # NumPy is optional - it is needed to load levels into array storage
+    import numpy
+except ImportError:
+    pass
+
+#
+# Format identification.  Bump FORMAT_VERSION whenever the layout changes - changes to the classes of pickled
+# objects are picked up from their source files (see BUILD_SOURCES).
+#
+MAGIC = "CTDL"
+FORMAT_VERSION = 4
+HEADER = struct.Struct("<4sHIIiiHIIII")
+
+#
+# Source files, relative to this module, of the code that builds levels and of the objects pickled into the cache.  Like
+# the level function's own source file, any change to them invalidates cached levels.
+#
+BUILD_SOURCES = ["mapgen.py", "entity.py", "inventory.py", os.path.join("entities", "*.py")]
+
+#
+# cache_path()
+#
+def cache_path(cache_dir, level_func, seed):
+    """Get the cache file name for a level function and seed."""
+    return os.path.join(cache_dir, "%s.%s.%d.lvl" % (level_func.__module__, level_func.__name__, seed))
+
+#
+# file_hash()
+#
+def file_hash(path):
+    """Get the SHA-1 of a file's contents, or None if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except IOError:
+        return None
+
+#
+# tile_defs_hash()
+#
+def tile_defs_hash():
+    """Get a hash of every TileDef, as the cache stores tiles as indices into TileDef.all."""
+    signature = [(d.type, str(d.char), d.fcolour.r, d.fcolour.g, d.fcolour.b, d.bcolour.r, d.bcolour.g, d.bcolour.b,
+                  d.block_sight, d.block_move) for d in TileDef.all]
+    return hashlib.sha1(repr(signature)).hexdigest()
+
+#
+# build_sources()
+#
+def build_sources():
+    """Get the paths of the BUILD_SOURCES, in a fixed order."""
+    base = os.path.dirname(os.path.abspath(__file__))
+    paths = []
+    for pattern in BUILD_SOURCES:
+        paths.extend(sorted(glob.glob(os.path.join(base, pattern))))
+    return paths
+
+#
+# dependencies()
+#
+def dependencies(map, level_func):
+    """Get the list of (path, hash) that a cached level depends on: the level function's source file, the files it was
+    built from and the BUILD_SOURCES, plus the tile definitions.
+    """
+    paths = [inspect.getsourcefile(level_func)] + map.source_files + build_sources()
+    return [(path, file_hash(path)) for path in paths] + [("<tile definitions>", tile_defs_hash())]
+
+#
+# _pickle()
+#
+def _pickle(obj, map):
+    """Pickle an object, replacing references to the map with a placeholder (see _unpickle())."""
+    buf = StringIO()
+    pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = lambda o: "map" if o is map else None
+    pickler.dump(obj)
+    return buf.getvalue()
+
+#
+# _unpickle()
+#
+def _unpickle(data, map):
+    """Unpickle an object written by _pickle(), pointing map references at the given map."""
+    unpickler = pickle.Unpickler(StringIO(data))
+    unpickler.persistent_load = lambda pid: map
+    return unpickler.load()
+
+#
+# save()
+#
+def save(map, level_func, seed, cache_dir):
+    """Write a freshly built map to the cache.  This should be called before the game has changed the map.
+
+    Arguments:
+    map - the map, as built by level_func
+    level_func - function used to build the map
+    seed - seed the map was built with
+    cache_dir - directory to write to
+
+    """
+    x_max, y_max = map.x_max, map.y_max
+
+    # Tiles
+    tdefs = array.array('H')
+    seen = bytearray(x_max * y_max)
+    if isinstance(map.tiles, TileGrid):
+        tdefs.fromstring(map.tiles.tdef.astype('<u2').tostring())
+        seen = bytearray(map.tiles.seen.tostring())
+    else:
+        for x in range(x_max):
+            for y in range(y_max):
+                tile = map.tiles[x][y]
+                tdefs.append(tile.tdef.index)
+                if tile.seen:
+                    seen[x * y_max + y] = 1
+
+    # Doors and windows
+    if hasattr(map.tiles, "objects"):
+        cells = sorted(map.tiles.objects)
+    else:
+        cells = ((x, y) for x in range(x_max) for y in range(y_max))
+    objects = []
+    for x, y in cells:
+        tile = map.tiles[x][y]
+        for name in ("door", "window"):
+            obj = getattr(tile, name, None)
+            if obj is not None:
+                objects.append((x, y, name, obj))
+
+    # Entities, in the order they were added
+    entities = [(map.tiles[e.x][e.y].inventory is e, e) for e in map.entities]
+
+    deps = map.source_files, dependencies(map, level_func)
+    sections = [zlib.compress(pickle.dumps(deps, pickle.HIGHEST_PROTOCOL)),
+                zlib.compress(tdefs.tostring() + str(seen)),
+                zlib.compress(_pickle(objects, map)),
+                zlib.compress(_pickle((entities, random.getstate()), map))]
+
+    default_tdef = getattr(map.tiles, "default_tdef", None)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, x_max, y_max, map.entry_point[0], map.entry_point[1],
+                         default_tdef.index if default_tdef else 0, *[len(s) for s in sections])
+
+    # Write to a temporary file first, so that an interrupted write never leaves a corrupt cache behind.
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    path = cache_path(cache_dir, level_func, seed)
+    with open(path + ".tmp", "wb") as f:
+        f.write(header)
+        for section in sections:
+            f.write(section)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(path + ".tmp", path)
+
+#
+# load()
+#
+def load(map, level_func, seed, cache_dir):
+    """Try to build a map from the cache.
+
+    Arguments:
+    map - the (empty) map to build
+    level_func - function the map would be built with
+    seed - seed the map would be built with
+    cache_dir - directory to read from
+
+    Returns:
+    True if the map was loaded, False if there is no up-to-date cache entry (in which case the map is untouched).
+
+    """
+    path = cache_path(cache_dir, level_func, seed)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except IOError:
+        return False
+
+    if len(data) < HEADER.size:
+        return False
+    header = HEADER.unpack_from(data)
+    magic, version, x_max, y_max, entry_x, entry_y, default_index = header[:7]
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return False
+
+    sections = []
+    offset = HEADER.size
+    for length in header[7:]:
+        sections.append(data[offset:offset + length])
+        offset += length
+
+    # Check nothing the level was built from has changed.
+    source_files, deps = pickle.loads(zlib.decompress(sections[0]))
+    map.source_files = source_files
+    if deps != dependencies(map, level_func):
+        map.source_files = []
+        return False
+
+    # Tiles
+    map.set_size(x_max, y_max, TileDef.all[default_index])
+    map.entry_point = entry_x, entry_y
+    map.source_files = source_files
+
+    tile_data = zlib.decompress(sections[1])
+    tdefs = array.array('H')
+    tdefs.fromstring(tile_data[:x_max * y_max * 2])
+    seen = bytearray(tile_data[x_max * y_max * 2:])
+    if isinstance(map.tiles, TileGrid):
+        map.tiles.tdef[:] = numpy.frombuffer(tdefs.tostring(), dtype = '<u2').reshape(x_max, y_max)
+        map.tiles.seen[:] = numpy.frombuffer(str(seen), dtype = numpy.bool_).reshape(x_max, y_max)
+    else:
+        default_tdef = getattr(map.tiles, "default_tdef", None)
+        for x in range(x_max):
+            for y in range(y_max):
+                i = x * y_max + y
+                tdef = TileDef.all[tdefs[i]]
+                if tdef is not default_tdef or seen[i]:
+                    tile = Tile(tdef)
+                    tile.seen = seen[i] != 0
+                    map.tiles[x][y] = tile
+
+    for x, y, name, obj in _unpickle(zlib.decompress(sections[2]), map):
+        setattr(map.tiles[x][y], name, obj)
+
+    # Entities
+    entities, random_state = _unpickle(zlib.decompress(sections[3]), map)
+    for is_inventory, entity in entities:
+        if is_inventory:
+            map.add_entity_as_inventory(entity.x, entity.y, entity)
+        else:
+            map.add_entity(entity.x, entity.y, entity)
+
+    # Leave the RNG as it would have been after building the level.
+    random.setstate(random_state)
+    return True
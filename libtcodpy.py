@@ -39,41 +39,60 @@ try:  #import NumPy if available
 except ImportError:
     numpy_available = False
 
+# Stand-in for the native library when it cannot be loaded, eg on a machine with no display.  Constants, Color, Key
+# etc still work, but calling into the library raises an error.  See backend.HeadlessBackend for running without it.
+class _MissingFunction(object):
+    def __init__(self, name):
+        self.name = name
+    def __call__(self, *args):
+        raise RuntimeError("libtcod native library is not available (called %s)" % self.name)
+
+class _MissingLibrary(object):
+    def __getattr__(self, name):
+        func = _MissingFunction(name)
+        setattr(self, name, func)
+        return func
+
 LINUX=False
 MAC=False
 MINGW=False
 MSVC=False
-if sys.platform.find('linux') != -1:
-    _lib = ctypes.cdll['./libtcod.so']
-    LINUX=True
-elif sys.platform.find('darwin') != -1:
-    _lib = ctypes.cdll['./libtcod.dylib']
-    MAC = True
-elif sys.platform.find('haiku') != -1:
-    _lib = ctypes.cdll['./libtcod.so']
-    HAIKU = True
-else:
-    try:
-        _lib = ctypes.cdll['./libtcod-mingw.dll']
-        MINGW=True
-    except WindowsError:
-        _lib = ctypes.cdll['./libtcod-VS.dll']
-        MSVC=True
-    # On Windows, ctypes doesn't work well with function returning structs,
-    # so we have to user the _wrapper functions instead
-    _lib.TCOD_color_multiply = _lib.TCOD_color_multiply_wrapper
-    _lib.TCOD_color_add = _lib.TCOD_color_add_wrapper
-    _lib.TCOD_color_multiply_scalar = _lib.TCOD_color_multiply_scalar_wrapper
-    _lib.TCOD_color_subtract = _lib.TCOD_color_subtract_wrapper
-    _lib.TCOD_color_lerp = _lib.TCOD_color_lerp_wrapper
-    _lib.TCOD_console_get_default_background = _lib.TCOD_console_get_default_background_wrapper
-    _lib.TCOD_console_get_default_foreground = _lib.TCOD_console_get_default_foreground_wrapper
-    _lib.TCOD_console_get_char_background = _lib.TCOD_console_get_char_background_wrapper
-    _lib.TCOD_console_get_char_foreground = _lib.TCOD_console_get_char_foreground_wrapper
-    _lib.TCOD_console_get_fading_color = _lib.TCOD_console_get_fading_color_wrapper
-    _lib.TCOD_image_get_pixel = _lib.TCOD_image_get_pixel_wrapper
-    _lib.TCOD_image_get_mipmap_pixel = _lib.TCOD_image_get_mipmap_pixel_wrapper
-    _lib.TCOD_parser_get_color_property = _lib.TCOD_parser_get_color_property_wrapper
+NATIVE_AVAILABLE=True
+try:
+    if sys.platform.find('linux') != -1:
+        _lib = ctypes.cdll['./libtcod.so']
+        LINUX=True
+    elif sys.platform.find('darwin') != -1:
+        _lib = ctypes.cdll['./libtcod.dylib']
+        MAC = True
+    elif sys.platform.find('haiku') != -1:
+        _lib = ctypes.cdll['./libtcod.so']
+        HAIKU = True
+    else:
+        try:
+            _lib = ctypes.cdll['./libtcod-mingw.dll']
+            MINGW=True
+        except WindowsError:
+            _lib = ctypes.cdll['./libtcod-VS.dll']
+            MSVC=True
+        # On Windows, ctypes doesn't work well with function returning structs,
+        # so we have to user the _wrapper functions instead
+        _lib.TCOD_color_multiply = _lib.TCOD_color_multiply_wrapper
+        _lib.TCOD_color_add = _lib.TCOD_color_add_wrapper
+        _lib.TCOD_color_multiply_scalar = _lib.TCOD_color_multiply_scalar_wrapper
+        _lib.TCOD_color_subtract = _lib.TCOD_color_subtract_wrapper
+        _lib.TCOD_color_lerp = _lib.TCOD_color_lerp_wrapper
+        _lib.TCOD_console_get_default_background = _lib.TCOD_console_get_default_background_wrapper
+        _lib.TCOD_console_get_default_foreground = _lib.TCOD_console_get_default_foreground_wrapper
+        _lib.TCOD_console_get_char_background = _lib.TCOD_console_get_char_background_wrapper
+        _lib.TCOD_console_get_char_foreground = _lib.TCOD_console_get_char_foreground_wrapper
+        _lib.TCOD_console_get_fading_color = _lib.TCOD_console_get_fading_color_wrapper
+        _lib.TCOD_image_get_pixel = _lib.TCOD_image_get_pixel_wrapper
+        _lib.TCOD_image_get_mipmap_pixel = _lib.TCOD_image_get_mipmap_pixel_wrapper
+        _lib.TCOD_parser_get_color_property = _lib.TCOD_parser_get_color_property_wrapper
+except OSError:
+    _lib = _MissingLibrary()
+    NATIVE_AVAILABLE=False
 
 HEXVERSION = 0x010501
 STRVERSION = "1.5.1"
@@ -914,9 +933,9 @@ def console_fill_foreground(con,r,g,b) :
     if (numpy_available and isinstance(r, numpy.ndarray) and
         isinstance(g, numpy.ndarray) and isinstance(b, numpy.ndarray)):
         #numpy arrays, use numpy's ctypes functions
-        r = numpy.ascontiguousarray(r, dtype=numpy.int_)
-        g = numpy.ascontiguousarray(g, dtype=numpy.int_)
-        b = numpy.ascontiguousarray(b, dtype=numpy.int_)
+        r = numpy.ascontiguousarray(r, dtype=numpy.intc)
+        g = numpy.ascontiguousarray(g, dtype=numpy.intc)
+        b = numpy.ascontiguousarray(b, dtype=numpy.intc)
         cr = r.ctypes.data_as(POINTER(c_int))
         cg = g.ctypes.data_as(POINTER(c_int))
         cb = b.ctypes.data_as(POINTER(c_int))
@@ -935,9 +954,9 @@ def console_fill_background(con,r,g,b) :
     if (numpy_available and isinstance(r, numpy.ndarray) and
         isinstance(g, numpy.ndarray) and isinstance(b, numpy.ndarray)):
         #numpy arrays, use numpy's ctypes functions
-        r = numpy.ascontiguousarray(r, dtype=numpy.int_)
-        g = numpy.ascontiguousarray(g, dtype=numpy.int_)
-        b = numpy.ascontiguousarray(b, dtype=numpy.int_)
+        r = numpy.ascontiguousarray(r, dtype=numpy.intc)
+        g = numpy.ascontiguousarray(g, dtype=numpy.intc)
+        b = numpy.ascontiguousarray(b, dtype=numpy.intc)
         cr = r.ctypes.data_as(POINTER(c_int))
         cg = g.ctypes.data_as(POINTER(c_int))
         cb = b.ctypes.data_as(POINTER(c_int))
@@ -952,7 +971,7 @@ def console_fill_background(con,r,g,b) :
 def console_fill_char(con,arr) :
     if (numpy_available and isinstance(arr, numpy.ndarray) ):
         #numpy arrays, use numpy's ctypes functions
-        arr = numpy.ascontiguousarray(arr, dtype=numpy.int_)
+        arr = numpy.ascontiguousarray(arr, dtype=numpy.intc)
         carr = arr.ctypes.data_as(POINTER(c_int))
     else:
         #otherwise convert using the struct module
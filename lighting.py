@@ -0,0 +1,209 @@
+"""Lighting.  Lamps, windows and carried lights each light up the tiles they can see, fading with distance.  Each source's
+light is worked out once and kept, and the map's light levels are the sum of them all.  A source is only worked out
+again when it moves (including being carried around), or when a tile near it starts or stops blocking sight; the total is
+updated by taking away the source's old light and adding its new light.
+"""
+
+#
+# Imports
+#
+import math
+import libtcodpy as libtcod
+from common import *
+import fov
+
+#
+# LightMap
+#
+class LightMap(object):
+    """The light given off by one source, as last worked out."""
+
+    __slots__ = ('origin', 'cells')
+
+    #
+    # __init__()
+    #
+    def __init__(self, origin, cells):
+        """Create light map.
+
+        Arguments:
+        origin - (x, y, radius, level) the light was worked out for
+        cells - dictionary of (x, y) -> light level, for each tile lit
+
+        """
+        self.origin = origin
+        self.cells = cells
+
+    #
+    # covers()
+    #
+    def covers(self, x, y):
+        """Whether a tile is within reach of this light, lit or not."""
+        ox, oy, radius, level = self.origin
+        return abs(x - ox) <= radius and abs(y - oy) <= radius
+
+#
+# Lighting
+#
+class Lighting(object):
+    """Light levels of a map."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, map, ambient = AMBIENT_LIGHT):
+        """Set up lighting for a map, adding the light sources already on it.  Light is not worked out until update()
+        is called.
+
+        Arguments:
+        map - the map to light
+        ambient - light level everywhere, before any sources are added
+
+        """
+        self.map = map
+        self.ambient = ambient
+        self.light = [[0] * map.y_max for x in range(map.x_max)]  # sum of the sources' light, indexed [x][y]
+        self.sources = {}      # entity id -> light source
+        self.light_maps = {}   # entity id -> LightMap of the source's current light
+        self.stale = set()     # ids of sources whose light must be worked out again, even if they have not moved
+        self.revision = map.revision  # map revision last seen, to spot changes to sight blocking
+        self.changes = 0       # incremented whenever light levels change
+
+        for entity in list(map.fixtures) + list(map.entities):
+            self.add_entity(entity)
+        map.tile_watchers.append(self.tile_changed)
+
+    #
+    # close()
+    #
+    def close(self):
+        """Stop watching the map."""
+        self.map.tile_watchers.remove(self.tile_changed)
+
+    #
+    # add_entity()
+    #
+    def add_entity(self, entity):
+        """Add an entity as a light source if it gives off light, and anything it is carrying which does.  Sources stay
+        added when they are picked up, dropped or carried around, and give off no light while they are off the map.
+
+        Arguments:
+        entity - the entity
+
+        """
+        if entity.light_radius > 0:
+            self.sources[entity.id] = entity
+        inventory = getattr(entity, "inventory", None)
+        if inventory is not None:
+            for item in inventory.items:
+                self.add_entity(item)
+
+    #
+    # tile_changed()
+    #
+    def tile_changed(self, x, y):
+        """Called by the map when a tile may have changed.  If its sight blocking changed, the sources within reach of
+        it are marked to be worked out again."""
+        if self.map.revision != self.revision:
+            self.revision = self.map.revision
+            for id, light_map in self.light_maps.items():
+                if light_map.covers(x, y):
+                    self.stale.add(id)
+
+    #
+    # origin()
+    #
+    def origin(self, entity):
+        """Work out where a light source's light comes from.  Carried sources shine from whoever is carrying them.
+
+        Arguments:
+        entity - the light source
+
+        Returns:
+        (x, y, radius, level), or None if the source is not on the map
+
+        """
+        holder = entity
+        while holder.x < 0 and hasattr(holder.owner, "inventory"):
+            holder = holder.owner
+        if holder.owner is not self.map or holder.x < 0:
+            return None
+        return holder.x, holder.y, entity.light_radius, entity.light_level
+
+    #
+    # cast()
+    #
+    def cast(self, origin):
+        """Work out the light given off from an origin: full at the source, fading to nothing just beyond its radius, on
+        every tile it can see.
+
+        Arguments:
+        origin - (x, y, radius, level) from origin()
+
+        Returns:
+        dictionary of (x, y) -> light level
+
+        """
+        ox, oy, radius, level = origin
+        cells = {}
+        for x, y in fov.visible_cells(self.map.transparent, self.map.x_max, self.map.y_max, ox, oy, radius):
+            distance = math.sqrt((x - ox) * (x - ox) + (y - oy) * (y - oy))
+            amount = int(level * (radius + 1 - distance) / (radius + 1))
+            if amount > 0:
+                cells[(x, y)] = amount
+        return cells
+
+    #
+    # update()
+    #
+    def update(self):
+        """Bring the light levels up to date, working out only those sources which have moved or been marked stale.
+
+        Returns:
+        whether any light levels changed
+
+        """
+        changed = False
+        for id, entity in self.sources.items():
+            origin = self.origin(entity)
+            light_map = self.light_maps.get(id)
+            if (light_map.origin if light_map is not None else None) == origin and id not in self.stale:
+                continue
+
+            if light_map is not None:
+                for (x, y), amount in light_map.cells.iteritems():
+                    self.light[x][y] -= amount
+                del self.light_maps[id]
+            if origin is not None:
+                light_map = self.light_maps[id] = LightMap(origin, self.cast(origin))
+                for (x, y), amount in light_map.cells.iteritems():
+                    self.light[x][y] += amount
+            changed = True
+
+        self.stale.clear()
+        if changed:
+            self.changes += 1
+        return changed
+
+    #
+    # light_at()
+    #
+    def light_at(self, x, y):
+        """Get the light level of a tile, from 0 to LIGHT_MAX, as of the last update()."""
+        return min(LIGHT_MAX, self.ambient + self.light[x][y])
+
+#
+# shade()
+#
+def shade(colour, level):
+    """Darken a colour for a light level.
+
+    Arguments:
+    colour - libtcod.Color as seen in full light
+    level - light level, from 0 to LIGHT_MAX
+
+    Returns:
+    libtcod.Color
+
+    """
+    return libtcod.Color(colour.r * level // LIGHT_MAX, colour.g * level // LIGHT_MAX, colour.b * level // LIGHT_MAX)
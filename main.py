@@ -4,15 +4,20 @@
 # Imports
 #
 import sys
+import random
 import optparse
 import libtcodpy as libtcod
+import backend
+import profiler
 from common import *
 import input
 import ui
+import tile
 import sim
 import player_actions as pa
 
-from map import Map
+from map import Map, TileStorage
+from fov import FovEngine
 from entity import Entity
 
 # maps
@@ -45,6 +50,53 @@ def process_command_line(argv):
     parser.add_option(      # customized description; put --help last
         '-h', '--help', action='help',
         help='Show this help message and exit.')
+    parser.add_option(
+        '--tile-storage', type='choice', choices=['list', 'array', 'chunked'], dest='tile_storage', default='list',
+        help='How to store map tiles: list (tile objects), array (NumPy arrays) or chunked (paged to disk).')
+    parser.add_option(
+        '--fov-engine', type='choice', choices=['libtcod', 'shadowcast'], dest='fov_engine', default='libtcod',
+        help='Field of view engine: libtcod (native) or shadowcast (pure Python).')
+    parser.add_option(
+        '--seed', type='int', dest='seed', default=None,
+        help='Seed used to build the level, and cache it under (see --no-level-cache).  By default a random level is '
+             'built, and not cached.')
+    parser.add_option(
+        '--no-level-cache', action='store_false', dest='level_cache', default=True,
+        help='Always build the level from scratch, rather than loading it from the level cache.')
+    parser.add_option(
+        '--render-mode', type='choice', choices=['direct', 'dirty', 'numpy', 'terrain'], dest='render_mode', default='dirty',
+        help='How to draw the map: direct (every cell, every frame), dirty (only changed cells), numpy (bulk fills) or '
+             'terrain (blit pre-rendered terrain).')
+    parser.add_option(
+        '--memory-desaturation', type='float', dest='memory_desaturation', default=MEMORY_DESATURATION,
+        help='How much to desaturate remembered tiles, from 0 (full colour) to 1 (greyscale).')
+    parser.add_option(
+        '--message-history', type='int', dest='message_history', default=MESSAGE_HISTORY,
+        help='Number of messages to keep in the message log.')
+    parser.add_option(
+        '--message-log', dest='message_log', default=None,
+        help='Append messages to this file as they drop out of the message log, and the rest on exit.')
+    parser.add_option(
+        '--lighting', action='store_true', dest='lighting', default=False,
+        help='Light the map with lamps, windows and carried lights, rather than showing everything in view at full brightness.')
+    parser.add_option(
+        '--ambient-light', type='int', dest='ambient_light', default=AMBIENT_LIGHT,
+        help='With --lighting, the light level everywhere before any lights, from 0 to %d.' % LIGHT_MAX)
+    parser.add_option(
+        '--headless', action='store_true', dest='headless', default=False,
+        help='Run without a display, drawing to an in-memory console and reading keys from --keys.')
+    parser.add_option(
+        '--keys', dest='keys', default='',
+        help='Keys to press when running headless, eg "UP UP C-o KP3 ESCAPE" (see backend.ScriptedInput).')
+    parser.add_option(
+        '--dump-screen', dest='dump_screen', default=None,
+        help='When running headless, write the last frame drawn as text to this file.')
+    parser.add_option(
+        '--profile', dest='profile', default=None,
+        help='Time each phase of every frame and turn, and write histograms to this file (.json for JSON, else CSV).')
+    parser.add_option(
+        '--profile-overlay', action='store_true', dest='profile_overlay', default=False,
+        help='Show the profiling overlay from the start.  It can be toggled with F3.')
 
     settings, args = parser.parse_args(argv)
 
@@ -53,6 +105,17 @@ def process_command_line(argv):
         parser.error('program takes no command-line arguments: ' '"%s" ignored.' % (args,))
 
     # Further process settings & args if necessary
+    if not 0 <= settings.memory_desaturation <= 1:
+        parser.error('--memory-desaturation must be between 0 and 1.')
+    if not 0 <= settings.ambient_light <= LIGHT_MAX:
+        parser.error('--ambient-light must be between 0 and %d.' % LIGHT_MAX)
+    if settings.message_history < 1:
+        parser.error('--message-history must be at least 1.')
+    if not settings.headless and not libtcod.NATIVE_AVAILABLE:
+        parser.error('the libtcod native library could not be loaded - use --headless to run without it.')
+    if settings.headless and not libtcod.NATIVE_AVAILABLE:
+        settings.fov_engine = 'shadowcast'
+
     return settings, args
 
 #
@@ -62,28 +125,50 @@ def main(argv = None):
     """ Entry-point into program."""
     settings, args = process_command_line(argv)
     
-    # Initialise libtcod
-    libtcod.console_set_custom_font('arial12x12.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_TCOD)
-    libtcod.console_init_root(SCREEN_WIDTH, SCREEN_HEIGHT, PROGRAM_NAME, False)
-    libtcod.sys_set_fps(10)
-    libtcod.console_set_background_flag(0, libtcod.BKGND_SET)
+    # Initialise libtcod, or the in-memory console if there is no display
+    if settings.headless:
+        backend.use(backend.HeadlessBackend(backend.ScriptedInput(settings.keys)))
+    backend.current.console_set_custom_font('arial12x12.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_TCOD)
+    backend.current.console_init_root(SCREEN_WIDTH, SCREEN_HEIGHT, PROGRAM_NAME, False)
+    backend.current.sys_set_fps(10)
+    backend.current.console_set_background_flag(0, libtcod.BKGND_SET)
+    tile.set_memory_desaturation(settings.memory_desaturation)
+
+    if settings.profile or settings.profile_overlay:
+        profiler.current.enable()
+        profiler.current.show_overlay = settings.profile_overlay
 
     # Create a map and add starting entities.
-    map = Map(maps.ground_control.level_1_raw)
+    fov_engine = FovEngine.SHADOWCAST if settings.fov_engine == 'shadowcast' else FovEngine.LIBTCOD
+    tile_storage = {'list': TileStorage.LIST, 'array': TileStorage.ARRAY, 'chunked': TileStorage.CHUNKED}[settings.tile_storage]
+    map = Map(maps.ground_control.level_1_raw, settings.seed, tile_storage = tile_storage, fov_engine = fov_engine,
+              cache_dir = LEVEL_CACHE_DIR if settings.level_cache else None)
+    if settings.lighting:
+        map.enable_lighting(settings.ambient_light)
+
+    # A seeded level may have come from the cache - reseed so that play is not the same every time.
+    if settings.seed is not None:
+        random.seed()
 
     player = Human("Bob Smith", "male", 15, 30)
     player.report = ReportType.PLAYER
     map.add_entity(map.entry_point[0], map.entry_point[1], player)
+    map.player = player
 
     # Ghost is used to move around map for viewing
     ghost = Human("Ghost", "male", 15, 0)
 
     # Set up UI
-    ui.Screens.map = ui.MapScreen(MAP_WINDOW[0], MAP_WINDOW[1], MAP_WINDOW[2], MAP_WINDOW[3])
-    ui.Screens.msg = ui.MessageScreen(MSG_WINDOW[0], MSG_WINDOW[1], MSG_WINDOW[2], MSG_WINDOW[3])
+    render_mode = {'direct': ui.MapRenderMode.DIRECT, 'dirty': ui.MapRenderMode.DIRTY, 'numpy': ui.MapRenderMode.NUMPY,
+                   'terrain': ui.MapRenderMode.TERRAIN}[settings.render_mode]
+    ui.Screens.map = ui.MapScreen(MAP_WINDOW[0], MAP_WINDOW[1], MAP_WINDOW[2], MAP_WINDOW[3], render_mode)
+    ui.Screens.mini = ui.MinimapScreen(MINIMAP_WINDOW[0], MINIMAP_WINDOW[1], MINIMAP_WINDOW[2], MINIMAP_WINDOW[3])
+    ui.Screens.msg = ui.MessageScreen(MSG_WINDOW[0], MSG_WINDOW[1], MSG_WINDOW[2], MSG_WINDOW[3], settings.message_history,
+                                      settings.message_log)
     ui.Screens.inv = ui.InventoryScreen(INVENTORY_WINDOW[0], INVENTORY_WINDOW[1], INVENTORY_WINDOW[2], INVENTORY_WINDOW[3])
     
     ui.Screens.map.show_and_activate()
+    ui.Screens.mini.show_and_activate()
     ui.Screens.msg.show_and_activate()
     ui.Screens.inv.hide_and_deactivate()
         
@@ -96,49 +181,103 @@ def main(argv = None):
     delayed_action = None
     
     current_turn = 1
+    last_status = None, None  # (turn text, profiling overlay text) the top line of the console was last drawn with
 
     # main loop
-    while not libtcod.console_is_window_closed():
+    while not backend.current.console_is_window_closed():
+        profiler.current.begin_frame()
 
-        libtcod.console_clear(0)
-        libtcod.console_set_default_foreground(0, libtcod.white)
-    
         # set up render bounds
         centre_bounds = int(MAP_WINDOW[2] / 2), int(MAP_WINDOW[3] / 2), map.x_max - int(MAP_WINDOW[2] / 2) - 1, map.y_max - int(MAP_WINDOW[3] / 2) - 1
         
         # are we viewing the player or the ghost entity which acts as the automap viewer?
         view_centre = max(centre_bounds[0], min(player.x, centre_bounds[2])), max(centre_bounds[1], min(player.y, centre_bounds[3]))
 
-        # Render screens
-        if ui.Screens.map.show:
-            ui.Screens.map.render(map, view_centre, player)
-        if ui.Screens.msg.show:
-            ui.Screens.msg.render()
-        if ui.Screens.inv.show:
-            ui.Screens.inv.render(player)
+        # Render screens.  Only screens which have changed are drawn - the rest of the console is left as it was.
+        with profiler.current.phase("light"):
+            map.update_lighting()
+        ui.Screens.map.check_map(map, view_centre)
+        drawn = False
+        if ui.Screens.map.show and ui.Screens.map.dirty:
+            with profiler.current.phase("render.map"):
+                ui.Screens.map.render(map, view_centre, player)
+            ui.Screens.map.dirty = False
+            ui.Screens.inv.invalidate()  # the inventory is drawn over the map
+            drawn = True
+        ui.Screens.mini.check_map(map)
+        if ui.Screens.mini.show and ui.Screens.mini.dirty:
+            with profiler.current.phase("render.mini"):
+                ui.Screens.mini.render(map, player)
+            ui.Screens.mini.dirty = False
+            drawn = True
+        if ui.Screens.msg.show and ui.Screens.msg.dirty:
+            with profiler.current.phase("render.msg"):
+                ui.Screens.msg.render()
+            ui.Screens.msg.dirty = False
+            drawn = True
+        if ui.Screens.inv.show and ui.Screens.inv.dirty:
+            with profiler.current.phase("render.inv"):
+                ui.Screens.inv.render(player)
+            ui.Screens.inv.dirty = False
+            drawn = True
         
-        ui.render_entity_info(player, map)
+        with profiler.current.phase("render.info"):
+            ui.render_entity_info(player, map)
         
-        libtcod.console_set_default_foreground(0, libtcod.white)
-        libtcod.console_print(0, 0, 0, "Turn: %d" % current_turn)
+        # Turn counter, and the profiling figures for the previous frame next to it.  The figures are only updated when
+        # something else is drawn, so that an idle screen stays idle.
+        turn_text = "Turn: %d" % current_turn
+        overlay_text = profiler.current.overlay_text() if drawn else last_status[1]
+        if (turn_text, overlay_text) != last_status:
+            backend.current.console_set_default_background(0, libtcod.black)
+            backend.current.console_rect(0, 0, 0, SCREEN_WIDTH, 1, True, libtcod.BKGND_SET)
+            backend.current.console_set_default_foreground(0, libtcod.white)
+            backend.current.console_print(0, 0, 0, turn_text)
+            if overlay_text:
+                overlay_x = len(turn_text) + 2
+                backend.current.console_set_default_foreground(0, libtcod.yellow)
+                backend.current.console_print(0, overlay_x, 0, overlay_text[:SCREEN_WIDTH - overlay_x])
+            last_status = turn_text, overlay_text
+            drawn = True
 
         # Blit to console
-        libtcod.console_flush()
+        if drawn:
+            with profiler.current.phase("flush"):
+                backend.current.console_flush()
         
         # Process input
-        player_action = input.handle_input(player, input_type, delayed_action)
-        turn_taken, input_type, delayed_action = player_action[0](player, map, player_action[1:])
+        with profiler.current.phase("input"):
+            player_action = input.handle_input(player, input_type, delayed_action)
+        with profiler.current.phase("action"):
+            turn_taken, input_type, delayed_action = player_action[0](player, map, player_action[1:])
 
+        frame_turn = current_turn
         if turn_taken:
             current_turn += 1
+            ui.Screens.inv.invalidate()  # the entity's inventory may have changed
         
         # Quit the loop?
         if turn_taken is None:
+            profiler.current.end_frame(frame_turn)
             break
         
         # If we've done something, update world and render
         if turn_taken:
-            sim.update_world()
+            with profiler.current.phase("sim"):
+                sim.update_world(map, player)
+
+        profiler.current.end_frame(frame_turn)
+
+    map.close()
+    ui.Screens.msg.log.close()
+
+    if settings.profile:
+        profiler.current.dump(settings.profile)
+        profiler.current.disable()
+
+    if settings.headless and settings.dump_screen:
+        with open(settings.dump_screen, "w") as f:
+            f.write(backend.current.root.text() + "\n")
 
     # Return peacefully
     return 0
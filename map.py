@@ -4,10 +4,41 @@
 # Imports
 #
 import random
+import collections
 import libtcodpy as libtcod
 from common import *
 import ui
-from tile import Tile, TileType
+from tile import Tile, TileType, UNKNOWN_TILE
+from tile_grid import TileGrid
+from tile_chunks import ChunkedTileGrid
+from spatial import EntityIndex
+import fov
+from fov import FovEngine
+import level_cache
+from lighting import Lighting
+import sim
+from goal_map import GoalMaps
+from pathfinding import PathCache
+from rooms import RoomGraph
+
+try:  # NumPy is optional - it is needed for array storage and tile_window()
+    import numpy
+except ImportError:
+    pass
+
+#
+# TileStorage - how a map's tiles are stored.
+#
+TileStorage = enum(
+    LIST    = 0,  # jagged list of Tile objects
+    ARRAY   = 1,  # NumPy arrays (see TileGrid)
+    CHUNKED = 2   # lazily allocated chunks, paged to disk (see ChunkedTileGrid)
+)
+
+#
+# Maximum number of chunks kept in memory with chunked tile storage.
+#
+MAX_RESIDENT_CHUNKS = 256
 
 #
 # Map
@@ -18,42 +49,141 @@ class Map:
     #
     # __init__()
     #
-    def __init__(self, level_func, seed = None):
+    def __init__(self, level_func, seed = None, tile_storage = TileStorage.LIST, fov_engine = FovEngine.LIBTCOD,
+                 cache_dir = None):
         """Create a map with the given function.
         
         Arguments:
         level_func - function to generate the map
         seed - optional seed for the RNG
+        tile_storage - how to store tiles (see TileStorage)
+        fov_engine - how field of view is computed (see FovEngine)
+        cache_dir - directory for the compiled level cache (see level_cache).  Only used if a seed is given.
         
         """
         self.x_max = 0           # max x-dimension of map
         self.y_max = 0           # max y-dimension of map
-        self.tiles = None        # jagged array of tiles
+        self.tiles = None        # jagged array of tiles, TileGrid or ChunkedTileGrid
+        self.tile_storage = tile_storage
         self.entry_point = 0, 0  # starting point for this level
-        self.entities = []       # entities in this level, used for updating
+        self.source_files = []   # files the level was built from, eg RAW images
+        self.entities = EntityIndex()  # entities in this level, used for updating and spatial queries
+        self.fixtures = EntityIndex()  # doors and windows, which belong to tiles rather than being entities on them
+        self.fov_engine = fov_engine
+        self.fov_map = None      # libtcod map of transparency/walkability, kept up to date as tiles change
+        self.transparent = None  # array of tile transparency, indexed [x][y], kept up to date as tiles change (in the
+                                 # tile chunks with chunked storage, see ChunkedFlags)
+        self.revision = 0        # incremented whenever a tile's sight blocking changes
+        self.passable = None     # array of booleans indexed [x][y], True where routes can go (see Tile.blocks_passage),
+                                 # also kept in the tile chunks with chunked storage
+        self.passage_revision = 0  # incremented whenever a tile's passability changes
+        self.changes = 0         # incremented whenever anything on a tile may have changed, so it needs redrawing
+        self.tile_watchers = []  # functions called as watcher(x, y) whenever update_tile() is
+        self.fov_cache = collections.OrderedDict()  # recent FOV results, keyed on (x, y, view radius, revision)
+        self.fov_cache_size = 8  # number of FOV results to keep
+        self.lighting = None     # Lighting, if enabled (see enable_lighting())
+        self.scheduler = sim.Scheduler()  # entities which act on their own, ordered by when they next act
+        self.goal_maps = GoalMaps(self)   # shared distance fields for NPC movement
+        self.paths = PathCache(self)      # routes found between tiles, kept until the tiles they cross change
+        self.rooms = None        # RoomGraph for long routes, built when first needed (see room_graph())
+        self.player = None       # the entity the player controls, which NPCs react to
+        self.active_zone = sim.ActiveZone(self)  # where entities are simulated, rather than asleep
 
         if seed is not None:
             random.seed(seed)
-            
-        level_func(self)
+
+        if cache_dir is None or seed is None:
+            level_func(self)
+        elif not level_cache.load(self, level_func, seed, cache_dir):
+            level_func(self)
+            level_cache.save(self, level_func, seed, cache_dir)
+
+        self.refresh_fov_map()
+
+    #
+    # close()
+    #
+    def close(self):
+        """Free the libtcod map, and any on-disk tile storage.  This is not done in __del__(), as entities refer back to
+        the map they are on, and Python 2 will not collect reference cycles involving objects with __del__()."""
+        if self.fov_map is not None:
+            libtcod.map_delete(self.fov_map)
+            self.fov_map = None
+        self.paths.close()
+        if self.rooms is not None:
+            self.rooms.close()
+            self.rooms = None
+        if hasattr(self.tiles, "close"):
+            self.tiles.close()
+        if self.lighting is not None:
+            self.lighting.close()
+            self.lighting = None
+
+    #
+    # enable_lighting()
+    #
+    def enable_lighting(self, ambient = AMBIENT_LIGHT):
+        """Start keeping track of light levels (see lighting).  Light sources already on the map are added, as are any
+        added to it later.
+        
+        Arguments:
+        ambient - light level everywhere, before any sources are added
+        
+        """
+        if self.lighting is not None:
+            self.lighting.close()
+        self.lighting = Lighting(self, ambient)
+
+    #
+    # update_lighting()
+    #
+    def update_lighting(self):
+        """Bring light levels up to date, if lighting is enabled.  If they have changed, the map is marked as changed so
+        that it is redrawn."""
+        if self.lighting is not None and self.lighting.update():
+            self.changes += 1
 
     #
     # set_size()
     #
-    def set_size(self, x_max, y_max):
-        """Set the map's size and allocate empty tiles.
+    def set_size(self, x_max, y_max, default_tdef = UNKNOWN_TILE):
+        """Set the map's size and allocate empty tiles.  With chunked storage, tiles are only allocated when written to,
+        and the transparency and passability flags are kept in the same chunks (see tile_chunks.ChunkedFlags).  The
+        libtcod map (if the libtcod FOV engine is used), light levels and room numbers are still held for the whole map.
         
         Arguments:
         x_max - max x-dimension of map
         y_max - max y-dimension of map
+        default_tdef - the TileDef to fill the map with
         
         """
         self.x_max = x_max
         self.y_max = y_max
-	
-        self.tiles = [[ Tile()            
-            for y in range(y_max) ]
-                for x in range(x_max) ]
+
+        if self.fov_map is not None:
+            libtcod.map_delete(self.fov_map)
+            self.fov_map = None
+        if self.fov_engine == FovEngine.LIBTCOD:
+            self.fov_map = libtcod.map_new(x_max, y_max)
+
+        if hasattr(self.tiles, "close"):
+            self.tiles.close()
+
+        if self.tile_storage == TileStorage.ARRAY:
+            self.tiles = TileGrid(x_max, y_max, default_tdef)
+        elif self.tile_storage == TileStorage.CHUNKED:
+            self.tiles = ChunkedTileGrid(x_max, y_max, default_tdef, max_resident = MAX_RESIDENT_CHUNKS)
+        else:
+            self.tiles = [[ Tile(default_tdef)
+                for y in range(y_max) ]
+                    for x in range(x_max) ]
+
+        if self.tile_storage == TileStorage.CHUNKED:
+            self.transparent = self.tiles.flags('transparent')
+            self.passable = self.tiles.flags('passable')
+        else:
+            self.transparent = fov.new_visibility_array(x_max, y_max)
+            self.passable = fov.new_visibility_array(x_max, y_max)
          
     #
     # add_entity()
@@ -71,10 +201,15 @@ class Map:
         tile = self.tiles[x][y]
         if tile.entity is None:
             tile.entity = entity
-            entity.owner = map
+            entity.owner = self
             entity.x = x
             entity.y = y
-            self.entities.append(entity)
+            self.entities.add(entity)
+            if self.lighting is not None:
+                self.lighting.add_entity(entity)
+            if sim.is_actor(entity):
+                self.scheduler.add(entity)
+            self.update_tile(x, y)
         else:
             raise LogicException("Entity placed on a tile where another entity already resides.")            
 
@@ -96,10 +231,13 @@ class Map:
         tile = self.tiles[x][y]
         if tile.inventory is None:
             tile.inventory = entity
-            entity.owner = map
+            entity.owner = self
             entity.x = x
             entity.y = y
-            self.entities.append(entity)
+            self.entities.add(entity)
+            if self.lighting is not None:
+                self.lighting.add_entity(entity)
+            self.update_tile(x, y)
         else:
             raise LogicException("Entity placed as inventory on a tile with full inventory.")            
         
@@ -128,6 +266,7 @@ class Map:
 
         tile.inventory = None
         self.entities.remove(entity)
+        self.update_tile(x, y)
         return entity
 
     #
@@ -143,7 +282,7 @@ class Map:
         Returns:
         entity removed
         """
-        tile = map.tiles[x][y]
+        tile = self.tiles[x][y]
         entity = tile.entity
         
         if entity is None:
@@ -155,6 +294,8 @@ class Map:
 
         tile.entity = None
         self.entities.remove(entity)
+        self.scheduler.remove(entity)
+        self.update_tile(x, y)
         return entity
 
     #
@@ -176,30 +317,229 @@ class Map:
         old_tile.entity = None
         new_tile.entity = entity
         
+        self.update_tile(entity.x, entity.y)
+        self.update_tile(x, y)
+
         entity.x = x
         entity.y = y
+        self.entities.move(entity)
         
         if is_player and new_tile.inventory:
           ui.Screens.msg.add_message("You see %s on the ground." % new_tile.inventory.indef_name)
 
+    #
+    # refresh_fov_map()
+    #
+    def refresh_fov_map(self):
+        """Set the transparency/walkability of every tile in the libtcod map and transparency array.  This is done once
+        after the level has been built, after which update_tile() keeps them up to date.  Doors and windows are also
+        told where they are, so that they can call update_tile() when opened or closed, and indexed in fixtures.
+        
+        With array storage this is vectorised, and with chunked storage unallocated cells are set in bulk and only
+        stored cells are visited.
+        
+        """
+        if self.tile_storage == TileStorage.ARRAY:
+            transparent = ~self.tiles.blocks_sight_map()
+            walkable = ~self.tiles.blocks_movement_map()
+            passable = ~self.tiles.blocks_passage_map()
+            self.transparent[:] = transparent
+            self.passable[:] = passable
+            self.revision += 1
+            self.passage_revision += 1
+            if self.fov_map is not None:
+                for x, (t_column, w_column) in enumerate(zip(transparent.tolist(), walkable.tolist())):
+                    for y in range(self.y_max):
+                        libtcod.map_set_properties(self.fov_map, x, y, t_column[y], w_column[y])
+            cells = sorted(self.tiles.objects)
+        elif self.tile_storage == TileStorage.CHUNKED:
+            # Flags of unallocated chunks already read as the default's (see ChunkedTileGrid.get_flag()).
+            default = self.tiles.default_tdef
+            if self.fov_map is not None:
+                # map, transparent, walkable
+                libtcod.map_clear(self.fov_map, not default.block_sight, not default.block_move)
+            self.revision += 1
+            self.passage_revision += 1
+            cells = self.tiles.stored_cells()
+        else:
+            cells = ((x, y) for x in range(self.x_max) for y in range(self.y_max))
+
+        self.fixtures = EntityIndex()
+        for x, y in cells:
+            tile = self.tiles[x][y]
+            fixture = tile.door if tile.type == TileType.DOOR else tile.window if tile.type == TileType.WINDOW else None
+            if fixture is not None:
+                fixture.owner = self
+                fixture.x, fixture.y = x, y
+                self.fixtures.add(fixture)
+
+            if self.tile_storage != TileStorage.ARRAY:
+                self.update_tile(x, y)
+
+    #
+    # update_tile()
+    #
+    def update_tile(self, x, y):
+        """Update the libtcod map, transparency and passability arrays after a tile's sight or movement blocking may have
+        changed, eg a door opening or an entity moving.
+        
+        Arguments:
+        x - x-position of tile
+        y - y-position of tile
+        
+        """
+        self.changes += 1
+        tile = self.tiles[x][y]
+        transparent = not tile.blocks_sight
+        if self.transparent[x][y] != transparent:
+            self.transparent[x][y] = transparent
+            self.revision += 1
+        passable = not tile.blocks_passage
+        if self.passable[x][y] != passable:
+            self.passable[x][y] = passable
+            self.passage_revision += 1
+        if self.fov_map is not None:
+            libtcod.map_set_properties(self.fov_map, x, y, not tile.blocks_sight, not tile.blocks_movement)
+        for watcher in self.tile_watchers:
+            watcher(x, y)
+
+    #
+    # tile_window()
+    #
+    def tile_window(self, x0, y0, x1, y1):
+        """Get the TileDef indices and seen flags of a rectangle of tiles as NumPy arrays.  This is a slice of the tile
+        arrays with array storage, and built tile by tile otherwise.
+        
+        Arguments:
+        x0, y0, x1, y1 - region of the map (x1 and y1 exclusive)
+        
+        Returns:
+        tuple of (TileDef index array, seen array), both indexed [x, y] relative to (x0, y0)
+        
+        """
+        if self.tile_storage == TileStorage.ARRAY:
+            return self.tiles.tdef[x0:x1, y0:y1], self.tiles.seen[x0:x1, y0:y1]
+
+        tdefs = numpy.empty((x1 - x0, y1 - y0), dtype = numpy.uint16)
+        seen = numpy.empty((x1 - x0, y1 - y0), dtype = numpy.bool_)
+        for x in range(x0, x1):
+            for y in range(y0, y1):
+                tile = self.tiles[x][y]
+                tdefs[x - x0, y - y0] = tile.tdef.index
+                seen[x - x0, y - y0] = tile.seen
+        return tdefs, seen
+
+    #
+    # mark_seen()
+    #
+    def mark_seen(self, x0, y0, visible):
+        """Mark the visible tiles in a rectangle as seen.
+        
+        Arguments:
+        x0 - x-position of left of rectangle
+        y0 - y-position of top of rectangle
+        visible - NumPy array of booleans indexed [x, y] relative to (x0, y0)
+        
+        """
+        if self.tile_storage == TileStorage.ARRAY:
+            width, height = visible.shape
+            self.tiles.seen[x0:x0 + width, y0:y0 + height] |= visible
+        else:
+            xs, ys = numpy.nonzero(visible)
+            for x, y in zip(xs.tolist(), ys.tolist()):
+                self.tiles[x0 + x][y0 + y].seen = True
+
+    #
+    # compute_fov()
+    #
+    def compute_fov(self, viewer):
+        """Get what a viewer can see.  Results are cached on the viewer's position and view radius, and the map's revision,
+        so repeated calls between turns (or for viewers at the same place) are free.  The least recently used result is
+        dropped when the cache is full.
+      
+        Arguments:
+        viewer - the entity to use
+        
+        Returns:
+        fov.FovResult, covering the window of the map within the view radius.  This may be shared with other callers, so
+        must not be modified.
+      
+        """
+        key = viewer.x, viewer.y, viewer.view_radius, self.revision
+        visible = self.fov_cache.pop(key, None)
+        if visible is None:
+            visible = self.calculate_fov(viewer)
+            while len(self.fov_cache) >= self.fov_cache_size:
+                self.fov_cache.popitem(last = False)
+        self.fov_cache[key] = visible
+        return visible
+
+    #
+    # can_see()
+    #
+    def can_see(self, viewer, x, y):
+        """Whether a viewer can see a tile: it must be in view and, if lighting is enabled, either lit to at least
+        VISIBLE_LIGHT or next to the viewer.
+        
+        Arguments:
+        viewer - the entity looking
+        x - x-position of tile
+        y - y-position of tile
+        
+        """
+        if not self.compute_fov(viewer).is_visible(x, y):
+            return False
+        if self.lighting is None or max(abs(x - viewer.x), abs(y - viewer.y)) <= 1:
+            return True
+        return self.lighting.light_at(x, y) >= VISIBLE_LIGHT
+
+    #
+    # room_graph()
+    #
+    def room_graph(self):
+        """Get the map's RoomGraph, for routes across the level from room to room, building it the first time."""
+        if self.rooms is None:
+            self.rooms = RoomGraph(self)
+        return self.rooms
+
+    #
+    # calculate_fov()
+    #
+    def calculate_fov(self, viewer):
+        """Compute what a viewer can see, using this map's FOV engine.  Use compute_fov() instead, which caches results.
+      
+        Arguments:
+        viewer - the entity to use
+        
+        Returns:
+        fov.FovResult, covering the window of the map within the view radius
+      
+        """
+        if self.fov_engine == FovEngine.SHADOWCAST:
+            return fov.compute_fov(self.transparent, self.x_max, self.y_max, viewer.x, viewer.y, viewer.view_radius)
+
+        # Copy the libtcod result out, only looking at tiles within the view radius.
+        fov_map = self.generate_fov_map(viewer)
+        result = fov.FovResult(*fov.fov_window(self.x_max, self.y_max, viewer.x, viewer.y, viewer.view_radius))
+        for x in range(result.x0, result.x1):
+            for y in range(result.y0, result.y1):
+                if libtcod.map_is_in_fov(fov_map, x, y):
+                    result.visible[x - result.x0][y - result.y0] = True
+
+        return result
+
     #
     # generate_fov_map()
     #
     def generate_fov_map(self, viewer):
-        """Generates a map for libtcod to use, to determine what is visible and what is not.
+        """Compute field of view for a viewer on the libtcod map.  The map is owned by this Map and is recomputed on each
+        call, so should not be deleted or kept between calls.  Only available with the libtcod FOV engine.
       
         Arguments:
         viewer - the entity to use
       
         """
-        fov_map = libtcod.map_new(self.x_max, self.y_max)
-        
-        for y in range(viewer.y - viewer.view_radius, viewer.y + viewer.view_radius + 1):
-            for x in range(viewer.x - viewer.view_radius, viewer.x + viewer.view_radius + 1):
-                if x >= 0 and x < self.x_max and y >= 0 and y < self.y_max:
-                    libtcod.map_set_properties(fov_map, x, y, not self.tiles[x][y].blocks_sight, not self.tiles[x][y].blocks_movement)    
-    
         # map, x, y, radius, light walls, algorithm
-        libtcod.map_compute_fov(fov_map, viewer.x, viewer.y, viewer.view_radius, True, libtcod.FOV_BASIC)
+        libtcod.map_compute_fov(self.fov_map, viewer.x, viewer.y, viewer.view_radius, True, libtcod.FOV_BASIC)
 
-        return fov_map
+        return self.fov_map
@@ -3,84 +3,152 @@
 #
 # Imports
 #
+import random
 import libtcodpy as libtcod
-from tile import Tile, TileType
+from tile import Tile, TileDef, TileType
+from tile_grid import TileGrid
 from inventory import Inventory
 
+try:  # NumPy is optional - it is used to decode RAW images quickly
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
 from entities.door import Door
 from entities.window import Window
 
+#
+# Tile definitions.  These are shared by every tile of the same kind, so only state which varies per cell (seen, doors,
+# windows and occupants) is stored on each tile.
+#
+WALL           = TileDef(TileType.WALL, ' ', libtcod.Color(96, 96, 96), libtcod.Color(96, 96, 96), True, True)
+DESK           = TileDef(TileType.DESK, ' ', libtcod.Color(120, 120, 120), libtcod.Color(120, 120, 120), False, True)
+WINDOW         = TileDef(TileType.WINDOW, ' ', libtcod.Color(196, 196, 196), libtcod.Color(96, 96, 96), False, True)
+DOOR           = TileDef(TileType.DOOR, ' ', libtcod.Color(140, 140, 190), libtcod.Color(140, 140, 190), False, False)
+LIGHT_GRASS    = TileDef(TileType.GRASS, ' ', libtcod.Color(0, 132, 0), libtcod.Color(0, 132, 0), False, False)
+DARK_GRASS     = TileDef(TileType.GRASS, ' ', libtcod.Color(0, 108, 0), libtcod.Color(0, 108, 0), False, False)
+LAMINATE_FLOOR = TileDef(TileType.LAMINATE_FLOOR, ' ', libtcod.Color(140, 140, 190), libtcod.Color(140, 140, 190), False, False)
+
 #
 # functions to create tile types
 #
 def create_wall(x, y):
-    tile = Tile()
-    tile.type        = TileType.WALL
-    tile.block_sight = True
-    tile.block_move  = True
-    tile.char        = ' '
-    tile.fcolour     = libtcod.Color(96, 96, 96)
-    tile.bcolour     = libtcod.Color(96, 96, 96)
-    return tile
+    return Tile(WALL)
 
 def create_desk(x, y):
-    tile = Tile()
-    tile.type        = TileType.DESK
-    tile.block_sight = False
-    tile.block_move  = True
-    tile.char        = ' '
-    tile.fcolour     = libtcod.Color(120, 120, 120)
-    tile.bcolour     = libtcod.Color(120, 120, 120)
-    return tile
+    return Tile(DESK)
     
 def create_window(x, y):
-    tile = Tile()
-    tile.type        = TileType.WINDOW
-    tile.block_sight = False
-    tile.block_move  = True
-    tile.char        = ' '
-    tile.fcolour     = libtcod.Color(196, 196, 196)
-    tile.bcolour     = libtcod.Color(96, 96, 96)
-    tile.window      = Window()
+    tile = Tile(WINDOW)
+    tile.window = Window()
     return tile
 
 def create_door(x, y):
-    tile = Tile()
-    tile.type        = TileType.DOOR
-    tile.block_sight = False
-    tile.block_move  = False
-    tile.char        = ' '
-    tile.fcolour     = libtcod.Color(140, 140, 190)
-    tile.bcolour     = libtcod.Color(140, 140, 190)
-    tile.door        = Door()
+    tile = Tile(DOOR)
+    tile.door = Door()
     return tile
     
 def create_light_grass(x, y):
-    tile = Tile()
-    tile.type        = TileType.GRASS
-    tile.block_sight = False
-    tile.block_move  = False
-    tile.char        = ' '
-    tile.fcolour     = libtcod.Color(0, 132, 0)
-    tile.bcolour     = libtcod.Color(0, 132, 0)
-    return tile
+    return Tile(LIGHT_GRASS)
 
 def create_dark_grass(x, y):
-    tile = Tile()
-    tile.type        = TileType.GRASS
-    tile.block_sight = False
-    tile.block_move  = False
-    tile.char        = ' '
-    tile.fcolour     = libtcod.Color(0, 108, 0)
-    tile.bcolour     = libtcod.Color(0, 108, 0)
-    return tile
+    return Tile(DARK_GRASS)
     
 def create_laminate_floor(x, y):
-    tile = Tile()
-    tile.type        = TileType.LAMINATE_FLOOR
-    tile.block_sight = False
-    tile.block_move  = False
-    tile.char        = ' '
-    tile.fcolour     = libtcod.Color(140, 140, 190)
-    tile.bcolour     = libtcod.Color(140, 140, 190)
-    return tile
+    return Tile(LAMINATE_FLOOR)
+
+#
+# load_raw()
+#
+def load_raw(map, filename, x_max, y_max, palette):
+    """Fill a map from a RAW (8-bit interleaved RGB, no header) image, one pixel per tile.  The map must already be
+    sized.  Pixels whose colour is not in the palette are left alone.  The file is added to the map's source_files.
+    
+    If NumPy is available, the file is memory-mapped and decoded against the palette in one vectorised pass, and tiles
+    without per-cell objects are bulk-filled when the map uses a TileGrid.  Otherwise each pixel is looked up in turn.
+    
+    Arguments:
+    map - map to fill
+    filename - RAW image file
+    x_max - width of image
+    y_max - height of image
+    palette - list of ((r, g, b), variants), where variants is a list of (tile function, weight) pairs.  Where there
+              is more than one variant, one is chosen at random according to its weight.
+    
+    """
+    map.source_files.append(filename)
+    
+    if numpy_available:
+        _load_raw_numpy(map, filename, x_max, y_max, palette)
+    else:
+        _load_raw_python(map, filename, x_max, y_max, palette)
+
+#
+# _load_raw_numpy()
+#
+def _load_raw_numpy(map, filename, x_max, y_max, palette):
+    """Vectorised version of load_raw()."""
+    pixels = numpy.memmap(filename, dtype = numpy.uint8, mode = 'r', shape = (y_max, x_max, 3))
+    packed = (pixels[..., 0].astype(numpy.uint32) << 16) | (pixels[..., 1].astype(numpy.uint32) << 8) | pixels[..., 2]
+    packed = packed.T  # index as [x, y]
+    
+    # Look every pixel up in the (sorted) palette at once, giving the palette index or -1.
+    keys = numpy.array([(r << 16) | (g << 8) | b for (r, g, b), variants in palette], dtype = numpy.uint32)
+    order = numpy.argsort(keys)
+    sorted_keys = keys[order]
+    pos = numpy.searchsorted(sorted_keys, packed).clip(0, len(keys) - 1)
+    entries = numpy.where(sorted_keys[pos] == packed, order[pos], -1)
+    del pixels
+    
+    # Keep using Python's RNG, so that the map seed still determines the result.
+    rng = numpy.random.RandomState(random.getrandbits(32))
+    
+    for index, (colour, variants) in enumerate(palette):
+        xs, ys = numpy.nonzero(entries == index)
+        if len(xs) == 0:
+            continue
+        
+        weights = numpy.cumsum([weight for func, weight in variants])
+        choices = numpy.searchsorted(weights, rng.randint(0, weights[-1], len(xs)), side = 'right')
+        
+        for variant, (func, weight) in enumerate(variants):
+            selected = choices == variant
+            vxs, vys = xs[selected], ys[selected]
+            if len(vxs) == 0:
+                continue
+            
+            template = func(-1, -1)
+            if isinstance(map.tiles, TileGrid) and not hasattr(template, 'door') and not hasattr(template, 'window'):
+                map.tiles.fill_tiles(vxs, vys, template)
+            else:
+                for x, y in zip(vxs.tolist(), vys.tolist()):
+                    map.tiles[x][y] = func(x, y)
+
+#
+# _load_raw_python()
+#
+def _load_raw_python(map, filename, x_max, y_max, palette):
+    """Pure-Python version of load_raw()."""
+    with open(filename, "rb") as f:
+        pixels = bytearray(f.read(x_max * y_max * 3))
+    
+    lookup = {}
+    for colour, variants in palette:
+        lookup[colour] = variants, sum(weight for func, weight in variants)
+    
+    index = 0
+    for y in range(y_max):
+        for x in range(x_max):
+            entry = lookup.get((pixels[index], pixels[index + 1], pixels[index + 2]))
+            index += 3
+            if entry is None:
+                continue
+            
+            variants, total = entry
+            choice = random.randint(0, total - 1) if len(variants) > 1 else 0
+            for func, weight in variants:
+                if choice < weight:
+                    break
+                choice -= weight
+            map.tiles[x][y] = func(x, y)
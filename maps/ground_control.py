@@ -11,6 +11,18 @@ import entities.grunt as enemies
 # will have certain areas which are always in the same location/configuration, but other offices, rooms and ducts
 # will have a degree of randomness to them.
 
+#
+# Colours used in the level 1 RAW file, and the tiles they become.  Grass is light slightly less often than dark.
+#
+LEVEL_1_PALETTE = [
+    ((0, 255, 0),     [(mapgen.create_light_grass, 5), (mapgen.create_dark_grass, 6)]),
+    ((0, 0, 0),       [(mapgen.create_wall, 1)]),
+    ((160, 160, 160), [(mapgen.create_desk, 1)]),
+    ((255, 0, 0),     [(mapgen.create_window, 1)]),
+    ((255, 255, 0),   [(mapgen.create_door, 1)]),
+    ((128, 128, 128), [(mapgen.create_laminate_floor, 1)]),
+]
+
 #
 # level_1_raw()
 #
@@ -24,29 +36,7 @@ def level_1_raw(map):
     map.set_size(80, 80)
     map.entry_point = 40, 76
 
-    with open("maps/ground_control_1.raw", "rb") as f:
-        bytes = f.read(80 * 80 * 3)
-
-    index = 0
-    for y in range(80):
-        for x in range(80):
-            r = ord(bytes[index + 0])
-            g = ord(bytes[index + 1])
-            b = ord(bytes[index + 2])
-            index += 3
-            
-            if r == 0 and g == 255 and b == 0:
-                map.tiles[x][y] = mapgen.create_light_grass(x, y) if random.randint(0, 10) < 5 else mapgen.create_dark_grass(x, y)
-            elif r == 0 and g == 0 and b == 0:
-                map.tiles[x][y] = mapgen.create_wall(x, y)
-            elif r == 160 and g == 160 and b == 160:
-                map.tiles[x][y] = mapgen.create_desk(x, y)
-            elif r == 255 and g == 0 and b == 0:
-                map.tiles[x][y] = mapgen.create_window(x, y)
-            elif r == 255 and g == 255 and b == 0:
-                map.tiles[x][y] = mapgen.create_door(x, y)
-            elif r == 128 and g == 128 and b == 128:
-                map.tiles[x][y] = mapgen.create_laminate_floor(x, y)
+    mapgen.load_raw(map, "maps/ground_control_1.raw", 80, 80, LEVEL_1_PALETTE)
 
     # add entities
     map.add_entity_as_inventory(40, 73, general_entities.MedKit())
@@ -55,5 +45,7 @@ def level_1_raw(map):
     map.add_entity_as_inventory(43, 70, general_entities.SodaCan())
     map.add_entity_as_inventory(42, 73, general_entities.QuantumAnalyser())
     map.add_entity_as_inventory(41, 71, general_entities.QuantumAnalyser())
+    map.add_entity_as_inventory(33, 71, general_entities.Lamp())
+    map.add_entity_as_inventory(38, 74, general_entities.Torch())
     map.add_entity(41, 65, enemies.Grunt())
     map.add_entity(37, 62, enemies.Grunt())
\ No newline at end of file
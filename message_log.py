@@ -0,0 +1,148 @@
+"""Bounded log of game messages.  Messages are word-wrapped once, when they are added, and repeats of the last message
+are folded into it (eg "You open the door. x3").  Only the most recent messages are kept; older ones can be written out
+to a file as they are dropped, so that a long session's history is kept without it all being held in memory.
+"""
+
+#
+# Imports
+#
+import collections
+import textwrap
+from common import *
+
+#
+# LogEntry
+#
+class LogEntry(object):
+    """A message in the log, with its repeat count and display lines."""
+
+    __slots__ = ('text', 'count', 'lines')
+
+    #
+    # __init__()
+    #
+    def __init__(self, text, width):
+        """Create entry.
+
+        Arguments:
+        text - message text
+        width - width to wrap the message to
+
+        """
+        self.text = text
+        self.count = 1
+        self.lines = wrap(text, width)
+
+    #
+    # display_text()
+    #
+    def display_text(self):
+        """Get the message as shown, with its repeat count."""
+        return self.text if self.count == 1 else "%s x%d" % (self.text, self.count)
+
+#
+# wrap()
+#
+def wrap(text, width):
+    """Word-wrap text to a width, breaking words which are longer than a line.
+
+    Returns:
+    list of lines, at least one
+
+    """
+    return textwrap.wrap(text, width) or [""]
+
+#
+# MessageLog
+#
+class MessageLog(object):
+    """Ring buffer of the most recent messages."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, width, max_messages = MESSAGE_HISTORY, spill_file = None):
+        """Create empty log.
+
+        Arguments:
+        width - width to wrap messages to
+        max_messages - number of messages to keep
+        spill_file - name of a file to append messages to when they are dropped from the log (and when it is closed),
+                     or None to discard them
+
+        """
+        self.width = width
+        self.entries = collections.deque()
+        self.max_messages = max_messages
+        self.spill = open(spill_file, "a") if spill_file else None
+
+    #
+    # __len__()
+    #
+    def __len__(self):
+        """Number of messages held, counting repeats once."""
+        return len(self.entries)
+
+    #
+    # add()
+    #
+    def add(self, text):
+        """Add a message.  If it repeats the last message, the last message's count goes up instead.
+
+        Arguments:
+        text - message text
+
+        """
+        if self.entries and self.entries[-1].text == text:
+            entry = self.entries[-1]
+            entry.count += 1
+            entry.lines = wrap(entry.display_text(), self.width)
+            return
+
+        self.entries.append(LogEntry(text, self.width))
+        while len(self.entries) > self.max_messages:
+            self._spill(self.entries.popleft())
+
+    #
+    # _spill()
+    #
+    def _spill(self, entry):
+        """Write a dropped entry to the spill file, if there is one."""
+        if self.spill is not None:
+            self.spill.write(entry.display_text() + "\n")
+
+    #
+    # recent()
+    #
+    def recent(self, max_lines):
+        """Get the display lines of the most recent messages.
+
+        Arguments:
+        max_lines - maximum number of lines to return
+
+        Returns:
+        list of (age, line), oldest first, where age is 0 for lines of the newest message, 1 for the one before, etc.
+        Only the last lines of the oldest message are included if it does not all fit.
+
+        """
+        result = []
+        for age, entry in enumerate(reversed(self.entries)):
+            if len(result) >= max_lines:
+                break
+            for line in reversed(entry.lines):
+                result.append((age, line))
+
+        result = result[:max_lines]
+        result.reverse()
+        return result
+
+    #
+    # close()
+    #
+    def close(self):
+        """Write every message still held to the spill file, if there is one, and close it."""
+        if self.spill is not None:
+            for entry in self.entries:
+                self._spill(entry)
+            self.spill.close()
+            self.spill = None
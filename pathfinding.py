@@ -0,0 +1,285 @@
+"""Cached A* pathfinding.  Routes are found with libtcod's A* when the map uses libtcod, or in Python otherwise, over the
+passable tiles of a map (see Map.passable), so other entities do not get in the way of a route - only of the next step
+along it.  Either way, diagonal steps may not cut the corner of an impassable tile, as with the player's movement.
+
+Each route found is kept, and is also used for every (tile on it, destination) pair, so an entity walking along a route
+finds the rest of it in the cache each turn.  When a tile stops being passable, eg a door is closed, only the routes
+through it are dropped.  When a tile becomes passable, routes which failed are dropped, as there may now be a way; the
+routes kept are still walkable, though there may now be a shorter one.
+"""
+
+#
+# Imports
+#
+import heapq
+import libtcodpy as libtcod
+from common import *
+from fov import FovEngine
+
+#
+# Maximum number of (origin, destination) pairs cached.  The cache is emptied when it is full.
+#
+PATH_CACHE_SIZE = 5000
+
+#
+# Maximum number of tiles the Python A* looks at before giving up, so that a destination which cannot be reached does not
+# mean searching the whole map.
+#
+PATH_SEARCH_LIMIT = 10000
+
+#
+# Route
+#
+class Route(object):
+    """A route found between two tiles."""
+
+    __slots__ = ('steps', 'valid')
+
+    #
+    # __init__()
+    #
+    def __init__(self, steps):
+        """Create route.
+
+        Arguments:
+        steps - list of (x, y) from the origin to the destination, both included
+
+        """
+        self.steps = steps
+        self.valid = True
+
+#
+# PathCache
+#
+class PathCache(object):
+    """Routes found on a map, kept until the tiles they cross change."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, map, max_entries = PATH_CACHE_SIZE, search_limit = PATH_SEARCH_LIMIT):
+        """Create empty cache, and start watching the map for changes to passability.
+
+        Arguments:
+        map - the map to find routes on
+        max_entries - maximum number of (origin, destination) pairs to keep
+        search_limit - maximum number of tiles the Python A* looks at for each route
+
+        """
+        self.map = map
+        self.max_entries = max_entries
+        self.search_limit = search_limit
+        self.entries = {}     # ((ox, oy), (dx, dy)) -> (Route, index of the origin in its steps)
+        self.failed = set()   # ((ox, oy), (dx, dy)) which are known to have no route
+        self.by_cell = {}     # (x, y) -> set of the valid Routes through the tile
+        self.path = None      # (libtcod path, its callback), created when first needed
+        self.revision = map.passage_revision
+        self.hits = 0
+        self.misses = 0
+        map.tile_watchers.append(self.tile_changed)
+
+    #
+    # close()
+    #
+    def close(self):
+        """Free the libtcod path, and stop watching the map."""
+        if self.path is not None:
+            libtcod.path_delete(self.path)
+            self.path = None
+        self.map.tile_watchers.remove(self.tile_changed)
+
+    #
+    # clear()
+    #
+    def clear(self):
+        """Drop every route."""
+        self.entries = {}
+        self.failed = set()
+        self.by_cell = {}
+
+    #
+    # tile_changed()
+    #
+    def tile_changed(self, x, y):
+        """Called by the map when a tile may have changed.  If its passability changed, the routes it affects are
+        dropped."""
+        if self.map.passage_revision == self.revision:
+            return
+        self.revision = self.map.passage_revision
+
+        if self.map.passable[x][y]:
+            self.failed.clear()
+        else:
+            for route in self.by_cell.pop((x, y), ()):
+                route.valid = False
+                for cell in route.steps:
+                    routes = self.by_cell.get(cell)
+                    if routes is not None:
+                        routes.discard(route)
+
+    #
+    # lookup()
+    #
+    def lookup(self, ox, oy, dx, dy):
+        """Find a route, from the cache if possible.
+
+        Arguments:
+        ox, oy - origin
+        dx, dy - destination
+
+        Returns:
+        (Route, index of the origin in its steps), or None if there is no route
+
+        """
+        key = (ox, oy), (dx, dy)
+        if key in self.failed:
+            self.hits += 1
+            return None
+        entry = self.entries.get(key)
+        if entry is not None and entry[0].valid:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        if len(self.entries) >= self.max_entries:
+            self.clear()
+
+        steps, complete = self.compute(ox, oy, dx, dy)
+        if steps is None:
+            if complete:
+                self.failed.add(key)  # searches which gave up are not kept, as there may still be a route
+            return None
+
+        route = Route(steps)
+        for index, cell in enumerate(steps):
+            self.entries[(cell, (dx, dy))] = route, index
+            self.by_cell.setdefault(cell, set()).add(route)
+        return route, 0
+
+    #
+    # route()
+    #
+    def route(self, ox, oy, dx, dy):
+        """Get the route between two tiles.
+
+        Arguments:
+        ox, oy - origin
+        dx, dy - destination
+
+        Returns:
+        list of (x, y) steps, not including the origin, or None if there is no route
+
+        """
+        entry = self.lookup(ox, oy, dx, dy)
+        if entry is None:
+            return None
+        route, index = entry
+        return route.steps[index + 1:]
+
+    #
+    # next_step()
+    #
+    def next_step(self, ox, oy, dx, dy):
+        """Get the first step of the route between two tiles.
+
+        Arguments:
+        ox, oy - origin
+        dx, dy - destination
+
+        Returns:
+        (x, y) of the step, or None if there is no route or the origin is the destination
+
+        """
+        entry = self.lookup(ox, oy, dx, dy)
+        if entry is None:
+            return None
+        route, index = entry
+        return route.steps[index + 1] if index + 1 < len(route.steps) else None
+
+    #
+    # step_cost()
+    #
+    def step_cost(self, x, y, nx, ny, userdata):
+        """Called by libtcod to get the cost of a step between neighbouring tiles.
+
+        Returns:
+        1 if the step can be taken, 0 if it is blocked or cuts a corner
+
+        """
+        passable = self.map.passable
+        if not passable[nx][ny] or (x != nx and y != ny and not (passable[x][ny] and passable[nx][y])):
+            return 0.0
+        return 1.0
+
+    #
+    # compute()
+    #
+    def compute(self, ox, oy, dx, dy):
+        """Find a route, with libtcod if the map uses it, otherwise in Python.
+
+        Returns:
+        tuple of (route, complete) - see astar()
+
+        """
+        if self.map.fov_engine != FovEngine.LIBTCOD:
+            return astar(self.map.passable, self.map.x_max, self.map.y_max, ox, oy, dx, dy, self.search_limit)
+
+        if self.path is None:
+            self.path = libtcod.path_new_using_function(self.map.x_max, self.map.y_max, self.step_cost, 0, 1.0)
+        if not libtcod.path_compute(self.path, ox, oy, dx, dy):
+            return None, True
+        return [(ox, oy)] + [libtcod.path_get(self.path, i) for i in range(libtcod.path_size(self.path))], True
+
+#
+# astar()
+#
+def astar(passable, x_max, y_max, ox, oy, dx, dy, limit = PATH_SEARCH_LIMIT):
+    """Find a shortest route with A*.  Straight and diagonal steps both cost one, but diagonal steps may not cut the
+    corner of an impassable tile, as with the player's movement.
+
+    Arguments:
+    passable - array of booleans indexed [x][y], True where routes can go
+    x_max - max x-dimension of map
+    y_max - max y-dimension of map
+    ox, oy - origin
+    dx, dy - destination
+    limit - maximum number of tiles to look at
+
+    Returns:
+    tuple of (route, complete): route is a list of (x, y) from the origin to the destination, both included, or None if
+    none was found; complete is False if the search gave up at the limit, so that there may still be a route
+
+    """
+    if not passable[dx][dy]:
+        return None, True
+
+    came_from = {(ox, oy): None}
+    cost = {(ox, oy): 0}
+    heap = [(max(abs(dx - ox), abs(dy - oy)), 0, ox, oy)]
+    visited = 0
+    while heap and visited < limit:
+        estimate, steps, x, y = heapq.heappop(heap)
+        if (x, y) == (dx, dy):
+            route = []
+            cell = (x, y)
+            while cell is not None:
+                route.append(cell)
+                cell = came_from[cell]
+            route.reverse()
+            return route, True
+        if steps > cost[(x, y)]:
+            continue
+        visited += 1
+
+        for sx in (-1, 0, 1):
+            for sy in (-1, 0, 1):
+                nx, ny = x + sx, y + sy
+                if not (sx or sy) or not (0 <= nx < x_max and 0 <= ny < y_max) or not passable[nx][ny]:
+                    continue
+                if sx and sy and not (passable[x][ny] and passable[nx][y]):
+                    continue
+                if steps + 1 < cost.get((nx, ny), steps + 2):
+                    cost[(nx, ny)] = steps + 1
+                    came_from[(nx, ny)] = (x, y)
+                    heapq.heappush(heap, (steps + 1 + max(abs(dx - nx), abs(dy - ny)), steps + 1, nx, ny))
+    return None, not heap
@@ -233,15 +233,9 @@ def action_get(entity, map, args):
         entity.action_get(entity, map, entity.x, entity.y)
         return True, InputType.IMMEDIATE, None
     else:
-        gettables = []
-        for y in range(entity.y - 1, entity.y + 2):
-            for x in range(entity.x - 1, entity.x + 2):
-                if x < 0 or x >= map.x_max or y < 0 or y >= map.y_max or (x == entity.x and y == entity.y):
-                    continue
-                
-                tile = map.tiles[x][y]
-                if tile.inventory:
-                    gettables.append(tile.inventory)
+        # Items lying on neighbouring tiles
+        gettables = [e for e in map.entities.in_rect(entity.x - 1, entity.y - 1, entity.x + 1, entity.y + 1)
+                     if map.tiles[e.x][e.y].inventory is e]
 
         if len(gettables) == 0:
             ui.Screens.msg.add_message("There is nothing here for you to pick up.")
@@ -313,13 +307,15 @@ def action_open(entity, map, args):
             
             tile = map.tiles[x][y]
             
-            # Check to see if there is a door or a window, or just an entity
+            # Check to see if there is a door or a window
             if tile.type == TileType.DOOR and tile.door.closed:
                     openables.append(tile.door)
             elif tile.type == TileType.WINDOW and tile.window.closed:
                 openables.append(tile.window)
-            elif tile.entity and hasattr(tile.entity, "action_open") and tile.entity.closed:
-                openables.append(tile.entity)
+
+    # ...or an entity (not one lying on the ground)
+    openables.extend(e for e in map.entities.in_rect(entity.x - 1, entity.y - 1, entity.x + 1, entity.y + 1)
+                       if e is not entity and map.tiles[e.x][e.y].entity is e and hasattr(e, "action_open") and e.closed)
 
     if len(openables) == 0:
         ui.Screens.msg.add_message("There is nothing here for you to open.")
@@ -373,13 +369,15 @@ def action_close(entity, map, args):
             
             tile = map.tiles[x][y]
             
-            # Check to see if there is a door or a window, or just an entity
+            # Check to see if there is a door or a window
             if tile.type == TileType.DOOR and not tile.door.closed:
                     closeables.append(tile.door)
             elif tile.type == TileType.WINDOW and not tile.window.closed:
                 closeables.append(tile.window)
-            elif tile.entity and hasattr(tile.entity, "action_close") and not tile.entity.closed:
-                closeables.append(tile.entity)
+
+    # ...or an entity (not one lying on the ground)
+    closeables.extend(e for e in map.entities.in_rect(entity.x - 1, entity.y - 1, entity.x + 1, entity.y + 1)
+                       if e is not entity and map.tiles[e.x][e.y].entity is e and hasattr(e, "action_close") and not e.closed)
 
     if len(closeables) == 0:
         ui.Screens.msg.add_message("There is nothing here for you to close.")
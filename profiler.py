@@ -0,0 +1,316 @@
+"""Frame and turn profiling.  The main loop is split into named phases (FOV, each screen's render, waiting for input,
+the player's action, the world update), which are timed for every frame, along with the number of calls made into the
+native libtcod library.  The last frame's figures can be shown as an overlay, and rolling histograms of the recorded
+frames and turns can be written out as CSV or JSON.
+
+Phases may be nested, eg "fov" is timed within "render.map", and each phase's time includes any phases within it.
+"""
+
+#
+# Imports
+#
+import collections
+import csv
+import json
+import timeit
+import libtcodpy as libtcod
+from common import *
+
+#
+# Number of frames and turns kept for the histograms.
+#
+HISTORY_SIZE = 1000
+
+#
+# Upper bounds of the histogram buckets, for times (in milliseconds) and numbers of native calls.  The last bucket of
+# each is unbounded.
+#
+BUCKETS_MS = (0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+BUCKETS_CALLS = (10, 100, 1000, 10000, 100000)
+
+#
+# Phases shown on the overlay, with their short names.  Waiting for input is left out, as it is not the game's time.
+#
+OVERLAY_PHASES = (("fov", "fov"), ("render.map", "map"), ("action", "act"), ("sim", "sim"))
+
+#
+# CountingLibrary
+#
+class CountingLibrary(object):
+    """Stands in for libtcodpy's handle on the native library, counting every call made through it."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, lib):
+        """Wrap a library.
+
+        Arguments:
+        lib - the ctypes library (or libtcodpy's stand-in for it) to forward calls to
+
+        """
+        self.lib = lib
+        self.calls = 0
+        self.wrappers = {}
+
+    #
+    # __getattr__()
+    #
+    def __getattr__(self, name):
+        """Get a counting wrapper for a library function.  Only called for names which are not attributes."""
+        wrapper = self.wrappers.get(name)
+        if wrapper is None:
+            func = getattr(self.lib, name)
+            def wrapper(*args):
+                self.calls += 1
+                return func(*args)
+            self.wrappers[name] = wrapper
+        return wrapper
+
+#
+# Phase
+#
+class Phase(object):
+    """Times a phase of a frame, for use in a with statement."""
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    #
+    # __init__()
+    #
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    #
+    # __enter__()
+    #
+    def __enter__(self):
+        self.start = timeit.default_timer()
+        return self
+
+    #
+    # __exit__()
+    #
+    def __exit__(self, *exc_info):
+        elapsed = timeit.default_timer() - self.start
+        phases = self.profiler.phases
+        phases[self.name] = phases.get(self.name, 0.0) + elapsed
+        return False
+
+#
+# NullPhase
+#
+class NullPhase(object):
+    """Stands in for a Phase when profiling is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_PHASE = NullPhase()
+
+#
+# Profiler
+#
+class Profiler(object):
+    """Records phase timings and native call counts per frame and per turn."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, history_size = HISTORY_SIZE):
+        """Create profiler.  It does nothing until enable() is called.
+
+        Arguments:
+        history_size - number of frames, and of turns, to keep for the histograms
+
+        """
+        self.enabled = False
+        self.show_overlay = False
+        self.counter = None      # CountingLibrary installed in libtcodpy while enabled
+        self.phases = {}         # phase name -> seconds, for the frame in progress
+        self.frame_start = None
+        self.calls_start = 0
+        self.frames = collections.deque(maxlen = history_size)  # (turn, seconds, native calls, phases) per frame
+        self.turns = collections.deque(maxlen = history_size)   # (turn, seconds, native calls, phases) per turn
+        self.last_frame = None
+
+    #
+    # enable()
+    #
+    def enable(self):
+        """Start profiling, and start counting native calls."""
+        if not self.enabled:
+            self.enabled = True
+            self.counter = CountingLibrary(libtcod._lib)
+            libtcod._lib = self.counter
+
+    #
+    # disable()
+    #
+    def disable(self):
+        """Stop profiling.  Recorded frames are kept."""
+        if self.enabled:
+            self.enabled = False
+            libtcod._lib = self.counter.lib
+            self.counter = None
+
+    #
+    # phase()
+    #
+    def phase(self, name):
+        """Time a phase of the current frame, eg 'with profiler.current.phase("sim"): ...'.
+
+        Arguments:
+        name - name of phase
+
+        """
+        return Phase(self, name) if self.enabled else NULL_PHASE
+
+    #
+    # begin_frame()
+    #
+    def begin_frame(self):
+        """Start timing a frame."""
+        if self.enabled:
+            self.phases = {}
+            self.frame_start = timeit.default_timer()
+            self.calls_start = self.counter.calls
+
+    #
+    # end_frame()
+    #
+    def end_frame(self, turn):
+        """Finish timing a frame, and add it to the history.  Frames with the same turn number are added together to
+        give the figures for that turn.
+
+        Arguments:
+        turn - turn number the frame belonged to
+
+        """
+        if not self.enabled or self.frame_start is None:
+            return
+
+        frame = (turn, timeit.default_timer() - self.frame_start, self.counter.calls - self.calls_start, self.phases)
+        self.frames.append(frame)
+        self.last_frame = frame
+        self.frame_start = None
+
+        if self.turns and self.turns[-1][0] == turn:
+            last = self.turns.pop()
+            phases = dict(last[3])
+            for name, seconds in frame[3].items():
+                phases[name] = phases.get(name, 0.0) + seconds
+            self.turns.append((turn, last[1] + frame[1], last[2] + frame[2], phases))
+        else:
+            self.turns.append((turn, frame[1], frame[2], dict(frame[3])))
+
+    #
+    # overlay_text()
+    #
+    def overlay_text(self):
+        """Get a one-line summary of the last frame, eg "12.1ms fov 1.0 map 6.3 act 0.1 sim 0.0 | 350 calls".  Times are
+        in milliseconds, and the frame time does not include waiting for input.
+
+        Returns:
+        summary, or None if there is nothing to show
+
+        """
+        if not self.show_overlay or self.last_frame is None:
+            return None
+
+        turn, seconds, calls, phases = self.last_frame
+        busy = (seconds - phases.get("input", 0.0)) * 1000
+        parts = ["%.1fms" % busy] + ["%s %.1f" % (short, phases.get(name, 0.0) * 1000) for name, short in OVERLAY_PHASES]
+        return "%s | %d calls" % (" ".join(parts), calls)
+
+    #
+    # histograms()
+    #
+    def histograms(self, records):
+        """Summarise a set of records (see frames and turns) by phase.
+
+        Arguments:
+        records - the records to summarise
+
+        Returns:
+        dictionary of phase name -> dictionary of count, mean, max and histogram (see bucket_counts()), in milliseconds.
+        The whole frame/turn is under "total", and native calls are under "calls", counted rather than timed.
+
+        """
+        samples = collections.defaultdict(list)
+        for turn, seconds, calls, phases in records:
+            samples["total"].append(seconds * 1000)
+            for name, phase_seconds in phases.items():
+                samples[name].append(phase_seconds * 1000)
+
+        summary = {}
+        for name, values in samples.items():
+            summary[name] = {"count": len(values), "mean": sum(values) / len(values), "max": max(values),
+                             "histogram": bucket_counts(values, BUCKETS_MS)}
+
+        calls = [record[2] for record in records]
+        if calls:
+            summary["calls"] = {"count": len(calls), "mean": float(sum(calls)) / len(calls), "max": max(calls),
+                                "histogram": bucket_counts(calls, BUCKETS_CALLS)}
+        return summary
+
+    #
+    # dump()
+    #
+    def dump(self, filename):
+        """Write histograms of the recorded frames and turns to a file: JSON if the name ends in .json, otherwise CSV,
+        with one row per (scope, phase, bucket).
+
+        Arguments:
+        filename - file to write
+
+        """
+        scopes = (("frame", self.histograms(self.frames)), ("turn", self.histograms(self.turns)))
+
+        if filename.endswith(".json"):
+            with open(filename, "w") as f:
+                json.dump({"frames": len(self.frames), "turns": len(self.turns), "frame": scopes[0][1],
+                           "turn": scopes[1][1]}, f, indent = 2, sort_keys = True)
+            return
+
+        with open(filename, "wb") as f:
+            writer = csv.writer(f)
+            writer.writerow(["scope", "phase", "bucket_low", "bucket_high", "count"])
+            for scope, summary in scopes:
+                for name in sorted(summary):
+                    for low, high, count in summary[name]["histogram"]:
+                        writer.writerow([scope, name, low, "" if high is None else high, count])
+
+#
+# bucket_counts()
+#
+def bucket_counts(values, bounds):
+    """Count values into histogram buckets.
+
+    Arguments:
+    values - values to count
+    bounds - upper bounds of the buckets, eg BUCKETS_MS
+
+    Returns:
+    list of (low, high, count) per bucket.  The last bucket's high is None.
+
+    """
+    counts = [0] * (len(bounds) + 1)
+    for value in values:
+        index = 0
+        while index < len(bounds) and value > bounds[index]:
+            index += 1
+        counts[index] += 1
+    return zip((0,) + tuple(bounds), tuple(bounds) + (None,), counts)
+
+#
+# The profiler used by the game.
+#
+current = Profiler()
@@ -0,0 +1,469 @@
+"""Room graph and hierarchical pathfinding.  The map is split into rooms - regions of open floor flood-filled up to the
+walls - joined by portals, the doors and windows between them.  A long route is planned first from room to room, as a
+shortest sequence of portals over the (small) portal graph, and then walked one room at a time.
+
+The distances from each portal into each room it opens onto are worked out once, when first needed, and serve both to
+cost the portal graph and to step towards the next portal, so planning looks at portals rather than tiles, and each step
+is a few lookups.  The distances to a destination within its room are worked out the same way, for the last leg, and
+for going straight there when the origin is in the same room.  Portals are usable unless locked (doors) or shut
+(windows, which must be opened deliberately), and locking or unlocking a door only changes that portal.  If the walls
+themselves change, the rooms are worked out again.
+
+Routes are shortest routes over the floor and the usable portals, where a diagonal step may only pass the corners of
+floor - not of walls, nor of doors and windows, which may be closed.
+"""
+
+#
+# Imports
+#
+import heapq
+import collections
+from common import *
+
+#
+# Maximum number of planned routes kept.  They are all dropped when it is full, or when a portal changes.
+#
+ROOM_PLAN_CACHE_SIZE = 1000
+
+#
+# Maximum number of destinations whose distances are kept.  The least recently used is dropped when it is full.
+#
+ROOM_TARGET_CACHE_SIZE = 100
+
+#
+# Straight steps, and all neighbouring steps.  Both cost one step, as they take one move.
+#
+STRAIGHT = ((0, -1), (-1, 0), (1, 0), (0, 1))
+NEIGHBOURS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+#
+# Portal
+#
+class Portal(object):
+    """A door or window joining rooms."""
+
+    __slots__ = ('x', 'y', 'fixture', 'rooms', 'usable')
+
+    #
+    # __init__()
+    #
+    def __init__(self, x, y, fixture):
+        """Create portal.
+
+        Arguments:
+        x, y - position of the door or window
+        fixture - the Door or Window
+
+        """
+        self.x = x
+        self.y = y
+        self.fixture = fixture
+        self.rooms = set()  # ids of the rooms next to it
+        self.usable = portal_usable(fixture)
+
+#
+# RoomGraph
+#
+class RoomGraph(object):
+    """Rooms and portals of a map, and routes planned through them."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, map):
+        """Build the room graph of a map, and start watching it for changes.
+
+        Arguments:
+        map - the map
+
+        """
+        self.map = map
+        self.plans = {}     # ((ox, oy), (dx, dy)) -> list of legs (see plan()), or None if there is no way
+        self.stale = False  # whether the walls have changed, so the rooms must be worked out again
+        self.build()
+        map.tile_watchers.append(self.tile_changed)
+
+    #
+    # close()
+    #
+    def close(self):
+        """Stop watching the map."""
+        self.map.tile_watchers.remove(self.tile_changed)
+
+    #
+    # build()
+    #
+    def build(self):
+        """Flood-fill the rooms, find the portals between them and the steps which can be taken within each."""
+        map = self.map
+        self.room_of = [[-1] * map.y_max for x in range(map.x_max)]  # room id of each tile, or -1 for walls and portals
+        self.rooms = []     # list of the portals of each room, by room id
+        self.portals = {}   # (x, y) -> Portal
+        self.links = []     # steps within each room (see find_links()), by room id
+        self.fields = {}    # (portal position, room id) -> dictionary of (x, y) -> distance from the portal
+        self.exits = {}     # (portal position, room id) -> list of (distance, position) of the other portals reached
+        self.targets = collections.OrderedDict()  # destination -> distances to it (see target()), oldest use first
+        self.plans = {}
+        self.stale = False
+
+        for fixture in map.fixtures:
+            self.portals[(fixture.x, fixture.y)] = Portal(fixture.x, fixture.y, fixture)
+
+        for x in range(map.x_max):
+            for y in range(map.y_max):
+                if self.room_of[x][y] < 0 and self.is_floor(x, y):
+                    self.fill(x, y, len(self.rooms))
+                    self.rooms.append([])
+
+        for portal in self.portals.values():
+            for sx, sy in STRAIGHT:
+                nx, ny = portal.x + sx, portal.y + sy
+                if 0 <= nx < map.x_max and 0 <= ny < map.y_max and self.room_of[nx][ny] >= 0:
+                    portal.rooms.add(self.room_of[nx][ny])
+            for room in portal.rooms:
+                self.rooms[room].append(portal)
+
+        self.links = self.find_links()
+
+    #
+    # is_floor()
+    #
+    def is_floor(self, x, y):
+        """Whether a tile is part of a room: passable, and not a door or window."""
+        return self.map.passable[x][y] and (x, y) not in self.portals
+
+    #
+    # fill()
+    #
+    def fill(self, x, y, room):
+        """Flood-fill a room from a tile.  Rooms are filled through straight steps only, as a diagonal step may not cut a
+        corner, so could only join tiles which are joined by straight steps anyway."""
+        self.room_of[x][y] = room
+        pending = [(x, y)]
+        while pending:
+            x, y = pending.pop()
+            for sx, sy in STRAIGHT:
+                nx, ny = x + sx, y + sy
+                if not (0 <= nx < self.map.x_max and 0 <= ny < self.map.y_max) or self.room_of[nx][ny] >= 0:
+                    continue
+                if self.is_floor(nx, ny):
+                    self.room_of[nx][ny] = room
+                    pending.append((nx, ny))
+
+    #
+    # same_room()
+    #
+    def same_room(self, x0, y0, x1, y1):
+        """Whether two tiles are floor of the same room."""
+        if self.stale:
+            self.build()
+        return self.room_of[x0][y0] >= 0 and self.room_of[x0][y0] == self.room_of[x1][y1]
+
+    #
+    # tile_changed()
+    #
+    def tile_changed(self, x, y):
+        """Called by the map when a tile may have changed.  A portal which has been locked, unlocked, opened or shut has
+        its usable flag updated; other tiles only matter if they have become, or stopped being, floor."""
+        portal = self.portals.get((x, y))
+        if portal is not None:
+            usable = portal_usable(portal.fixture)
+            if usable != portal.usable:
+                portal.usable = usable
+                self.plans = {}
+        elif (self.room_of[x][y] >= 0) != self.is_floor(x, y):
+            self.stale = True
+
+    #
+    # field()
+    #
+    def field(self, portal, room):
+        """Get the distances from a portal to every tile of a room next to it, and to the room's other portals.  Worked
+        out the first time it is asked for, and kept."""
+        key = (portal.x, portal.y), room
+        distances = self.fields.get(key)
+        if distances is None:
+            distances = self.fields[key] = self.search(key[0], room)
+        return distances
+
+    #
+    # portal_exits()
+    #
+    def portal_exits(self, portal, room):
+        """Get the other portals which can be reached from a portal across a room next to it, nearest first."""
+        key = (portal.x, portal.y), room
+        exits = self.exits.get(key)
+        if exits is None:
+            distances = self.field(portal, room)
+            exits = self.exits[key] = sorted((distance, position) for position, distance in distances.items()
+                                             if position in self.portals and position != key[0])
+        return exits
+
+    #
+    # target()
+    #
+    def target(self, dx, dy):
+        """Get the distances to a destination from every tile of its room, and from the room's portals.  Worked out the
+        first time it is asked for, and kept for a while.
+
+        Returns:
+        dictionary of (x, y) -> distance, or None if the destination is not in a room
+
+        """
+        room = self.room_of[dx][dy]
+        if room < 0:
+            return None
+        distances = self.targets.pop((dx, dy), None)
+        if distances is None:
+            distances = self.search((dx, dy), room)
+            while len(self.targets) >= ROOM_TARGET_CACHE_SIZE:
+                self.targets.popitem(last = False)
+        self.targets[(dx, dy)] = distances
+        return distances
+
+    #
+    # search()
+    #
+    def search(self, start, room):
+        """Breadth-first search within a room.
+
+        Arguments:
+        start - (x, y) of a tile of the room, or of one of its portals, to search from
+        room - room id
+
+        Returns:
+        dictionary of (x, y) -> distance from the start, for the tiles of the room and its portals which can be reached
+
+        """
+        links = self.room_links(room)
+        distances = {start: 0}
+        frontier = [start]
+        distance = 0
+        while frontier:
+            distance += 1
+            next_frontier = []
+            for cell in frontier:
+                for neighbour in links[cell]:
+                    if neighbour not in distances:
+                        distances[neighbour] = distance
+                        if self.room_of[neighbour[0]][neighbour[1]] == room:
+                            next_frontier.append(neighbour)  # other portals are reached, but not gone through
+            frontier = next_frontier
+        return distances
+
+    #
+    # room_links()
+    #
+    def room_links(self, room):
+        """Get the steps which can be taken within a room (see find_links())."""
+        return self.links[room]
+
+    #
+    # find_links()
+    #
+    def find_links(self):
+        """Find the steps which can be taken within each room: from its tiles and portals to its tiles, and from its tiles
+        to its portals.  This is one pass over the map, done when the rooms are built.
+
+        Returns:
+        list, by room id, of dictionaries of (x, y) -> list of (x, y) which can be stepped to
+
+        """
+        x_max, y_max = self.map.x_max, self.map.y_max
+        room_of = self.room_of
+        links = [{} for room in self.rooms]
+        starts = [((x, y), room_of[x][y]) for x in range(x_max) for y in range(y_max) if room_of[x][y] >= 0]
+        starts += [(position, room) for position, portal in self.portals.items() for room in portal.rooms]
+        for (x, y), room in starts:
+            from_portal = (x, y) in self.portals
+            steps = links[room][(x, y)] = []
+            for sx, sy in NEIGHBOURS:
+                nx, ny = x + sx, y + sy
+                if not (0 <= nx < x_max and 0 <= ny < y_max):
+                    continue
+                if room_of[nx][ny] != room and (from_portal or (nx, ny) not in self.portals):
+                    continue
+                if sx and sy and not (room_of[x][ny] >= 0 and room_of[nx][y] >= 0):
+                    continue  # a diagonal step may only pass the corners of floor
+                steps.append((nx, ny))
+        return links
+
+    #
+    # plan()
+    #
+    def plan(self, ox, oy, dx, dy):
+        """Plan a route from room to room, with A* over the usable portals.  Costs are the distances within each room, so
+        the plan is as short as walking it, and the estimate of the rest of the way is the number of steps to the
+        destination were there no walls.  When the origin is in the destination's room, going straight there is weighed
+        against going round through other rooms.
+
+        Arguments:
+        ox, oy - origin
+        dx, dy - destination
+
+        Returns:
+        list of (portal, id of the room crossed to reach it) for the portals to go through in order (empty if the
+        destination is reached without going through one), or None if there is no way
+
+        """
+        if self.stale:
+            self.build()
+
+        key = (ox, oy), (dx, dy)
+        if key in self.plans:
+            return self.plans[key]
+        if len(self.plans) >= ROOM_PLAN_CACHE_SIZE:
+            self.plans = {}
+
+        origin_room = self.room_of[ox][oy]
+        goal_room = self.room_of[dx][dy]
+        target = self.target(dx, dy)
+        best_cost, best_end = None, None  # a best cost with no end portal means going straight there
+
+        # Start from the origin if it is a portal, otherwise from the portals of the origin's room.
+        if (ox, oy) in self.portals:
+            starts = [(0, (ox, oy), None)]
+        elif origin_room >= 0:
+            if origin_room == goal_room:
+                best_cost = target.get((ox, oy))
+            starts = []
+            for portal in self.rooms[origin_room]:
+                distance = self.field(portal, origin_room).get((ox, oy)) if portal.usable else None
+                if distance is not None and (best_cost is None or distance < best_cost):
+                    starts.append((distance, (portal.x, portal.y), origin_room))
+        else:
+            starts = []
+
+        heap = [(cost + max(abs(dx - x), abs(dy - y)), cost, (x, y)) for cost, (x, y), room in starts]
+        heapq.heapify(heap)
+        # portal -> (best cost, portal before it, room crossed from it)
+        came_from = dict((cell, (cost, None, room)) for cost, cell, room in starts)
+        done = set()
+        while heap:
+            estimate, cost, cell = heapq.heappop(heap)
+            if best_cost is not None and estimate >= best_cost:
+                break
+            if cell in done:
+                continue
+            done.add(cell)
+            portal = self.portals[cell]
+
+            # Can the destination be reached from here?
+            if cell == (dx, dy):
+                best_cost, best_end = cost, cell
+                break
+            if goal_room in portal.rooms:
+                distance = target.get(cell)
+                if distance is not None and (best_cost is None or cost + distance < best_cost):
+                    best_cost, best_end = cost + distance, cell
+
+            for room in portal.rooms:
+                for distance, position in self.portal_exits(portal, room):
+                    new_cost = cost + distance
+                    if best_cost is not None and new_cost >= best_cost:
+                        break  # this and the rest of the exits are no better than the best way found
+                    if position in done or not self.portals[position].usable:
+                        continue
+                    if position not in came_from or new_cost < came_from[position][0]:
+                        came_from[position] = new_cost, cell, room
+                        estimate = new_cost + max(abs(dx - position[0]), abs(dy - position[1]))
+                        heapq.heappush(heap, (estimate, new_cost, position))
+
+        if best_cost is None:
+            route = None
+        else:
+            route = []
+            cell = best_end
+            while cell is not None:
+                cost, previous, room = came_from[cell]
+                route.append((self.portals[cell], room))
+                cell = previous
+            route.reverse()
+            if route and route[0][1] is None:
+                route = route[1:]  # the origin itself
+        self.plans[key] = route
+        return route
+
+    #
+    # next_step()
+    #
+    def next_step(self, ox, oy, dx, dy):
+        """Get the first step of a route.  Steps towards the next portal of the plan follow the portal's distances into
+        the room the plan crosses to reach it; steps on the last leg follow the distances to the destination.
+
+        Arguments:
+        ox, oy - origin
+        dx, dy - destination
+
+        Returns:
+        (x, y) of the step, or None if there is no way or the origin is the destination
+
+        """
+        if (ox, oy) == (dx, dy):
+            return None
+        route = self.plan(ox, oy, dx, dy)
+        if route is None:
+            return None
+
+        if route:
+            portal, room = route[0]
+            goal = portal.x, portal.y
+            distances = self.field(portal, room)
+        else:
+            room = self.room_of[dx][dy]
+            goal = dx, dy
+            distances = self.target(dx, dy)
+
+        best = distances.get((ox, oy))
+        step = None
+        for cell in self.room_links(room).get((ox, oy), ()):
+            distance = distances.get(cell)
+            if distance is None or (cell in self.portals and cell != goal):
+                continue  # outside the room, or another door or window
+            if distance < best:
+                best, step = distance, cell
+        if step is None:
+            return None
+
+        # The rest of the plan still holds from the step, so walking it needs no more planning.  Steps within the
+        # destination's room are planned afresh, as going straight there may then be as short as the plan.
+        if route and self.room_of[step[0]][step[1]] != self.room_of[dx][dy] and len(self.plans) < ROOM_PLAN_CACHE_SIZE:
+            self.plans[(step, (dx, dy))] = route[1:] if step == goal else route
+        return step
+
+    #
+    # route()
+    #
+    def route(self, ox, oy, dx, dy):
+        """Get a whole route, by following next_step() to the destination.  Each step is one nearer, so the route is
+        never longer than the number of tiles on the map - if it were, something is wrong, and no route is given.
+
+        Arguments:
+        ox, oy - origin
+        dx, dy - destination
+
+        Returns:
+        list of (x, y) steps, not including the origin, or None if there is no way
+
+        """
+        steps = []
+        x, y = ox, oy
+        for i in range(self.map.x_max * self.map.y_max):
+            if (x, y) == (dx, dy):
+                return steps
+            step = self.next_step(x, y, dx, dy)
+            if step is None:
+                return None
+            steps.append(step)
+            x, y = step
+        return None
+
+#
+# portal_usable()
+#
+def portal_usable(fixture):
+    """Whether a route may go through a door or window.  Closed doors can be opened on the way (as the player does by
+    walking into them) unless locked; windows must be opened deliberately, so only open ones are usable."""
+    if hasattr(fixture, "locked"):
+        return not fixture.locked
+    return not fixture.blocks_move
@@ -3,6 +3,8 @@
 #
 # Imports
 #
+import libtcodpy as libtcod
+import backend
 
 #
 # Screen
@@ -30,6 +32,7 @@ class Screen(object):
         self.active = False
         self.show = False
         self.order = 1
+        self.dirty = True  # whether the screen needs to be drawn again
        
     #
     # show()
@@ -44,9 +47,26 @@ class Screen(object):
         self.show = True
         self.active = True
         self.order = order
+        self.dirty = True
         
     def hide_and_deactivate(self):
         """Sets the screen to be hidden and lose the input focus."""
         self.show = False
         self.active = False
+
+    #
+    # clear()
+    #
+    def clear(self):
+        """Blank the screen's area of the root console."""
+        backend.current.console_set_default_background(0, libtcod.black)
+        backend.current.console_rect(0, self.x_offset, self.y_offset, self.width, self.height, True, libtcod.BKGND_SET)
+
+    #
+    # invalidate()
+    #
+    def invalidate(self):
+        """Marks the screen as needing to be drawn again, because something it shows has changed.  Screens which are
+        not dirty are not redrawn, and whatever they last drew is left on the console."""
+        self.dirty = True
     
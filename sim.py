@@ -1,8 +1,267 @@
-"""Main simulation for the world."""
+"""Main simulation for the world.
+
+Entities which act on their own (those with a turn() method) are kept in a Scheduler: a heap ordered by the time of
+their next action.  Time is counted in ticks, TURN_TICKS to each of the player's turns.  An entity's turn() returns how
+many ticks the action took at normal speed (or None for a standard action), which is scaled by the entity's speed to give
+the time of its next action.  Each player turn, only the entities whose actions fall due are popped and run, so the cost
+is the number of actions taken rather than the number of entities.
+
+Only entities near the player, or near a recent event, are simulated (see ActiveZone).  The rest are put to sleep - taken
+out of the heap - and fast-forwarded when they wake, by telling them how many actions they missed.
+"""
+
+#
+# Imports
+#
+import heapq
+import itertools
+from common import *
+
+#
+# Scheduler
+#
+class Scheduler(object):
+    """Priority queue of acting entities, keyed on the time of their next action.  Entities due at the same time act in
+    the order they were scheduled."""
+
+    #
+    # __init__()
+    #
+    def __init__(self):
+        """Create empty scheduler, at time 0."""
+        self.time = 0
+        self.heap = []      # [time, sequence, entity] entries.  Removed entities' entries have entity set to None.
+        self.entries = {}   # entity id -> its entry in the heap
+        self.dormant = {}   # entity id -> (entity, time put to sleep, ticks it then had until its next action)
+        self.sequence = itertools.count()
+
+    #
+    # __len__()
+    #
+    def __len__(self):
+        """Number of entities scheduled."""
+        return len(self.entries)
+
+    #
+    # __contains__()
+    #
+    def __contains__(self, entity):
+        return entity.id in self.entries
+
+    #
+    # add()
+    #
+    def add(self, entity, delay = None):
+        """Schedule an entity to act, replacing any action it already had scheduled.  O(log n).
+
+        Arguments:
+        entity - entity with a turn() method
+        delay - ticks from now until it acts, or None for one standard action at the entity's speed
+
+        """
+        self.remove(entity)
+        if delay is None:
+            delay = action_time(entity, TURN_TICKS)
+        entry = [self.time + delay, next(self.sequence), entity]
+        self.entries[entity.id] = entry
+        heapq.heappush(self.heap, entry)
+
+    #
+    # remove()
+    #
+    def remove(self, entity):
+        """Stop an entity acting, whether it is active or asleep.  Its heap entry is only marked as removed, and is
+        dropped when it reaches the top of the heap.  Does nothing if the entity is not scheduled.
+
+        Arguments:
+        entity - entity to remove
+
+        """
+        entry = self.entries.pop(entity.id, None)
+        if entry is not None:
+            entry[2] = None
+        self.dormant.pop(entity.id, None)
+
+    #
+    # sleep()
+    #
+    def sleep(self, entity):
+        """Take an active entity out of the heap until it is woken, remembering how long it had until its next action.
+
+        Arguments:
+        entity - entity to put to sleep
+
+        """
+        entry = self.entries.pop(entity.id, None)
+        if entry is not None:
+            entry[2] = None
+            self.dormant[entity.id] = entity, self.time, entry[0] - self.time
+
+    #
+    # wake()
+    #
+    def wake(self, entity):
+        """Put a sleeping entity back in the heap.  If it would have acted while asleep, its fast_forward() method (if it
+        has one) is called with the number of actions it missed, and it is scheduled as if it had taken them.
+
+        Arguments:
+        entity - entity to wake
+
+        """
+        entity, slept, remaining = self.dormant.pop(entity.id)
+        elapsed = self.time - slept
+        if elapsed < remaining:
+            self.add(entity, remaining - elapsed)
+            return
+
+        missed = elapsed - remaining
+        step = action_time(entity, TURN_TICKS)
+        if hasattr(entity, "fast_forward"):
+            entity.fast_forward(1 + missed // step)
+        if entity.owner is not None and entity.id not in self.entries:
+            self.add(entity, step - missed % step)
+
+    #
+    # next_time()
+    #
+    def next_time(self):
+        """Get the time of the next action, or None if nothing is scheduled."""
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    #
+    # run_until()
+    #
+    def run_until(self, time):
+        """Run every action due up to and including a time, in order, and move the clock on to it.  Entities may be added
+        or removed by the actions being run.
+
+        Arguments:
+        time - time to run to
+
+        Returns:
+        number of actions run
+
+        """
+        actions = 0
+        while True:
+            due = self.next_time()
+            if due is None or due > time:
+                break
+
+            entry = heapq.heappop(self.heap)
+            entity = entry[2]
+            del self.entries[entity.id]
+            self.time = due
+
+            ticks = entity.turn()
+            actions += 1
+            if entity.id not in self.entries and entity.owner is not None:
+                self.add(entity, action_time(entity, TURN_TICKS if ticks is None else ticks))
+
+        self.time = time
+        return actions
+
+#
+# ActiveZone
+#
+class ActiveZone(object):
+    """The part of a map where entities are simulated: within a radius of the player, and of recent events (eg a noise
+    which should draw entities in).  Keeps a map's scheduler in step with it, so that the work done each turn depends on
+    how many entities are near the player rather than how many there are in all."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, map, radius = ACTIVE_RADIUS):
+        """Create zone.
+
+        Arguments:
+        map - map whose scheduler to manage
+        radius - distance from the player within which entities are active
+
+        """
+        self.map = map
+        self.radius = radius
+        self.events = []  # (x, y, radius, time the event stops keeping the area active)
+
+    #
+    # add_event()
+    #
+    def add_event(self, x, y, radius = None, ticks = EVENT_TICKS):
+        """Keep the area around something interesting active for a while.
+
+        Arguments:
+        x - x-position of event
+        y - y-position of event
+        radius - distance within which entities are active, or None for the zone's radius
+        ticks - how long the area is kept active for
+
+        """
+        self.events.append((x, y, self.radius if radius is None else radius, self.map.scheduler.time + ticks))
+
+    #
+    # update()
+    #
+    def update(self, focus):
+        """Wake the sleeping entities which are now in the zone, and put to sleep the active entities which are not.
+        This looks at the entities in the zone and the active entities only, never at the sleeping ones outside it.
+
+        Arguments:
+        focus - the entity the zone is centred on, ie the player
+
+        """
+        scheduler = self.map.scheduler
+        self.events = [event for event in self.events if event[3] > scheduler.time]
+        centres = [(focus.x, focus.y, self.radius)] + [(x, y, radius) for x, y, radius, expiry in self.events]
+
+        for x, y, radius in centres:
+            for entity in self.map.entities.in_radius(x, y, radius):
+                if entity.id in scheduler.dormant:
+                    scheduler.wake(entity)
+
+        for entry in scheduler.entries.values():
+            entity = entry[2]
+            if not any((entity.x - x) * (entity.x - x) + (entity.y - y) * (entity.y - y) <= radius * radius
+                       for x, y, radius in centres):
+                scheduler.sleep(entity)
+
+#
+# action_time()
+#
+def action_time(entity, ticks):
+    """Get how long an action takes an entity, scaled by its speed.  Always at least one tick, so that an entity cannot
+    act twice at the same time.
+
+    Arguments:
+    entity - entity acting
+    ticks - how long the action takes at NORMAL_SPEED
+
+    """
+    return max(1, ticks * NORMAL_SPEED // entity.speed)
+
+#
+# is_actor()
+#
+def is_actor(entity):
+    """Whether an entity acts on its own, ie should be scheduled."""
+    return hasattr(entity, "turn")
 
 #
 # update_world()
 #
-def update_world():
-    return True
-    
+def update_world(map, focus = None):
+    """Simulate the world for one of the player's turns.
+
+    Arguments:
+    map - the map the player is on
+    focus - the player, to centre the active zone on, or None to simulate every entity
+
+    Returns:
+    number of actions taken by other entities
+
+    """
+    if focus is not None:
+        map.active_zone.update(focus)
+    return map.scheduler.run_until(map.scheduler.time + TURN_TICKS)
@@ -0,0 +1,107 @@
+"""Benchmark of the world simulation.  Fills open-plan levels of increasing size with grunts, at the same density, and
+times sim.update_world() per turn with and without the active zone.  With the active zone, the cost per turn should stay
+roughly flat as the population grows, as only the grunts near the player are simulated.
+
+Usage: python sim_benchmark.py [--populations 250,500,1000,2000,4000] [--turns 50]
+"""
+
+#
+# Imports
+#
+import sys
+import math
+import random
+import timeit
+import optparse
+from common import *
+import sim
+import mapgen
+from map import Map
+from fov import FovEngine
+from entities.human import Human
+from entities.grunt import Grunt
+
+#
+# Number of floor tiles per grunt.
+#
+TILES_PER_GRUNT = 20
+
+#
+# open_plan()
+#
+def open_plan(size):
+    """Get a level function for a square, open-plan floor.
+
+    Arguments:
+    size - width and height of the level
+
+    """
+    def level(map):
+        map.set_size(size, size, mapgen.LAMINATE_FLOOR)
+        map.entry_point = size // 2, size // 2
+    return level
+
+#
+# run()
+#
+def run(population, turns, active_zone):
+    """Time the simulation of one level.
+
+    Arguments:
+    population - number of grunts
+    turns - number of player turns to simulate
+    active_zone - whether to only simulate the grunts near the player
+
+    Returns:
+    tuple of (milliseconds per turn, actions per turn)
+
+    """
+    size = int(math.ceil(math.sqrt(population * TILES_PER_GRUNT)))
+    map = Map(open_plan(size), seed = population, fov_engine = FovEngine.SHADOWCAST)
+    player = Human("Benchmark", "male", 15, 0)
+    map.add_entity(map.entry_point[0], map.entry_point[1], player)
+    map.player = player
+
+    cells = [(x, y) for x in range(size) for y in range(size) if (x, y) != map.entry_point]
+    for x, y in random.sample(cells, population):
+        map.add_entity(x, y, Grunt())
+
+    focus = player if active_zone else None
+    sim.update_world(map, focus)  # put the grunts outside the zone to sleep before timing
+
+    actions = 0
+    start = timeit.default_timer()
+    for turn in range(turns):
+        actions += sim.update_world(map, focus)
+    elapsed = timeit.default_timer() - start
+
+    map.close()
+    return elapsed * 1000 / turns, float(actions) / turns
+
+#
+# main()
+#
+def main(argv = None):
+    """Run the benchmark and print a table of the results."""
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '--populations', dest='populations', default='250,500,1000,2000,4000',
+        help='Comma-separated numbers of grunts to try.')
+    parser.add_option(
+        '--turns', type='int', dest='turns', default=50,
+        help='Number of turns to time for each population.')
+    settings, args = parser.parse_args(argv)
+
+    print "%10s %16s %16s %16s %16s" % ("grunts", "all: ms/turn", "all: actions", "zone: ms/turn", "zone: actions")
+    for population in [int(p) for p in settings.populations.split(',')]:
+        all_ms, all_actions = run(population, settings.turns, False)
+        zone_ms, zone_actions = run(population, settings.turns, True)
+        print "%10d %16.2f %16.1f %16.2f %16.1f" % (population, all_ms, all_actions, zone_ms, zone_actions)
+
+    return 0
+
+#
+# Execute in non-import mode.
+#
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Spatial index of the entities on a map."""
+
+#
+# Imports
+#
+import collections
+from common import *
+
+#
+# Size (in tiles) of the square chunks entities are bucketed by.
+#
+CHUNK_SIZE = 16
+
+#
+# EntityIndex
+#
+class EntityIndex(object):
+    """Registry of the entities on a map, keyed by entity id, plus a spatial hash bucketing them by chunk.  Adding,
+    removing and moving entities are all O(1), and region queries only look at the chunks which overlap the region.
+    Iterating over the index returns entities in the order they were added.
+    """
+
+    #
+    # __init__()
+    #
+    def __init__(self, chunk_size = CHUNK_SIZE):
+        """Create empty index.
+
+        Arguments:
+        chunk_size - size (in tiles) of the square chunks to bucket entities by
+
+        """
+        self.chunk_size = chunk_size
+        self.registry = collections.OrderedDict()  # entity id -> (entity, chunk key)
+        self.chunks = {}                           # chunk key -> set of entities
+
+    #
+    # __iter__()
+    #
+    def __iter__(self):
+        """Iterate over all entities."""
+        for entity, key in self.registry.values():
+            yield entity
+
+    #
+    # __len__()
+    #
+    def __len__(self):
+        """Number of entities."""
+        return len(self.registry)
+
+    #
+    # __contains__()
+    #
+    def __contains__(self, entity):
+        """Whether an entity is in the index."""
+        return entity.id in self.registry
+
+    #
+    # get()
+    #
+    def get(self, id):
+        """Look an entity up by its id.
+
+        Arguments:
+        id - the entity's id
+
+        Returns:
+        the entity, or None if it is not in the index
+
+        """
+        entry = self.registry.get(id)
+        return entry[0] if entry else None
+
+    #
+    # add()
+    #
+    def add(self, entity):
+        """Add an entity at its current position.
+
+        Arguments:
+        entity - entity to add
+
+        """
+        if entity.id in self.registry:
+            raise LogicException("Entity added to the index twice.")
+
+        key = entity.x // self.chunk_size, entity.y // self.chunk_size
+        self.registry[entity.id] = entity, key
+        self.chunks.setdefault(key, set()).add(entity)
+
+    #
+    # remove()
+    #
+    def remove(self, entity):
+        """Remove an entity.  Its position is not needed, so it may already have been changed.
+
+        Arguments:
+        entity - entity to remove
+
+        """
+        entry = self.registry.pop(entity.id, None)
+        if entry is None:
+            raise LogicException("Tried to remove an entity which is not in the index.")
+
+        self._remove_from_chunk(entity, entry[1])
+
+    #
+    # move()
+    #
+    def move(self, entity):
+        """Update the index after an entity's position has changed.
+
+        Arguments:
+        entity - entity which has moved
+
+        """
+        old_key = self.registry[entity.id][1]
+        key = entity.x // self.chunk_size, entity.y // self.chunk_size
+        if key != old_key:
+            self._remove_from_chunk(entity, old_key)
+            self.chunks.setdefault(key, set()).add(entity)
+            self.registry[entity.id] = entity, key
+
+    #
+    # _remove_from_chunk()
+    #
+    def _remove_from_chunk(self, entity, key):
+        """Remove an entity from a chunk's bucket, dropping the bucket if it is now empty."""
+        bucket = self.chunks[key]
+        bucket.discard(entity)
+        if not bucket:
+            del self.chunks[key]
+
+    #
+    # in_rect()
+    #
+    def in_rect(self, x0, y0, x1, y1):
+        """Get the entities within a rectangle.
+
+        Arguments:
+        x0 - left edge (inclusive)
+        y0 - top edge (inclusive)
+        x1 - right edge (inclusive)
+        y1 - bottom edge (inclusive)
+
+        Returns:
+        list of entities, ordered by position (top to bottom, then left to right)
+
+        """
+        found = []
+        size = self.chunk_size
+        for cx in range(x0 // size, x1 // size + 1):
+            for cy in range(y0 // size, y1 // size + 1):
+                bucket = self.chunks.get((cx, cy))
+                if bucket:
+                    found.extend(e for e in bucket if x0 <= e.x <= x1 and y0 <= e.y <= y1)
+
+        found.sort(key = lambda e: (e.y, e.x, e.id))
+        return found
+
+    #
+    # in_radius()
+    #
+    def in_radius(self, x, y, radius):
+        """Get the entities within a given distance of a point.
+
+        Arguments:
+        x - x-position of centre
+        y - y-position of centre
+        radius - maximum (Euclidean) distance
+
+        Returns:
+        list of entities, ordered by position
+
+        """
+        radius_sq = radius * radius
+        return [e for e in self.in_rect(x - radius, y - radius, x + radius, y + radius)
+                if (e.x - x) * (e.x - x) + (e.y - y) * (e.y - y) <= radius_sq]
+
+    #
+    # in_fov()
+    #
+    def in_fov(self, fov_result):
+        """Get the entities which are visible to a viewer.  Only the chunks overlapping the result's window are looked
+        at.
+
+        Arguments:
+        fov_result - fov.FovResult, as returned by Map.compute_fov()
+
+        Returns:
+        list of entities, ordered by position
+
+        """
+        return [e for e in self.in_rect(fov_result.x0, fov_result.y0, fov_result.x1 - 1, fov_result.y1 - 1)
+                if fov_result.is_visible(e.x, e.y)]
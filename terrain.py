@@ -0,0 +1,191 @@
+"""Pre-rendered terrain for the map screen.  The level's terrain is drawn once into off-screen consoles, one per square
+chunk of the map, in two layers: lit (as the terrain looks in view) and remembered (seen tiles in their memory colour,
+unseen tiles black).  The map screen then builds each frame by blitting these, and only draws the dynamic parts (entities,
+items, doors and windows) cell by cell.
+"""
+
+#
+# Imports
+#
+import libtcodpy as libtcod
+import backend
+from common import *
+
+try:  # NumPy is optional - if it is available, visible runs are found with array operations
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+#
+# Size (in tiles) of the square chunks the terrain is drawn in.
+#
+TERRAIN_CHUNK_SIZE = 32
+
+#
+# TerrainCache
+#
+class TerrainCache(object):
+    """Lit and remembered terrain consoles for a map, built a chunk at a time as they are first needed.  Cells are drawn
+    again when the map reports a change to them (see Map.tile_watchers), or when they are first seen.
+    """
+
+    #
+    # __init__()
+    #
+    def __init__(self, map, chunk_size = TERRAIN_CHUNK_SIZE):
+        """Create cache.  No consoles are created until they are needed.
+
+        Arguments:
+        map - the map to draw
+        chunk_size - width and height of the chunk consoles
+
+        """
+        self.map = map
+        self.chunk_size = chunk_size
+        self.lit = {}     # (cx, cy) -> console
+        self.memory = {}  # (cx, cy) -> console
+        map.tile_watchers.append(self.tile_changed)
+
+    #
+    # close()
+    #
+    def close(self):
+        """Delete the consoles, and stop watching the map."""
+        for con in self.lit.values() + self.memory.values():
+            backend.current.console_delete(con)
+        self.lit = {}
+        self.memory = {}
+        self.map.tile_watchers.remove(self.tile_changed)
+
+    #
+    # draw_lit_cell()
+    #
+    def draw_lit_cell(self, con, x, y):
+        """Draw a tile's lit terrain onto its chunk console: its background, with a '.' on open floor."""
+        tile = self.map.tiles[x][y]
+        char = '.' if not tile.block_move else ' '
+        backend.current.console_put_char_ex(con, x % self.chunk_size, y % self.chunk_size, char, libtcod.black, tile.bcolour)
+
+    #
+    # draw_memory_cell()
+    #
+    def draw_memory_cell(self, con, x, y):
+        """Draw a tile's remembered terrain onto its chunk console: its memory colour if seen, otherwise black."""
+        tile = self.map.tiles[x][y]
+        back = tile.memory_colour if tile.seen else libtcod.black
+        backend.current.console_put_char_ex(con, x % self.chunk_size, y % self.chunk_size, ' ', libtcod.black, back)
+
+    #
+    # _chunk()
+    #
+    def _chunk(self, layer, key, draw_cell):
+        """Get a chunk console of a layer, drawing it if it does not exist yet."""
+        con = layer.get(key)
+        if con is None:
+            con = layer[key] = backend.current.console_new(self.chunk_size, self.chunk_size)
+            cx, cy = key
+            for x in range(cx * self.chunk_size, min(self.map.x_max, (cx + 1) * self.chunk_size)):
+                for y in range(cy * self.chunk_size, min(self.map.y_max, (cy + 1) * self.chunk_size)):
+                    draw_cell(con, x, y)
+        return con
+
+    #
+    # tile_changed()
+    #
+    def tile_changed(self, x, y):
+        """Called by the map when a tile may have changed.  Only chunks which have already been drawn need updating."""
+        key = x // self.chunk_size, y // self.chunk_size
+        if key in self.lit:
+            self.draw_lit_cell(self.lit[key], x, y)
+        if key in self.memory:
+            self.draw_memory_cell(self.memory[key], x, y)
+
+    #
+    # mark_seen()
+    #
+    def mark_seen(self, x, y):
+        """Mark a tile as seen, and add it to the remembered terrain if it had not been seen before."""
+        tile = self.map.tiles[x][y]
+        if not tile.seen:
+            tile.seen = True
+            key = x // self.chunk_size, y // self.chunk_size
+            if key in self.memory:
+                self.draw_memory_cell(self.memory[key], x, y)
+
+    #
+    # _blit()
+    #
+    def _blit(self, layer, draw_cell, x0, y0, x1, y1, x_dest, y_dest):
+        """Blit a region of a layer to the root console, one chunk at a time."""
+        size = self.chunk_size
+        for cx in range(x0 // size, (x1 - 1) // size + 1):
+            for cy in range(y0 // size, (y1 - 1) // size + 1):
+                con = self._chunk(layer, (cx, cy), draw_cell)
+                bx0, by0 = max(x0, cx * size), max(y0, cy * size)
+                bx1, by1 = min(x1, (cx + 1) * size), min(y1, (cy + 1) * size)
+                backend.current.console_blit(con, bx0 - cx * size, by0 - cy * size, bx1 - bx0, by1 - by0, 0,
+                                             x_dest + bx0 - x0, y_dest + by0 - y0)
+
+    #
+    # blit_memory()
+    #
+    def blit_memory(self, x0, y0, x1, y1, x_dest, y_dest):
+        """Blit a region of the remembered terrain to the root console.
+
+        Arguments:
+        x0, y0, x1, y1 - world region to blit (x1 and y1 exclusive)
+        x_dest, y_dest - where on the root console to blit it to
+
+        """
+        self._blit(self.memory, self.draw_memory_cell, x0, y0, x1, y1, x_dest, y_dest)
+
+    #
+    # blit_lit()
+    #
+    def blit_lit(self, x0, y0, x1, y1, x_dest, y_dest):
+        """Blit a region of the lit terrain to the root console.
+
+        Arguments:
+        x0, y0, x1, y1 - world region to blit (x1 and y1 exclusive)
+        x_dest, y_dest - where on the root console to blit it to
+
+        """
+        self._blit(self.lit, self.draw_lit_cell, x0, y0, x1, y1, x_dest, y_dest)
+
+#
+# visible_runs()
+#
+def visible_runs(visible_map, x0, y0, x1, y1):
+    """Split the visible part of a region into horizontal runs of visible tiles, so that each can be drawn with one blit.
+
+    Arguments:
+    visible_map - fov.FovResult from Map.compute_fov()
+    x0, y0, x1, y1 - world region (x1 and y1 exclusive)
+
+    Returns:
+    list of (y, x_start, x_end), x_end exclusive
+
+    """
+    runs = []
+    visible_region = visible_map.region(x0, y0, x1, y1)
+    if numpy_available and isinstance(visible_region, numpy.ndarray):
+        rows = visible_region.T
+        edges = numpy.zeros((rows.shape[0], rows.shape[1] + 2), dtype = numpy.int8)
+        edges[:, 1:-1] = rows
+        steps = numpy.diff(edges, axis = 1)
+        starts_y, starts_x = numpy.nonzero(steps == 1)
+        ends_y, ends_x = numpy.nonzero(steps == -1)
+        for y, start, end in zip(starts_y.tolist(), starts_x.tolist(), ends_x.tolist()):
+            runs.append((y0 + y, x0 + start, x0 + end))
+    else:
+        for y in range(y0, y1):
+            start = None
+            for x in range(x0, x1 + 1):
+                visible = x < x1 and visible_region[x - x0][y - y0]
+                if visible and start is None:
+                    start = x
+                elif not visible and start is not None:
+                    runs.append((y, start, x))
+                    start = None
+    return runs
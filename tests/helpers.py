@@ -0,0 +1,62 @@
+"""Helpers shared by the tests.  The tests run headless, without the libtcod native library, and from the top of the
+repository (so that level files are found):
+
+    python -m unittest discover -s tests -t .
+"""
+
+#
+# Imports
+#
+import libtcodpy as libtcod
+import backend
+import ui
+import mapgen
+from map import Map, TileStorage
+from fov import FovEngine
+import maps.ground_control
+
+#
+# use_headless()
+#
+def use_headless():
+    """Draw to an in-memory console, and give actions somewhere to put their messages."""
+    if not isinstance(backend.current, backend.HeadlessBackend):
+        backend.use(backend.HeadlessBackend(backend.ScriptedInput('')))
+    ui.Screens.msg = ui.MessageScreen(0, 0, 40, 5)
+
+#
+# root_console()
+#
+def root_console(width, height):
+    """Set up headless drawing to a root console of a given size, and get the console (see backend.MemoryConsole)."""
+    use_headless()
+    backend.current.console_init_root(width, height, "test")
+    backend.current.console_set_background_flag(0, libtcod.BKGND_SET)
+    return backend.current.root
+
+#
+# open_plan()
+#
+def open_plan(width, height, walls = ()):
+    """Get a level function for an empty floor, with walls at some positions.
+
+    Arguments:
+    width - width of the level
+    height - height of the level
+    walls - sequence of (x, y) to put walls at
+
+    """
+    def level(map):
+        map.set_size(width, height, mapgen.LAMINATE_FLOOR)
+        for x, y in walls:
+            map.tiles[x][y] = mapgen.create_wall(x, y)
+        map.entry_point = 0, 0
+    return level
+
+#
+# level_1()
+#
+def level_1(seed = 1, tile_storage = TileStorage.LIST):
+    """Build the first Ground Control level, with the pure Python FOV engine."""
+    use_headless()
+    return Map(maps.ground_control.level_1_raw, seed, tile_storage = tile_storage, fov_engine = FovEngine.SHADOWCAST)
@@ -0,0 +1,168 @@
+"""Tests for fov, and the FOV results cached on the map."""
+
+#
+# Imports
+#
+import random
+import unittest
+from tests import helpers
+import fov
+import mapgen
+from map import Map
+from fov import FovEngine
+from entities.human import Human
+
+#
+# ShadowcastTest
+#
+class ShadowcastTest(unittest.TestCase):
+    """The pure Python shadowcasting engine."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        """Make a 20x20 area with random pillars."""
+        rng = random.Random(1)
+        self.size = 20
+        self.transparent = [[rng.random() > 0.25 for y in range(self.size)] for x in range(self.size)]
+
+    #
+    # cells()
+    #
+    def cells(self, x, y, radius = 0):
+        return fov.visible_cells(self.transparent, self.size, self.size, x, y, radius)
+
+    #
+    # check_symmetry()
+    #
+    def check_symmetry(self, radius):
+        """Check that every open tile sees another exactly when it is seen by it."""
+        floor = [(x, y) for x in range(self.size) for y in range(self.size) if self.transparent[x][y]]
+        seen = dict((cell, self.cells(cell[0], cell[1], radius)) for cell in floor)
+        for a in floor:
+            for b in floor:
+                self.assertEqual(b in seen[a], a in seen[b], "%s and %s" % (a, b))
+
+    #
+    # test_symmetry()
+    #
+    def test_symmetry(self):
+        self.check_symmetry(0)
+
+    #
+    # test_symmetry_radius()
+    #
+    def test_symmetry_radius(self):
+        self.check_symmetry(6)
+
+    #
+    # test_walls()
+    #
+    def test_walls(self):
+        """The viewer and the walls next to it are seen, but not what is behind a wall."""
+        transparent = [[True] * 5 for x in range(5)]
+        transparent[2][1] = False
+        cells = fov.visible_cells(transparent, 5, 5, 2, 2, 0)
+        self.assertIn((2, 2), cells)
+        self.assertIn((2, 1), cells)
+        self.assertNotIn((2, 0), cells)
+
+    #
+    # test_array()
+    #
+    def test_array(self):
+        """compute_fov() gives the same tiles as visible_cells()."""
+        visible = fov.compute_fov(self.transparent, self.size, self.size, 5, 5, 8)
+        cells = set((x, y) for x in range(self.size) for y in range(self.size) if visible.is_visible(x, y))
+        self.assertEqual(cells, self.cells(5, 5, 8))
+        self.assertEqual(set(visible.cells()), cells)
+
+    #
+    # test_window()
+    #
+    def test_window(self):
+        """compute_fov() only keeps the window within the view radius, and region() reads outside it as not visible."""
+        visible = fov.compute_fov(self.transparent, self.size, self.size, 10, 10, 4)
+        self.assertEqual((visible.x0, visible.y0, visible.x1, visible.y1), (6, 6, 15, 15))
+        self.assertEqual(len(visible.visible), 9)
+
+        cells = self.cells(10, 10, 4)
+        region = visible.region(-5, 8, 25, 12)
+        for x in range(-5, 25):
+            for y in range(8, 12):
+                self.assertEqual(bool(region[x + 5][y - 8]), (x, y) in cells)
+                self.assertEqual(visible.is_visible(x, y), (x, y) in cells)
+
+#
+# FovCacheTest
+#
+class FovCacheTest(unittest.TestCase):
+    """FOV results cached on the map (see Map.compute_fov())."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        """Build a map split by a wall at x = 5, with a closed door at (5, 5)."""
+        helpers.use_headless()
+        self.map = Map(helpers.open_plan(12, 12), fov_engine = FovEngine.SHADOWCAST)
+        for y in range(12):
+            self.map.tiles[5][y] = mapgen.create_door(5, y) if y == 5 else mapgen.create_wall(5, y)
+        self.map.refresh_fov_map()
+        self.viewer = Human("Viewer", "male", 10, 0)
+        self.map.add_entity(2, 5, self.viewer)
+
+    #
+    # tearDown()
+    #
+    def tearDown(self):
+        self.map.close()
+
+    #
+    # test_cached()
+    #
+    def test_cached(self):
+        """Asking again, with nothing changed, gives the cached result."""
+        visible = self.map.compute_fov(self.viewer)
+        self.assertIs(self.map.compute_fov(self.viewer), visible)
+
+    #
+    # test_revision()
+    #
+    def test_revision(self):
+        """A change to what blocks sight means the result is worked out again, but other changes do not."""
+        visible = self.map.compute_fov(self.viewer)
+        self.map.tiles[5][5].door.action_lock()
+        self.assertIs(self.map.compute_fov(self.viewer), visible)
+
+        self.map.tiles[5][5].door.action_unlock()
+        self.map.tiles[5][5].door.action_open()
+        opened = self.map.compute_fov(self.viewer)
+        self.assertIsNot(opened, visible)
+        self.assertTrue(opened.is_visible(8, 5))
+        self.assertFalse(visible.is_visible(8, 5))
+
+    #
+    # test_moved()
+    #
+    def test_moved(self):
+        """Results are kept for each position, so moving back finds the earlier one."""
+        visible = self.map.compute_fov(self.viewer)
+        self.map.move_entity(self.viewer, 3, 5)
+        self.assertIsNot(self.map.compute_fov(self.viewer), visible)
+        self.map.move_entity(self.viewer, 2, 5)
+        self.assertIs(self.map.compute_fov(self.viewer), visible)
+
+    #
+    # test_size()
+    #
+    def test_size(self):
+        """No more than fov_cache_size results are kept."""
+        for y in range(12):
+            self.map.move_entity(self.viewer, 2, y)
+            self.map.compute_fov(self.viewer)
+        self.assertEqual(len(self.map.fov_cache), self.map.fov_cache_size)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Tests for goal_map."""
+
+#
+# Imports
+#
+import unittest
+from tests import helpers
+from map import Map
+from fov import FovEngine
+from entities.human import Human
+
+#
+# GoalMapTest
+#
+class GoalMapTest(unittest.TestCase):
+    """Distances to the player, and the steps taken towards them."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        """Build a map with a wall at (3, 3), and put the player diagonally past it."""
+        helpers.use_headless()
+        self.map = Map(helpers.open_plan(8, 8, [(3, 3)]), fov_engine = FovEngine.SHADOWCAST)
+        self.map.player = Human("Player", "male", 10, 0)
+        self.map.add_entity(4, 3, self.map.player)
+
+    #
+    # tearDown()
+    #
+    def tearDown(self):
+        self.map.close()
+
+    #
+    # test_distances()
+    #
+    def test_distances(self):
+        """Distances count straight and diagonal steps alike, but not diagonals past a corner."""
+        goal_map = self.map.goal_maps.approach_player()
+        self.assertEqual(goal_map.distance(4, 3), 0)
+        self.assertEqual(goal_map.distance(6, 5), 2)
+        self.assertEqual(goal_map.distance(3, 4), 2)
+        self.assertEqual(goal_map.distance(2, 3), 4)
+
+    #
+    # test_next_step()
+    #
+    def test_next_step(self):
+        """Steps head downhill, around the corner of the wall rather than across it."""
+        goal_map = self.map.goal_maps.approach_player()
+        self.assertEqual(goal_map.next_step(6, 5), (5, 4))
+        self.assertEqual(goal_map.next_step(3, 4), (4, 4))
+        self.assertFalse(goal_map.update([(4, 3)]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""Tests for level_cache."""
+
+#
+# Imports
+#
+import os
+import shutil
+import tempfile
+import unittest
+from tests import helpers
+import level_cache
+from map import Map, TileStorage
+from fov import FovEngine
+import maps.ground_control
+
+#
+# LevelCacheTest
+#
+class LevelCacheTest(unittest.TestCase):
+    """Levels written to and read back from the cache."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        helpers.use_headless()
+        self.cache_dir = tempfile.mkdtemp()
+
+    #
+    # tearDown()
+    #
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    #
+    # build()
+    #
+    def build(self):
+        """Build the first level with seed 1, using the cache."""
+        return Map(maps.ground_control.level_1_raw, 1, tile_storage = TileStorage.LIST, fov_engine = FovEngine.SHADOWCAST,
+                   cache_dir = self.cache_dir)
+
+    #
+    # test_round_trip()
+    #
+    def test_round_trip(self):
+        """A level loaded from the cache matches the one that was saved."""
+        built = self.build()
+        path = level_cache.cache_path(self.cache_dir, maps.ground_control.level_1_raw, 1)
+        self.assertTrue(os.path.exists(path))
+
+        loaded = Map(helpers.open_plan(1, 1), tile_storage = TileStorage.LIST, fov_engine = FovEngine.SHADOWCAST)
+        self.assertTrue(level_cache.load(loaded, maps.ground_control.level_1_raw, 1, self.cache_dir))
+
+        self.assertEqual((loaded.x_max, loaded.y_max), (built.x_max, built.y_max))
+        self.assertEqual(loaded.entry_point, built.entry_point)
+        self.assertEqual(loaded.source_files, built.source_files)
+        for x in range(built.x_max):
+            for y in range(built.y_max):
+                self.assertIs(loaded.tiles[x][y].tdef, built.tiles[x][y].tdef)
+                for name in ("door", "window"):
+                    self.assertEqual(getattr(loaded.tiles[x][y], name, None) is None,
+                                     getattr(built.tiles[x][y], name, None) is None)
+        self.assertEqual([(type(e), e.x, e.y) for e in loaded.entities], [(type(e), e.x, e.y) for e in built.entities])
+
+    #
+    # test_build_sources()
+    #
+    def test_build_sources(self):
+        """The code that builds levels, and the classes pickled into the cache, are among the dependencies."""
+        built = self.build()
+        paths = [os.path.relpath(path) for path, digest in level_cache.dependencies(built, maps.ground_control.level_1_raw)]
+        for path in ("mapgen.py", "entity.py", "inventory.py", os.path.join("entities", "grunt.py"),
+                     os.path.join("entities", "door.py")):
+            self.assertIn(path, paths)
+
+    #
+    # test_invalidated()
+    #
+    def test_invalidated(self):
+        """A change to an entity's source means the level is rebuilt rather than loaded."""
+        self.build()
+        file_hash = level_cache.file_hash
+        grunt = os.path.abspath(os.path.join("entities", "grunt.py"))
+        level_cache.file_hash = lambda path: "changed" if os.path.abspath(path) == grunt else file_hash(path)
+        try:
+            map = Map(helpers.open_plan(1, 1), tile_storage = TileStorage.LIST, fov_engine = FovEngine.SHADOWCAST)
+            self.assertFalse(level_cache.load(map, maps.ground_control.level_1_raw, 1, self.cache_dir))
+        finally:
+            level_cache.file_hash = file_hash
+
+if __name__ == '__main__':
+    unittest.main()
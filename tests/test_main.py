@@ -0,0 +1,66 @@
+"""Tests for main, run headless from a key script."""
+
+#
+# Imports
+#
+import os
+import shutil
+import tempfile
+import unittest
+from common import *
+import main
+
+#
+# HeadlessRunTest
+#
+class HeadlessRunTest(unittest.TestCase):
+    """The game driven by --keys on the headless backend, with the last frame written out by --dump-screen."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dump = os.path.join(self.directory, "screen.txt")
+
+    #
+    # tearDown()
+    #
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    #
+    # run_keys()
+    #
+    def run_keys(self, keys, *options):
+        """Run the first level (seed 1) with a key script, and get the dumped screen as a list of lines."""
+        argv = ["--headless", "--keys", keys, "--seed", "1", "--no-level-cache", "--dump-screen", self.dump]
+        self.assertEqual(main.main(argv + list(options)), 0)
+        with open(self.dump) as f:
+            return f.read().splitlines()
+
+    #
+    # test_walk()
+    #
+    def test_walk(self):
+        """Walking north from the entry point takes a turn per step, and ends on a medkit.  The frame for the last key
+        is not drawn, as the script has finished."""
+        lines = self.run_keys("UP UP UP UP UP UP UP")
+        self.assertEqual(len(lines), SCREEN_HEIGHT)
+        self.assertTrue(all(len(line) == SCREEN_WIDTH for line in lines))
+        self.assertTrue(lines[0].startswith("Turn: 7 "))
+        self.assertIn("You see a medkit on the ground.", "\n".join(lines[MSG_WINDOW[1]:]))
+
+    #
+    # test_render_modes()
+    #
+    def test_render_modes(self):
+        """Every render mode draws the first frame the same way, before anything has moved."""
+        screens = [self.run_keys("UP", "--render-mode", mode) for mode in ("direct", "dirty", "numpy", "terrain")]
+        self.assertTrue(screens[0][0].startswith("Turn: 1 "))
+        self.assertIn('@', "\n".join(screens[0]))
+        for screen in screens[1:]:
+            self.assertEqual(screen, screens[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Tests for map.Map."""
+
+#
+# Imports
+#
+import unittest
+from tests import helpers
+import mapgen
+from map import Map, TileStorage
+from fov import FovEngine
+from tile_chunks import ChunkedFlags
+from entities.human import Human
+
+#
+# MapFovTest
+#
+class MapFovTest(unittest.TestCase):
+    """Field of view results cached on the map."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        helpers.use_headless()
+
+    #
+    # check_refresh()
+    #
+    def check_refresh(self, tile_storage):
+        """Walls taken out by writing straight to the tiles are seen through once the FOV maps are refreshed, rather than
+        the cached view being used."""
+        wall = [(5, y) for y in range(12)]
+        map = Map(helpers.open_plan(12, 12, wall), tile_storage = tile_storage, fov_engine = FovEngine.SHADOWCAST)
+        viewer = Human("Viewer", "male", 10, 0)
+        map.add_entity(2, 5, viewer)
+        self.assertFalse(map.compute_fov(viewer).is_visible(8, 5))
+
+        for x, y in wall:
+            map.tiles[x][y] = mapgen.create_laminate_floor(x, y)
+        map.refresh_fov_map()
+        self.assertTrue(map.compute_fov(viewer).is_visible(8, 5))
+        map.close()
+
+    #
+    # test_refresh_list()
+    #
+    def test_refresh_list(self):
+        self.check_refresh(TileStorage.LIST)
+
+    #
+    # test_refresh_chunked()
+    #
+    def test_refresh_chunked(self):
+        self.check_refresh(TileStorage.CHUNKED)
+
+    #
+    # test_chunked_flags()
+    #
+    def test_chunked_flags(self):
+        """With chunked storage, transparency and passability are kept in the chunks and paged out with them."""
+        wall = [(x, y) for x in (40, 80) for y in range(12)]
+        map = Map(helpers.open_plan(100, 12, wall), tile_storage = TileStorage.CHUNKED, fov_engine = FovEngine.SHADOWCAST)
+        self.assertIsInstance(map.transparent, ChunkedFlags)
+        map.tiles.max_resident = 1
+
+        for x in (10, 40, 41, 80, 81, 40, 10):
+            self.assertEqual(map.passable[x][5], x not in (40, 80))
+            self.assertEqual(map.transparent[x][5], x not in (40, 80))
+        self.assertTrue(map.tiles.paged)
+
+        viewer = Human("Viewer", "male", 10, 0)
+        map.add_entity(38, 5, viewer)
+        self.assertFalse(map.compute_fov(viewer).is_visible(42, 5))
+        map.tiles[40][5] = mapgen.create_laminate_floor(40, 5)
+        map.update_tile(40, 5)
+        self.assertTrue(map.passable[40][5])
+        self.assertTrue(map.compute_fov(viewer).is_visible(42, 5))
+        map.close()
+
+    #
+    # test_update_tile()
+    #
+    def test_update_tile(self):
+        """Closing a door changes the map's revision, so the cached view is not used."""
+        map = Map(helpers.open_plan(12, 12), fov_engine = FovEngine.SHADOWCAST)
+        for y in range(12):
+            map.tiles[5][y] = mapgen.create_door(5, y) if y == 5 else mapgen.create_wall(5, y)
+        map.refresh_fov_map()
+        viewer = Human("Viewer", "male", 10, 0)
+        map.add_entity(2, 5, viewer)
+        door = map.tiles[5][5].door
+        self.assertFalse(map.compute_fov(viewer).is_visible(8, 5))
+
+        door.action_open()
+        self.assertTrue(map.compute_fov(viewer).is_visible(8, 5))
+        door.action_close()
+        self.assertFalse(map.compute_fov(viewer).is_visible(8, 5))
+        map.close()
+
+if __name__ == '__main__':
+    unittest.main()
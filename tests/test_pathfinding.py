@@ -0,0 +1,96 @@
+"""Tests for pathfinding."""
+
+#
+# Imports
+#
+import unittest
+from tests import helpers
+import mapgen
+from map import Map
+from fov import FovEngine
+from pathfinding import PathCache
+
+#
+# PathCacheTest
+#
+class PathCacheTest(unittest.TestCase):
+    """Routes kept by the path cache, and when they are dropped."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        """Build a map split by a wall at x = 5, with open doors at (5, 2) and (5, 9)."""
+        helpers.use_headless()
+        self.map = Map(helpers.open_plan(12, 12), fov_engine = FovEngine.SHADOWCAST)
+        for y in range(12):
+            self.map.tiles[5][y] = mapgen.create_door(5, y) if y in (2, 9) else mapgen.create_wall(5, y)
+        self.map.refresh_fov_map()
+        self.near = self.map.tiles[5][2].door
+        self.far = self.map.tiles[5][9].door
+        self.near.action_open()
+        self.far.action_open()
+
+    #
+    # tearDown()
+    #
+    def tearDown(self):
+        self.map.close()
+
+    #
+    # test_invalidation()
+    #
+    def test_invalidation(self):
+        """Closing a door drops the routes through it, but not others."""
+        paths = self.map.paths
+        route = paths.route(2, 2, 8, 2)
+        self.assertIn((5, 2), route)
+        kept = paths.lookup(2, 2, 8, 2)[0]
+
+        self.far.action_close()
+        self.assertIs(paths.lookup(2, 2, 8, 2)[0], kept)
+
+        self.near.action_close()
+        self.assertFalse(kept.valid)
+        self.assertIsNone(paths.route(2, 2, 8, 2))
+        self.far.action_open()
+        route = paths.route(2, 2, 8, 2)
+        self.assertIn((5, 9), route)
+        self.assertNotIn((5, 2), route)
+
+    #
+    # test_failed()
+    #
+    def test_failed(self):
+        """Destinations which cannot be reached are remembered until a tile becomes passable."""
+        paths = self.map.paths
+        self.near.action_close()
+        self.far.action_close()
+        self.assertIsNone(paths.route(2, 2, 8, 2))
+        self.assertIn(((2, 2), (8, 2)), paths.failed)
+        self.near.action_open()
+        self.assertNotIn(((2, 2), (8, 2)), paths.failed)
+        self.assertIsNotNone(paths.route(2, 2, 8, 2))
+
+    #
+    # test_search_limit()
+    #
+    def test_search_limit(self):
+        """A search which gives up at the limit is not remembered as having no route."""
+        paths = PathCache(self.map, search_limit = 5)
+        self.assertIsNone(paths.route(2, 2, 8, 2))
+        self.assertNotIn(((2, 2), (8, 2)), paths.failed)
+        paths.search_limit = 1000
+        self.assertIsNotNone(paths.route(2, 2, 8, 2))
+        paths.close()
+
+    #
+    # test_corners()
+    #
+    def test_corners(self):
+        """Routes do not cut the corner of a wall diagonally, so doors are only passed through straight."""
+        self.assertEqual(self.map.paths.route(4, 1, 6, 3), [(4, 2), (5, 2), (6, 2), (6, 3)])
+        self.assertEqual(len(self.map.paths.route(4, 3, 6, 1)), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""Tests for rooms."""
+
+#
+# Imports
+#
+import random
+import unittest
+from tests import helpers
+import mapgen
+from map import Map
+from fov import FovEngine
+from rooms import NEIGHBOURS
+
+#
+# RoomGraphTest
+#
+class RoomGraphTest(unittest.TestCase):
+    """Routes across the first level, checked against a breadth-first search over every tile."""
+
+    #
+    # setUpClass()
+    #
+    @classmethod
+    def setUpClass(cls):
+        cls.map = helpers.level_1()
+        cls.rooms = cls.map.room_graph()
+
+    #
+    # tearDownClass()
+    #
+    @classmethod
+    def tearDownClass(cls):
+        cls.map.close()
+
+    #
+    # floor()
+    #
+    def floor(self, x, y):
+        return self.rooms.room_of[x][y] >= 0
+
+    #
+    # open()
+    #
+    def open(self, x, y):
+        """Whether a route may go through a tile: floor, or a usable door or window."""
+        portal = self.rooms.portals.get((x, y))
+        return self.floor(x, y) or (portal is not None and portal.usable)
+
+    #
+    # shortest()
+    #
+    def shortest(self, origin, destination):
+        """Get the length of a shortest route, with a breadth-first search over every tile."""
+        distances = {origin: 0}
+        frontier = [origin]
+        while frontier:
+            next_frontier = []
+            for x, y in frontier:
+                if (x, y) == destination:
+                    return distances[(x, y)]
+                for sx, sy in NEIGHBOURS:
+                    nx, ny = x + sx, y + sy
+                    if not (0 <= nx < self.map.x_max and 0 <= ny < self.map.y_max):
+                        continue
+                    if (nx, ny) in distances or not self.open(nx, ny):
+                        continue
+                    if sx and sy and not (self.floor(x, ny) and self.floor(nx, y)):
+                        continue
+                    distances[(nx, ny)] = distances[(x, y)] + 1
+                    next_frontier.append((nx, ny))
+            frontier = next_frontier
+        return None
+
+    #
+    # check_route()
+    #
+    def check_route(self, origin, destination):
+        """Check a route is walkable, and as short as possible."""
+        route = self.rooms.route(origin[0], origin[1], destination[0], destination[1])
+        shortest = self.shortest(origin, destination)
+        if shortest is None:
+            self.assertIsNone(route)
+            return
+        self.assertIsNotNone(route, "no route from %s to %s" % (origin, destination))
+        self.assertEqual(len(route), shortest, "route from %s to %s is not the shortest" % (origin, destination))
+        x, y = origin
+        for nx, ny in route:
+            self.assertEqual(max(abs(nx - x), abs(ny - y)), 1)
+            self.assertTrue(self.open(nx, ny))
+            if nx != x and ny != y:
+                self.assertTrue(self.floor(x, ny) and self.floor(nx, y))
+            x, y = nx, ny
+        self.assertEqual((x, y), destination)
+
+    #
+    # test_routes()
+    #
+    def test_routes(self):
+        """Routes between a sample of tiles, including one which used to go back and forth between a door and the tile
+        next to it for ever."""
+        cells = [(x, y) for x in range(self.map.x_max) for y in range(self.map.y_max) if self.open(x, y)]
+        rng = random.Random(1)
+        pairs = [((65, 38), (18, 22))] + [(rng.choice(cells), rng.choice(cells)) for i in range(40)]
+        for origin, destination in pairs:
+            self.check_route(origin, destination)
+
+    #
+    # test_locked()
+    #
+    def test_locked(self):
+        """Locking a door on a route means going round, and unlocking it means going through again."""
+        route = self.rooms.route(65, 38, 18, 22)
+        doors = [self.rooms.portals[cell].fixture for cell in route
+                 if cell in self.rooms.portals and hasattr(self.rooms.portals[cell].fixture, "locked")]
+        self.assertTrue(doors)
+        try:
+            doors[0].action_lock()
+            self.assertNotIn((doors[0].x, doors[0].y), self.rooms.route(65, 38, 18, 22) or [])
+            self.check_route((65, 38), (18, 22))
+        finally:
+            doors[0].action_unlock()
+        self.assertEqual(self.rooms.route(65, 38, 18, 22), route)
+
+#
+# RebuildTest
+#
+class RebuildTest(unittest.TestCase):
+    """Rooms worked out again when the walls change."""
+
+    #
+    # test_wall_removed()
+    #
+    def test_wall_removed(self):
+        """Taking out a wall between two rooms joins them."""
+        helpers.use_headless()
+        wall = [(5, y) for y in range(8)]
+        map = Map(helpers.open_plan(10, 8, wall), fov_engine = FovEngine.SHADOWCAST)
+        rooms = map.room_graph()
+        self.assertIsNone(rooms.route(2, 2, 8, 2))
+        map.tiles[5][2] = mapgen.create_laminate_floor(5, 2)
+        map.update_tile(5, 2)
+        self.assertEqual(len(rooms.route(2, 2, 8, 2)), 6)
+        map.close()
+
+if __name__ == '__main__':
+    unittest.main()
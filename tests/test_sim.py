@@ -0,0 +1,216 @@
+"""Tests for sim, and the grunts it runs."""
+
+#
+# Imports
+#
+import random
+import unittest
+from tests import helpers
+from common import *
+import sim
+import mapgen
+from map import Map
+from fov import FovEngine
+from entities.human import Human
+from entities.grunt import Grunt
+
+#
+# Actor
+#
+class Actor(object):
+    """Stand-in for an acting entity, which records when it acts."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, id, log, speed = NORMAL_SPEED, fast_forward = False):
+        self.id = id
+        self.log = log
+        self.speed = speed
+        self.owner = True
+        self.missed = []
+        if fast_forward:
+            self.fast_forward = self.missed.append
+
+    #
+    # turn()
+    #
+    def turn(self):
+        self.log.append((self.id, self.scheduler.time))
+
+#
+# SchedulerTest
+#
+class SchedulerTest(unittest.TestCase):
+    """Order of actions, and sleeping entities."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        self.scheduler = sim.Scheduler()
+        self.log = []
+
+    #
+    # actor()
+    #
+    def actor(self, id, **kwargs):
+        """Create an actor and schedule it."""
+        actor = Actor(id, self.log, **kwargs)
+        actor.scheduler = self.scheduler
+        self.scheduler.add(actor)
+        return actor
+
+    #
+    # test_order()
+    #
+    def test_order(self):
+        """Entities act in time order, ties in the order they were scheduled, and faster entities act more often."""
+        self.actor("slow", speed = NORMAL_SPEED // 2)
+        self.actor("a")
+        self.actor("b")
+        self.assertEqual(self.scheduler.run_until(2 * TURN_TICKS), 5)
+        self.assertEqual(self.log, [("a", TURN_TICKS), ("b", TURN_TICKS), ("slow", 2 * TURN_TICKS),
+                                    ("a", 2 * TURN_TICKS), ("b", 2 * TURN_TICKS)])
+
+    #
+    # test_remove()
+    #
+    def test_remove(self):
+        """A removed entity does not act."""
+        a = self.actor("a")
+        self.actor("b")
+        self.scheduler.remove(a)
+        self.scheduler.run_until(TURN_TICKS)
+        self.assertEqual(self.log, [("b", TURN_TICKS)])
+        self.assertEqual(len(self.scheduler), 1)
+
+    #
+    # test_sleep()
+    #
+    def test_sleep(self):
+        """A sleeping entity does not act, and when woken is told how many actions it missed and keeps its timing."""
+        a = self.actor("a", fast_forward = True)
+        self.scheduler.run_until(TURN_TICKS // 2)
+        self.scheduler.sleep(a)
+        self.assertNotIn(a, self.scheduler)
+        self.scheduler.run_until(3 * TURN_TICKS + TURN_TICKS // 4)
+        self.assertEqual(self.log, [])
+
+        self.scheduler.wake(a)
+        self.assertEqual(a.missed, [3])
+        self.scheduler.run_until(4 * TURN_TICKS)
+        self.assertEqual(self.log, [("a", 4 * TURN_TICKS)])
+
+    #
+    # test_short_sleep()
+    #
+    def test_short_sleep(self):
+        """An entity woken before its next action is due misses nothing."""
+        a = self.actor("a", fast_forward = True)
+        self.scheduler.sleep(a)
+        self.scheduler.run_until(TURN_TICKS // 2)
+        self.scheduler.wake(a)
+        self.scheduler.run_until(TURN_TICKS)
+        self.assertEqual(a.missed, [])
+        self.assertEqual(self.log, [("a", TURN_TICKS)])
+
+#
+# GruntTest
+#
+class GruntTest(unittest.TestCase):
+    """Grunts, as simulated by sim."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        helpers.use_headless()
+        self.map = Map(helpers.open_plan(30, 5), fov_engine = FovEngine.SHADOWCAST)
+        self.player = Human("Player", "male", 15, 0)
+        self.map.add_entity(0, 2, self.player)
+        self.map.player = self.player
+        self.grunt = Grunt()
+        self.map.add_entity(10, 2, self.grunt)
+        self.randint = random.randint
+        random.randint = lambda a, b: 0  # wandering grunts stay put
+
+    #
+    # tearDown()
+    #
+    def tearDown(self):
+        random.randint = self.randint
+        self.map.close()
+
+    #
+    # test_chase()
+    #
+    def test_chase(self):
+        """A grunt which can see the player heads for them."""
+        self.grunt.turn()
+        self.assertEqual(self.grunt.x, 9)
+
+    #
+    # test_fast_forward()
+    #
+    def test_fast_forward(self):
+        """Missed actions are only spent wandering, not chasing the player."""
+        self.grunt.fast_forward(FAST_FORWARD_ACTIONS)
+        self.assertEqual((self.grunt.x, self.grunt.y), (10, 2))
+        self.assertIsNone(self.grunt.last_seen)
+
+    #
+    # test_active_zone()
+    #
+    def test_active_zone(self):
+        """Grunts far from the player sleep, and wake when the player comes near."""
+        self.map.active_zone.radius = 5
+        sim.update_world(self.map, self.player)
+        self.assertNotIn(self.grunt, self.map.scheduler)
+        self.map.move_entity(self.player, 6, 2)
+        sim.update_world(self.map, self.player)
+        self.assertIn(self.grunt, self.map.scheduler)
+
+#
+# GruntPostTest
+#
+class GruntPostTest(unittest.TestCase):
+    """Grunts staying near their posts."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        """Build a map split by a wall at x = 10, with a closed door at (10, 2)."""
+        helpers.use_headless()
+        self.map = Map(helpers.open_plan(20, 5), fov_engine = FovEngine.SHADOWCAST)
+        for y in range(5):
+            self.map.tiles[10][y] = mapgen.create_door(10, y) if y == 2 else mapgen.create_wall(10, y)
+        self.map.refresh_fov_map()
+        self.grunt = Grunt()
+        self.map.add_entity(2, 2, self.grunt)
+        self.randint = random.randint
+        random.randint = lambda a, b: 0  # wandering grunts stay put
+
+    #
+    # tearDown()
+    #
+    def tearDown(self):
+        random.randint = self.randint
+        self.map.close()
+
+    #
+    # test_return_to_post()
+    #
+    def test_return_to_post(self):
+        """A grunt which has strayed from its post heads back, opening doors on the way, until it is near enough."""
+        self.grunt.turn()
+        self.assertEqual(self.grunt.post, (2, 2))
+        self.map.move_entity(self.grunt, 15, 2)
+        for i in range(10):
+            self.grunt.turn()
+        self.assertFalse(self.map.tiles[10][2].door.closed)
+        self.assertEqual((self.grunt.x, self.grunt.y), (2 + POST_RANGE, 2))
+
+if __name__ == '__main__':
+    unittest.main()
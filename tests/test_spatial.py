@@ -0,0 +1,60 @@
+"""Tests for spatial."""
+
+#
+# Imports
+#
+import unittest
+from tests import helpers
+from map import Map
+from fov import FovEngine
+from entities.human import Human
+from entities.general_entities import MedKit
+
+#
+# EntityIndexTest
+#
+class EntityIndexTest(unittest.TestCase):
+    """Region and field of view queries on the map's entities."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        """Build a map with a wall down x = 5, with a viewer on one side, one item beside them and another behind the
+        wall."""
+        helpers.use_headless()
+        self.map = Map(helpers.open_plan(12, 12, [(5, y) for y in range(12)]), fov_engine = FovEngine.SHADOWCAST)
+        self.viewer = Human("Viewer", "male", 10, 0)
+        self.map.add_entity(2, 5, self.viewer)
+        self.near = MedKit()
+        self.map.add_entity_as_inventory(3, 5, self.near)
+        self.hidden = MedKit()
+        self.map.add_entity_as_inventory(7, 5, self.hidden)
+
+    #
+    # tearDown()
+    #
+    def tearDown(self):
+        self.map.close()
+
+    #
+    # test_in_radius()
+    #
+    def test_in_radius(self):
+        """A radius query does not care about the wall."""
+        self.assertEqual(self.map.entities.in_radius(2, 5, 5), [self.viewer, self.near, self.hidden])
+
+    #
+    # test_in_fov()
+    #
+    def test_in_fov(self):
+        """The item behind the wall is left out of what the viewer can see."""
+        fov_result = self.map.compute_fov(self.viewer)
+        self.assertEqual(self.map.entities.in_fov(fov_result), [self.viewer, self.near])
+
+        self.map.remove_entity_from_inventory(3, 5)
+        self.map.move_entity(self.viewer, 4, 5)
+        self.assertEqual(self.map.entities.in_fov(self.map.compute_fov(self.viewer)), [self.viewer])
+
+if __name__ == '__main__':
+    unittest.main()
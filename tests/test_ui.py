@@ -0,0 +1,129 @@
+"""Tests for ui, drawn through the headless backend."""
+
+#
+# Imports
+#
+import unittest
+from tests import helpers
+import ui
+import mapgen
+from map import Map
+from fov import FovEngine
+from entities.human import Human
+from entities.general_entities import MedKit
+
+#
+# PickUpTest
+#
+class PickUpTest(unittest.TestCase):
+    """Items picked up from next to the player are no longer drawn."""
+
+    #
+    # setUp()
+    #
+    def setUp(self):
+        self.console = helpers.root_console(30, 15)
+        self.map = Map(helpers.open_plan(12, 12), fov_engine = FovEngine.SHADOWCAST)
+        self.player = Human("Player", "male", 10, 30)
+        self.map.add_entity(5, 5, self.player)
+        self.map.add_entity_as_inventory(6, 5, MedKit())
+        self.screen = ui.MapScreen(0, 0, 11, 11, ui.MapRenderMode.DIRTY)
+        self.screen.render(self.map, (5, 5), self.player)
+        self.screen.dirty = False
+
+    #
+    # tearDown()
+    #
+    def tearDown(self):
+        self.map.close()
+
+    #
+    # test_pick_up()
+    #
+    def test_pick_up(self):
+        """Picking an item up changes the map, so the screen is drawn again without it."""
+        self.assertEqual(chr(self.console.chars[5][6]), '=')
+        changes = self.map.changes
+        changed = []
+        self.map.tile_watchers.append(lambda x, y: changed.append((x, y)))
+
+        self.player.action_get(self.player, self.map, 6, 5)
+        self.assertGreater(self.map.changes, changes)
+        self.assertIn((6, 5), changed)
+        self.screen.check_map(self.map, (5, 5))
+        self.assertTrue(self.screen.dirty)
+        self.screen.render(self.map, (5, 5), self.player)
+        self.assertNotEqual(chr(self.console.chars[5][6]), '=')
+
+#
+# RenderModeTest
+#
+class RenderModeTest(unittest.TestCase):
+    """Every render mode draws the same cells as MapRenderMode.DIRECT."""
+
+    #
+    # draw()
+    #
+    def draw(self, render_mode):
+        """Build a room with a wall, door and window, items in and out of view, and someone behind the wall.  Render it
+        with the player at one place and then at another, so that some tiles are remembered rather than in view.
+
+        Returns:
+        tuple of (characters, foreground colours, background colours) of the console, each indexed [y][x]
+
+        """
+        console = helpers.root_console(30, 20)
+        map = Map(helpers.open_plan(24, 16, [(10, y) for y in range(16)]), fov_engine = FovEngine.SHADOWCAST)
+        map.tiles[10][6] = mapgen.create_door(10, 6)
+        map.tiles[10][9] = mapgen.create_window(10, 9)
+        map.refresh_fov_map()
+        map.add_entity_as_inventory(8, 8, MedKit())
+        map.add_entity_as_inventory(13, 9, MedKit())
+        map.add_entity(14, 4, Human("Other", "male", 10, 0))
+        player = Human("Player", "male", 8, 30)
+        map.add_entity(4, 3, player)
+
+        screen = ui.MapScreen(2, 2, 17, 13, render_mode)
+        screen.render(map, (8, 7), player)
+        map.move_entity(player, 7, 8)
+        screen.render(map, (9, 7), player)
+        map.close()
+        return console.chars, console.fore, console.back
+
+    #
+    # check_mode()
+    #
+    def check_mode(self, render_mode):
+        """Check a render mode against MapRenderMode.DIRECT, cell by cell.  The foreground of blank cells is not
+        compared, as it is never seen."""
+        chars, fore, back = self.draw(render_mode)
+        expected_chars, expected_fore, expected_back = self.draw(ui.MapRenderMode.DIRECT)
+        self.assertEqual(chr(expected_chars[9][8]), '@')
+        for y in range(len(chars)):
+            for x in range(len(chars[y])):
+                cell = x, y
+                self.assertEqual((cell, chr(chars[y][x])), (cell, chr(expected_chars[y][x])))
+                self.assertEqual((cell, back[y][x]), (cell, expected_back[y][x]))
+                if chars[y][x] != ord(' '):
+                    self.assertEqual((cell, fore[y][x]), (cell, expected_fore[y][x]))
+
+    #
+    # test_dirty()
+    #
+    def test_dirty(self):
+        self.check_mode(ui.MapRenderMode.DIRTY)
+
+    #
+    # test_numpy()
+    #
+    def test_numpy(self):
+        self.check_mode(ui.MapRenderMode.NUMPY)
+
+    #
+    # test_terrain()
+    #
+    def test_terrain(self):
+        self.check_mode(ui.MapRenderMode.TERRAIN)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,34 +19,185 @@ TileType = enum(
     LAMINATE_FLOOR = 6
 )
 
+#
+# Remembered tile colours.  These are worked out once per colour and desaturation amount, and looked up after that.
+#
+memory_desaturation = MEMORY_DESATURATION
+memory_colours = {}  # (r, g, b, amount) -> libtcod.Color
+
+#
+# set_memory_desaturation()
+#
+def set_memory_desaturation(amount):
+    """Set how much remembered tiles are desaturated.
+    
+    Arguments:
+    amount - 0 for full colour, up to 1 for greyscale
+    
+    """
+    global memory_desaturation
+    if amount < 0 or amount > 1:
+        raise LogicException("Memory desaturation must be between 0 and 1.")
+    memory_desaturation = amount
+
+#
+# desaturate()
+#
+def desaturate(colour, amount = None):
+    """Get a desaturated version of a colour, from the table of remembered colours.  The colour is only worked out the
+    first time it is asked for.
+    
+    Arguments:
+    colour - colour to desaturate.  This is not modified.
+    amount - how much to desaturate it, 0 to 1.  Defaults to the current memory desaturation.
+    
+    Returns:
+    the desaturated colour.  This is shared, so must not be modified.
+    
+    """
+    if amount is None:
+        amount = memory_desaturation
+    key = colour.r, colour.g, colour.b, amount
+
+    result = memory_colours.get(key)
+    if result is None:
+        grey = int(colour.r * 0.3 + colour.g * 0.59 + colour.b * 0.11)
+        result = libtcod.Color(int(colour.r + (grey - colour.r) * amount),
+                               int(colour.g + (grey - colour.g) * amount),
+                               int(colour.b + (grey - colour.b) * amount))
+        memory_colours[key] = result
+    return result
+
+#
+# TileDef
+#
+class TileDef(object):
+    """Definition of a kind of tile.  Everything about a tile which does not vary from cell to cell lives here, and is
+    shared by every tile of that kind.  Definitions are immutable, and are numbered in the order they are created, so
+    that cells can refer to them by index (see TileDef.all).
+    """
+
+    __slots__ = ('index', 'type', 'char', 'fcolour', 'bcolour', 'block_sight', 'block_move')
+
+    all = []  # every definition, indexed by TileDef.index
+
+    #
+    # __init__()
+    #
+    def __init__(self, type, char, fcolour, bcolour, block_sight, block_move):
+        """Create and register a tile definition.
+        
+        Arguments:
+        type - the TileType
+        char - the character to render the tile with
+        fcolour - foreground colour
+        bcolour - background colour
+        block_sight - whether the tile blocks sight
+        block_move - whether the tile blocks movement
+        
+        """
+        init = super(TileDef, self).__setattr__
+        init('index', len(TileDef.all))
+        init('type', type)
+        init('char', char)
+        init('fcolour', fcolour)
+        init('bcolour', bcolour)
+        init('block_sight', block_sight)
+        init('block_move', block_move)
+
+        TileDef.all.append(self)
+
+    #
+    # memory_colour
+    #
+    @property
+    def memory_colour(self):
+        """Gets the background colour to use when the tile has been seen but is not currently visible (see desaturate()).
+        This is shared, so must not be modified."""
+        return desaturate(self.bcolour)
+
+    #
+    # __setattr__()
+    #
+    def __setattr__(self, name, value):
+        """Tile definitions are shared, so cannot be changed."""
+        raise LogicException("Tile definitions cannot be modified.")
+
+#
+# Definition for tiles which have not been set.
+#
+UNKNOWN_TILE = TileDef(TileType.UNKNOWN, ' ', libtcod.Color(255, 0, 255), libtcod.Color(255, 0, 255), False, False)
+
 #
 # Tile
 #
-class Tile:
-    """Tiles - part of the map."""
+class Tile(object):
+    """Tiles - part of the map.  Only state which varies per cell is stored here; the rest comes from the TileDef."""
+
+    __slots__ = ('tdef', 'seen', 'inventory', 'entity', 'door', 'window')
     
     #
     # __init__()
     #
-    def __init__(self):
-        """Constructor."""
-        self.type        = TileType.UNKNOWN
-        self.block_sight = False
-        self.block_move  = False
+    def __init__(self, tdef = UNKNOWN_TILE):
+        """Constructor.
+        
+        Arguments:
+        tdef - the TileDef describing this kind of tile
+        
+        """
+        self.tdef        = tdef
         self.seen        = False
-        self.char        = ' '
-        self.fcolour     = libtcod.Color(255, 0, 255)
-        self.bcolour     = libtcod.Color(255, 0, 255)
         self.inventory   = None
         self.entity      = None
+
+    @property
+    def type(self):
+        """Gets the tile type (see TileType)."""
+        return self.tdef.type
+
+    @property
+    def char(self):
+        """Gets the character to render this tile with."""
+        return self.tdef.char
+
+    @property
+    def fcolour(self):
+        """Gets the foreground colour.  This is shared, so must not be modified."""
+        return self.tdef.fcolour
+
+    @property
+    def bcolour(self):
+        """Gets the background colour.  This is shared, so must not be modified."""
+        return self.tdef.bcolour
+
+    @property
+    def memory_colour(self):
+        """Gets the background colour to use when the tile has been seen but is not in view."""
+        return self.tdef.memory_colour
+
+    @property
+    def block_sight(self):
+        """Gets whether the tile itself blocks sight."""
+        return self.tdef.block_sight
+
+    @property
+    def block_move(self):
+        """Gets whether the tile itself blocks movement."""
+        return self.tdef.block_move
         
     @property
     def blocks_movement(self):
         """Gets whether or not this tile blocks movement."""
         return self.door.blocks_move if self.type == TileType.DOOR else self.window.blocks_move if self.type == TileType.WINDOW else self.entity.blocks_move if self.entity else self.block_move
 
+    @property
+    def blocks_passage(self):
+        """Gets whether or not this tile blocks movement, ignoring any entity on it, ie whether a route can go through it."""
+        return self.door.blocks_move if self.type == TileType.DOOR else self.window.blocks_move if self.type == TileType.WINDOW else self.block_move
+
     @property
     def blocks_sight(self):
         """Gets whether or not this tile blocks sight."""
         return self.door.blocks_sight if self.type == TileType.DOOR else self.window.blocks_sight if self.type == TileType.WINDOW else self.entity.blocks_sight if self.entity else self.block_sight
-        
\ No newline at end of file
+        
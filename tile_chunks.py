@@ -0,0 +1,507 @@
+"""Chunked tile storage for very large levels.  The map is split into square chunks, which are only allocated when
+first written to, and which can be paged out to a compressed on-disk store when they have not been used recently.
+
+This bounds the memory taken by the tiles (TileDef and seen flag per cell, and the doors, windows and occupants on them)
+and by the transparency and passability worked out from them, which are kept in the same chunks (see ChunkedFlags).
+The libtcod map, light levels and room numbers are still held for every cell (see Map.set_size()).
+"""
+
+#
+# Imports
+#
+import os
+import array
+import shutil
+import tempfile
+import zlib
+import collections
+from common import *
+from tile import TileDef, UNKNOWN_TILE
+from tile_grid import TileColumn, TileView, CELL_OBJECTS
+
+#
+# Size (in tiles) of the square chunks the map is split into.
+#
+CHUNK_SIZE = 32
+
+#
+# TileChunk
+#
+class TileChunk(object):
+    """A square block of cells, stored as a TileDef index, seen flag, and transparency and passability flags (see
+    Map.transparent and Map.passable) per cell.  Cells are numbered (x % size) * size + (y % size).
+    """
+
+    __slots__ = ('tdef', 'seen', 'transparent', 'passable', 'dirty')
+
+    #
+    # __init__()
+    #
+    def __init__(self, size, default_tdef):
+        """Create a chunk filled with a given kind of tile.
+
+        Arguments:
+        size - width and height of chunk
+        default_tdef - the TileDef to fill the chunk with
+
+        """
+        self.tdef = array.array('H', [default_tdef.index]) * (size * size)
+        self.seen = bytearray(size * size)
+        self.transparent = bytearray([not default_tdef.block_sight]) * (size * size)
+        self.passable = bytearray([not default_tdef.block_move]) * (size * size)
+        self.dirty = True  # changed since it was last written to the store
+
+#
+# ChunkStore
+#
+class ChunkStore(object):
+    """Compressed on-disk store for chunks which have been paged out.  One file per chunk."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, directory = None):
+        """Create store.
+
+        Arguments:
+        directory - where to keep chunk files.  If not given, a temporary directory is created, and removed again by
+                    close().
+
+        """
+        self.owned = directory is None
+        self.directory = tempfile.mkdtemp(prefix = "citadel-chunks-") if self.owned else directory
+
+    #
+    # _path()
+    #
+    def _path(self, key):
+        """Get the file name for a chunk."""
+        return os.path.join(self.directory, "chunk_%d_%d.z" % key)
+
+    #
+    # save()
+    #
+    def save(self, key, chunk):
+        """Write a chunk to the store.
+
+        Arguments:
+        key - (x, y) chunk coordinates
+        chunk - the TileChunk to write
+
+        """
+        with open(self._path(key), "wb") as f:
+            f.write(zlib.compress(chunk.tdef.tostring() + str(chunk.seen + chunk.transparent + chunk.passable), 1))
+
+    #
+    # load()
+    #
+    def load(self, key, size):
+        """Read a chunk back from the store.
+
+        Arguments:
+        key - (x, y) chunk coordinates
+        size - width and height of chunk
+
+        Returns:
+        the TileChunk
+
+        """
+        with open(self._path(key), "rb") as f:
+            data = zlib.decompress(f.read())
+
+        cells = size * size
+        chunk = TileChunk.__new__(TileChunk)
+        chunk.tdef = array.array('H')
+        chunk.tdef.fromstring(data[:-3 * cells])
+        chunk.seen = bytearray(data[-3 * cells:-2 * cells])
+        chunk.transparent = bytearray(data[-2 * cells:-cells])
+        chunk.passable = bytearray(data[-cells:])
+        chunk.dirty = False
+        return chunk
+
+    #
+    # close()
+    #
+    def close(self):
+        """Remove the store's files, if it created its own directory."""
+        if self.owned and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, True)
+
+#
+# ChunkedTileGrid
+#
+class ChunkedTileGrid(object):
+    """Chunked tile storage.  Indexed as grid[x][y], like the jagged list of tiles it replaces.  Cells in chunks which
+    have never been written to read as the default TileDef, unseen.  At most max_resident chunks are kept in memory;
+    the least recently used are paged out to a ChunkStore.  Per-cell objects (doors, windows, etc) are sparse and are
+    always kept in memory.
+    """
+
+    #
+    # __init__()
+    #
+    def __init__(self, x_max, y_max, default_tdef = UNKNOWN_TILE, chunk_size = CHUNK_SIZE, max_resident = None,
+                 store_dir = None):
+        """Create grid.  No chunks are allocated until they are written to.
+
+        Arguments:
+        x_max - max x-dimension of map
+        y_max - max y-dimension of map
+        default_tdef - the TileDef of cells in chunks which have not been allocated
+        chunk_size - width and height of chunks
+        max_resident - maximum number of chunks to keep in memory, or None for no limit
+        store_dir - directory to page chunks out to (see ChunkStore)
+
+        """
+        self.x_max = x_max
+        self.y_max = y_max
+        self.default_tdef = default_tdef
+        self.chunk_size = chunk_size
+        self.max_resident = max_resident
+
+        self.resident = collections.OrderedDict()  # (cx, cy) -> TileChunk, least recently used first
+        self.paged = set()                         # keys of chunks which have a copy in the store
+        self.store = ChunkStore(store_dir) if max_resident is not None else None
+
+        # Sparse storage for per-cell objects (see CELL_OBJECTS), keyed on (x, y)
+        self.objects = {}
+
+        # Most recently used chunk, to skip the LRU bookkeeping for runs of accesses to the same chunk
+        self._last_key = None
+        self._last_chunk = None
+
+    #
+    # __getitem__()
+    #
+    def __getitem__(self, x):
+        """Get a column of the grid, so that tiles can be accessed as grid[x][y]."""
+        if x < 0:
+            x += self.x_max
+        if x < 0 or x >= self.x_max:
+            raise IndexError("Tile grid x-index out of range.")
+        return TileColumn(self, x)
+
+    #
+    # __len__()
+    #
+    def __len__(self):
+        """Number of columns, ie the x-dimension."""
+        return self.x_max
+
+    #
+    # __iter__()
+    #
+    def __iter__(self):
+        """Iterate over columns."""
+        for x in range(self.x_max):
+            yield TileColumn(self, x)
+
+    #
+    # allocated_chunks
+    #
+    @property
+    def allocated_chunks(self):
+        """Gets the number of chunks which have been allocated, whether in memory or paged out."""
+        return len(self.paged.union(self.resident))
+
+    #
+    # _chunk()
+    #
+    def _chunk(self, x, y, allocate):
+        """Get the chunk holding a cell, paging it back in if necessary.
+
+        Arguments:
+        x - x-position of cell
+        y - y-position of cell
+        allocate - whether to allocate the chunk if it does not exist yet
+
+        Returns:
+        the TileChunk, or None if it does not exist and allocate is False
+
+        """
+        key = x // self.chunk_size, y // self.chunk_size
+        if key == self._last_key:
+            return self._last_chunk
+
+        chunk = self.resident.pop(key, None)
+        if chunk is None:
+            if key in self.paged:
+                chunk = self.store.load(key, self.chunk_size)
+            elif allocate:
+                chunk = TileChunk(self.chunk_size, self.default_tdef)
+            else:
+                return None
+
+        self.resident[key] = chunk
+        self._last_key = key
+        self._last_chunk = chunk
+        self._page_out()
+        return chunk
+
+    #
+    # _page_out()
+    #
+    def _page_out(self):
+        """Write the least recently used chunks to the store until no more than max_resident are in memory."""
+        if self.max_resident is None:
+            return
+
+        while len(self.resident) > max(1, self.max_resident):
+            key, chunk = self.resident.popitem(last = False)
+            if chunk.dirty or key not in self.paged:
+                self.store.save(key, chunk)
+                self.paged.add(key)
+            if key == self._last_key:
+                self._last_key = self._last_chunk = None
+
+    #
+    # get_tdef()
+    #
+    def get_tdef(self, x, y):
+        """Get the TileDef of a cell."""
+        chunk = self._chunk(x, y, False)
+        if chunk is None:
+            return self.default_tdef
+        return TileDef.all[chunk.tdef[(x % self.chunk_size) * self.chunk_size + y % self.chunk_size]]
+
+    #
+    # set_tdef()
+    #
+    def set_tdef(self, x, y, tdef):
+        """Set the TileDef of a cell."""
+        chunk = self._chunk(x, y, True)
+        chunk.tdef[(x % self.chunk_size) * self.chunk_size + y % self.chunk_size] = tdef.index
+        chunk.dirty = True
+
+    #
+    # get_seen()
+    #
+    def get_seen(self, x, y):
+        """Get whether a cell has been seen."""
+        chunk = self._chunk(x, y, False)
+        return chunk is not None and chunk.seen[(x % self.chunk_size) * self.chunk_size + y % self.chunk_size] != 0
+
+    #
+    # set_seen()
+    #
+    def set_seen(self, x, y, seen):
+        """Set whether a cell has been seen."""
+        chunk = self._chunk(x, y, seen)
+        if chunk is not None:
+            chunk.seen[(x % self.chunk_size) * self.chunk_size + y % self.chunk_size] = 1 if seen else 0
+            chunk.dirty = True
+
+    #
+    # get_flag()
+    #
+    def get_flag(self, name, x, y):
+        """Get a cell's transparency or passability flag.
+
+        Arguments:
+        name - 'transparent' or 'passable'
+        x - x-position of cell
+        y - y-position of cell
+
+        """
+        chunk = self._chunk(x, y, False)
+        if chunk is None:
+            return not (self.default_tdef.block_sight if name == 'transparent' else self.default_tdef.block_move)
+        return getattr(chunk, name)[(x % self.chunk_size) * self.chunk_size + y % self.chunk_size] != 0
+
+    #
+    # set_flag()
+    #
+    def set_flag(self, name, x, y, value):
+        """Set a cell's transparency or passability flag.  A chunk is only allocated if the flag differs from the
+        default TileDef's.
+
+        Arguments:
+        name - 'transparent' or 'passable'
+        x - x-position of cell
+        y - y-position of cell
+        value - the new flag
+
+        """
+        if self.get_flag(name, x, y) == bool(value):
+            return
+        chunk = self._chunk(x, y, True)
+        getattr(chunk, name)[(x % self.chunk_size) * self.chunk_size + y % self.chunk_size] = 1 if value else 0
+        chunk.dirty = True
+
+    #
+    # flags()
+    #
+    def flags(self, name):
+        """Get a view of the transparency or passability flags, to use in place of a full-size array.
+
+        Arguments:
+        name - 'transparent' or 'passable'
+
+        Returns:
+        ChunkedFlags
+
+        """
+        return ChunkedFlags(self, name)
+
+    #
+    # set_tile()
+    #
+    def set_tile(self, x, y, tile):
+        """Copy a tile into the grid.
+
+        Arguments:
+        x - x-position of cell
+        y - y-position of cell
+        tile - the Tile (or TileView) to copy from
+
+        """
+        self.set_tdef(x, y, tile.tdef)
+        self.set_seen(x, y, tile.seen)
+
+        objects = {}
+        for name in CELL_OBJECTS:
+            obj = getattr(tile, name, None)
+            if obj is not None:
+                objects[name] = obj
+
+        if objects:
+            self.objects[(x, y)] = objects
+        else:
+            self.objects.pop((x, y), None)
+
+    #
+    # stored_cells()
+    #
+    def stored_cells(self):
+        """Get the positions of every cell which may differ from the default: all cells of allocated chunks, and cells
+        with per-cell objects.  Other cells are the default TileDef, unseen, with nothing on them.
+
+        Returns:
+        list of (x, y) positions
+
+        """
+        cells = []
+        size = self.chunk_size
+        keys = sorted(self.paged.union(self.resident))
+        for cx, cy in keys:
+            for x in range(cx * size, min(self.x_max, (cx + 1) * size)):
+                for y in range(cy * size, min(self.y_max, (cy + 1) * size)):
+                    cells.append((x, y))
+
+        allocated = set(keys)
+        cells.extend(key for key in self.objects if (key[0] // size, key[1] // size) not in allocated)
+        return cells
+
+    #
+    # close()
+    #
+    def close(self):
+        """Release the on-disk store."""
+        if self.store is not None:
+            self.store.close()
+
+#
+# ChunkedFlags
+#
+class ChunkedFlags(object):
+    """The transparency or passability flags of a ChunkedTileGrid, indexed as flags[x][y] like the array of booleans it
+    replaces (see Map.transparent and Map.passable).  The flags are stored in the grid's chunks, so are paged out with
+    them.
+    """
+
+    __slots__ = ('grid', 'name')
+
+    #
+    # __init__()
+    #
+    def __init__(self, grid, name):
+        """Create view.
+
+        Arguments:
+        grid - the ChunkedTileGrid holding the flags
+        name - 'transparent' or 'passable'
+
+        """
+        self.grid = grid
+        self.name = name
+
+    #
+    # __getitem__()
+    #
+    def __getitem__(self, x):
+        """Get a column of flags, so that they can be accessed as flags[x][y]."""
+        if x < 0:
+            x += self.grid.x_max
+        if x < 0 or x >= self.grid.x_max:
+            raise IndexError("Flag x-index out of range.")
+        return FlagColumn(self, x)
+
+    #
+    # __len__()
+    #
+    def __len__(self):
+        """Number of columns, ie the x-dimension."""
+        return self.grid.x_max
+
+    #
+    # window()
+    #
+    def window(self, x0, y0, x1, y1):
+        """Copy the flags of a rectangle of cells out, for quicker access.
+
+        Arguments:
+        x0, y0, x1, y1 - region of the map (x1 and y1 exclusive)
+
+        Returns:
+        list of lists of booleans, indexed [x][y] relative to (x0, y0)
+
+        """
+        get_flag = self.grid.get_flag
+        return [[get_flag(self.name, x, y) for y in range(y0, y1)] for x in range(x0, x1)]
+
+#
+# FlagColumn
+#
+class FlagColumn(object):
+    """A single column of ChunkedFlags, indexed by y."""
+
+    __slots__ = ('flags', 'x')
+
+    #
+    # __init__()
+    #
+    def __init__(self, flags, x):
+        """Create column.
+
+        Arguments:
+        flags - the ChunkedFlags this is a column of
+        x - x-position of column
+
+        """
+        self.flags = flags
+        self.x = x
+
+    #
+    # __getitem__()
+    #
+    def __getitem__(self, y):
+        """Get the flag at this column's x-position and the given y-position."""
+        if y < 0:
+            y += self.flags.grid.y_max
+        if y < 0 or y >= self.flags.grid.y_max:
+            raise IndexError("Flag y-index out of range.")
+        return self.flags.grid.get_flag(self.flags.name, self.x, y)
+
+    #
+    # __setitem__()
+    #
+    def __setitem__(self, y, value):
+        """Set the flag at this column's x-position and the given y-position."""
+        self.flags.grid.set_flag(self.flags.name, self.x, y, value)
+
+    #
+    # __len__()
+    #
+    def __len__(self):
+        """Number of rows, ie the y-dimension."""
+        return self.flags.grid.y_max
@@ -0,0 +1,315 @@
+"""Array-backed tile storage.  Instead of one Tile object per cell, each cell holds the index of its TileDef and its
+seen state in contiguous NumPy arrays, with a thin TileView giving the same interface as Tile for existing code."""
+
+#
+# Imports
+#
+from common import *
+from tile import Tile, TileDef, UNKNOWN_TILE
+
+try:  # NumPy is optional - the array grid is only available if it is installed
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+#
+# Attributes which are stored per-cell as Python objects, rather than in arrays.
+#
+CELL_OBJECTS = ('inventory', 'entity', 'door', 'window')
+
+#
+# TileGrid
+#
+class TileGrid(object):
+    """Structure-of-arrays tile storage.  Indexed as grid[x][y], like the jagged list of tiles it replaces."""
+
+    #
+    # __init__()
+    #
+    def __init__(self, x_max, y_max, default_tdef = UNKNOWN_TILE):
+        """Allocate empty tiles.
+
+        Arguments:
+        x_max - max x-dimension of map
+        y_max - max y-dimension of map
+        default_tdef - the TileDef to fill the grid with
+
+        """
+        if not numpy_available:
+            raise LogicException("The array tile grid requires NumPy.")
+
+        self.x_max = x_max
+        self.y_max = y_max
+
+        shape = (x_max, y_max)
+        self.tdef = numpy.empty(shape, dtype = numpy.uint16)  # index into TileDef.all
+        self.seen = numpy.zeros(shape, dtype = numpy.bool_)
+        self.tdef[:] = default_tdef.index
+
+        # Sparse storage for per-cell objects (see CELL_OBJECTS), keyed on (x, y)
+        self.objects = {}
+
+    #
+    # __getitem__()
+    #
+    def __getitem__(self, x):
+        """Get a column of the grid, so that tiles can be accessed as grid[x][y]."""
+        if x < 0:
+            x += self.x_max
+        if x < 0 or x >= self.x_max:
+            raise IndexError("Tile grid x-index out of range.")
+        return TileColumn(self, x)
+
+    #
+    # __len__()
+    #
+    def __len__(self):
+        """Number of columns, ie the x-dimension."""
+        return self.x_max
+
+    #
+    # __iter__()
+    #
+    def __iter__(self):
+        """Iterate over columns."""
+        for x in range(self.x_max):
+            yield TileColumn(self, x)
+
+    #
+    # get_tdef()
+    #
+    def get_tdef(self, x, y):
+        """Get the TileDef of a cell."""
+        return TileDef.all[self.tdef[x, y]]
+
+    #
+    # set_tdef()
+    #
+    def set_tdef(self, x, y, tdef):
+        """Set the TileDef of a cell."""
+        self.tdef[x, y] = tdef.index
+
+    #
+    # get_seen()
+    #
+    def get_seen(self, x, y):
+        """Get whether a cell has been seen."""
+        return bool(self.seen[x, y])
+
+    #
+    # set_seen()
+    #
+    def set_seen(self, x, y, seen):
+        """Set whether a cell has been seen."""
+        self.seen[x, y] = seen
+
+    #
+    # set_tile()
+    #
+    def set_tile(self, x, y, tile):
+        """Copy a tile into the grid.
+
+        Arguments:
+        x - x-position of cell
+        y - y-position of cell
+        tile - the Tile (or TileView) to copy from
+
+        """
+        self.tdef[x, y] = tile.tdef.index
+        self.seen[x, y] = tile.seen
+
+        objects = {}
+        for name in CELL_OBJECTS:
+            obj = getattr(tile, name, None)
+            if obj is not None:
+                objects[name] = obj
+
+        if objects:
+            self.objects[(x, y)] = objects
+        else:
+            self.objects.pop((x, y), None)
+
+    #
+    # fill_tiles()
+    #
+    def fill_tiles(self, xs, ys, tile):
+        """Copy a tile into many cells at once.  Per-cell objects (doors, windows, etc) are not copied, as each cell needs
+        its own - use set_tile() for those.
+
+        Arguments:
+        xs - array of x-positions of cells
+        ys - array of y-positions of cells, the same length as xs
+        tile - the Tile to copy from
+
+        """
+        self.tdef[xs, ys] = tile.tdef.index
+        self.seen[xs, ys] = tile.seen
+
+        if self.objects:
+            for key in zip(xs.tolist(), ys.tolist()):
+                self.objects.pop(key, None)
+
+    #
+    # def_array()
+    #
+    def def_array(self, name):
+        """Get an array of a TileDef attribute for every cell, eg def_array('block_sight').  Colours are returned with an
+        extra dimension of (r, g, b).
+
+        Arguments:
+        name - name of the TileDef attribute
+
+        """
+        values = [getattr(tdef, name) for tdef in TileDef.all]
+        if hasattr(values[0], 'r'):
+            values = [(c.r, c.g, c.b) for c in values]
+        return numpy.array(values)[self.tdef]
+
+    #
+    # blocks_sight_map()
+    #
+    def blocks_sight_map(self):
+        """Get a boolean array of which tiles block sight, taking doors, windows and entities into account."""
+        blocks = self.def_array('block_sight')
+        for x, y in self.objects:
+            blocks[x, y] = self[x][y].blocks_sight
+        return blocks
+
+    #
+    # blocks_movement_map()
+    #
+    def blocks_movement_map(self):
+        """Get a boolean array of which tiles block movement, taking doors, windows and entities into account."""
+        blocks = self.def_array('block_move')
+        for x, y in self.objects:
+            blocks[x, y] = self[x][y].blocks_movement
+        return blocks
+
+    #
+    # blocks_passage_map()
+    #
+    def blocks_passage_map(self):
+        """Get a boolean array of which tiles block movement, taking doors and windows but not entities into account."""
+        blocks = self.def_array('block_move')
+        for x, y in self.objects:
+            blocks[x, y] = self[x][y].blocks_passage
+        return blocks
+
+#
+# TileColumn
+#
+class TileColumn(object):
+    """A single column of a TileGrid (or ChunkedTileGrid), indexed by y."""
+
+    __slots__ = ('grid', 'x')
+
+    #
+    # __init__()
+    #
+    def __init__(self, grid, x):
+        """Create column.
+
+        Arguments:
+        grid - the TileGrid this is a column of
+        x - x-position of column
+
+        """
+        self.grid = grid
+        self.x = x
+
+    #
+    # __getitem__()
+    #
+    def __getitem__(self, y):
+        """Get a view onto the tile at this column's x-position and the given y-position."""
+        if y < 0:
+            y += self.grid.y_max
+        if y < 0 or y >= self.grid.y_max:
+            raise IndexError("Tile grid y-index out of range.")
+        return TileView(self.grid, self.x, y)
+
+    #
+    # __setitem__()
+    #
+    def __setitem__(self, y, tile):
+        """Copy a tile into the grid at this column's x-position and the given y-position."""
+        self.grid.set_tile(self.x, y, tile)
+
+    #
+    # __len__()
+    #
+    def __len__(self):
+        """Number of rows, ie the y-dimension."""
+        return self.grid.y_max
+
+#
+# TileView
+#
+class TileView(Tile):
+    """A view of a single cell of a TileGrid (or ChunkedTileGrid), which behaves as a Tile.  Reads and writes go
+    straight through to the grid.  Everything else (type, colours, etc) comes from the TileDef, via Tile's properties.
+    """
+
+    #
+    # __init__()
+    #
+    def __init__(self, grid, x, y):
+        """Create view.  Tile.__init__() is deliberately not called, as the state lives in the grid.
+
+        Arguments:
+        grid - the TileGrid to view
+        x - x-position of cell
+        y - y-position of cell
+
+        """
+        self.__dict__['_grid'] = grid
+        self.__dict__['_x'] = x
+        self.__dict__['_y'] = y
+
+    #
+    # __getattr__()
+    #
+    def __getattr__(self, name):
+        """Look up per-cell objects.  Only called when normal attribute lookup fails."""
+        objects = self._grid.objects.get((self._x, self._y))
+        if objects and name in objects:
+            return objects[name]
+        if name in ('inventory', 'entity'):
+            return None
+        raise AttributeError(name)
+
+    #
+    # __setattr__()
+    #
+    def __setattr__(self, name, value):
+        """Store per-cell objects sparsely, and everything else through the grid properties."""
+        if name in CELL_OBJECTS:
+            key = self._x, self._y
+            objects = self._grid.objects.setdefault(key, {})
+            if value is None:
+                objects.pop(name, None)
+                if not objects:
+                    del self._grid.objects[key]
+            else:
+                objects[name] = value
+        else:
+            object.__setattr__(self, name, value)
+
+    @property
+    def tdef(self):
+        """Gets the TileDef for this cell."""
+        return self._grid.get_tdef(self._x, self._y)
+
+    @tdef.setter
+    def tdef(self, value):
+        self._grid.set_tdef(self._x, self._y, value)
+
+    @property
+    def seen(self):
+        """Gets whether the tile has been seen."""
+        return self._grid.get_seen(self._x, self._y)
+
+    @seen.setter
+    def seen(self, value):
+        self._grid.set_seen(self._x, self._y, value)
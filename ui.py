@@ -13,13 +13,36 @@
 # Imports
 #
 import libtcodpy as libtcod
+import backend
+import profiler
 from common import *
 from screen import Screen
+from message_log import MessageLog
+from inventory_view import InventoryView
+from terrain import TerrainCache, visible_runs
 from entity import EntityType
-from tile import Tile, TileType
+import tile
+import lighting
+from tile import Tile, TileDef, TileType
+
+try:  # NumPy is optional - it is needed for MapRenderMode.NUMPY
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
 
 inventory_action = None
 
+#
+# MapRenderMode - how the map screen is drawn.
+#
+MapRenderMode = enum(
+    DIRECT  = 0,  # draw every cell straight onto the root console, every frame
+    DIRTY   = 1,  # draw changed cells onto an off-screen console, and blit that to the root console
+    NUMPY   = 2,  # compose the view as NumPy arrays, fill an off-screen console in bulk and blit it
+    TERRAIN = 3   # blit pre-rendered terrain (see terrain.TerrainCache), then draw only the dynamic parts
+)
+
 #
 # Map screen
 #
@@ -29,7 +52,7 @@ class MapScreen(Screen):
     #
     # __init__()
     #
-    def __init__(self, x_offset, y_offset, width, height):
+    def __init__(self, x_offset, y_offset, width, height, render_mode = MapRenderMode.DIRECT):
         """Create map screen.
         
         Arguments:
@@ -37,9 +60,71 @@ class MapScreen(Screen):
         y_offset - absolute top location on screen
         width - width of screen
         height - height of screen
+        render_mode - how to draw the map (see MapRenderMode)
         
         """
         super(MapScreen, self).__init__(x_offset, y_offset, width, height)
+        if render_mode == MapRenderMode.NUMPY and not numpy_available:
+            raise LogicException("The NumPy map render mode requires NumPy.")
+
+        self.render_mode = render_mode
+        self.con = None     # off-screen console, created on first use
+        self.shadow = None  # what was last drawn to each cell of the off-screen console, indexed [y][x]
+        self.tables = None  # per-TileDef colour/flag arrays for MapRenderMode.NUMPY, indexed by TileDef.index
+        self.last_drawn = None  # (map, map changes, view centre) as of the last render, see check_map()
+        self.terrain = None     # TerrainCache for MapRenderMode.TERRAIN
+        self.runs_key = None    # (visibility array, (x0, y0, x1, y1)) the visible runs were found for
+        self.runs = None        # visible runs of the view, see terrain.visible_runs()
+
+    #
+    # cell_appearance()
+    #
+    def cell_appearance(self, tile, visible):
+        """Work out how to draw a tile.  Tiles which are visible are marked as seen.
+        
+        Arguments:
+        tile - tile to draw
+        visible - whether the tile is in view
+        
+        Returns:
+        tuple of (character, foreground colour, background colour).  The foreground colour is None for blank cells.
+        
+        """
+        if not visible:
+            if tile.seen:
+                return ' ', None, tile.memory_colour
+            else:
+                return ' ', None, libtcod.black
+
+        tile.seen = True
+        
+        # Render entities in the world first
+        if tile.entity:
+            return tile.entity.char, tile.entity.colour, tile.bcolour
+        elif tile.inventory:
+            return tile.inventory.char, tile.inventory.colour, tile.bcolour
+        elif tile.type == TileType.DOOR:
+            return tile.door.char, tile.door.colour, tile.bcolour
+        elif tile.type == TileType.WINDOW:
+            return tile.window.char, tile.window.colour, tile.bcolour
+        elif not tile.blocks_movement:
+            return '.', libtcod.black, tile.bcolour
+        else:
+            return ' ', None, tile.bcolour
+
+    #
+    # check_map()
+    #
+    def check_map(self, map, view_centre):
+        """Mark the screen as dirty if the map has changed, or the view has moved, since it was last drawn.
+        
+        Arguments:
+        map - map to render
+        view_centre - world location the map will be centred on
+        
+        """
+        if self.last_drawn != (map, map.changes, view_centre):
+            self.invalidate()
 
     #
     # render()
@@ -53,8 +138,11 @@ class MapScreen(Screen):
         fov_entity - entity to use for fov calculation
         
         """
-        # Generate field of view map
-        fov_map = map.generate_fov_map(fov_entity)
+        self.last_drawn = map, map.changes, view_centre
+
+        # Generate field of view
+        with profiler.current.phase("fov"):
+            visible_map = map.compute_fov(fov_entity)
         
         # Calculate bounds for rendering
         half_xsize = int(self.width / 2)
@@ -64,47 +152,379 @@ class MapScreen(Screen):
         y0 = view_centre[1] - half_ysize
         x1 = view_centre[0] + half_xsize + 1
         y1 = view_centre[1] + half_ysize + 1
-	
+
+        if self.render_mode == MapRenderMode.DIRTY:
+            self.render_dirty(map, visible_map, x0, y0, x1, y1)
+        elif self.render_mode == MapRenderMode.NUMPY:
+            self.render_numpy(map, visible_map, x0, y0, x1, y1)
+        elif self.render_mode == MapRenderMode.TERRAIN:
+            self.render_terrain(map, visible_map, x0, y0, x1, y1)
+        else:
+            self.render_direct(map, visible_map, x0, y0, x1, y1)
+
+        if map.lighting is not None:
+            self.render_lighting(map, visible_map, x0, y0, x1, y1)
+
+    #
+    # render_direct()
+    #
+    def render_direct(self, map, visible_map, x0, y0, x1, y1):
+        """Render every cell of the map straight onto the root console.
+        
+        Arguments:
+        map - map to render
+        visible_map - fov.FovResult from Map.compute_fov()
+        x0, y0, x1, y1 - world region to render (x1 and y1 exclusive)
+        
+        """
+        visible = visible_map.region(x0, y0, x1, y1)
         for y in range(y0, y1):
             for x in range(x0, x1):
-                
-                tile = map.tiles[x][y]
-                visible = libtcod.map_is_in_fov(fov_map, x, y)
+                char, fore, back = self.cell_appearance(map.tiles[x][y], visible[x - x0][y - y0])
                 
                 # Calculate offset onto screen and render
                 xt = self.x_offset + x - x0
                 yt = self.y_offset + y - y0
 
-                if not visible:
-                    if tile.seen:
-                        # 70% desaturation
-                        greyscale = int(tile.bcolour.r * 0.3 + tile.bcolour.g * 0.59 + tile.bcolour.b * 0.11)
-                        nonviscolour = libtcod.color_lerp(tile.bcolour, libtcod.Color(greyscale, greyscale, greyscale), 0.7)
-                        libtcod.console_set_char_background(0, xt, yt, nonviscolour, libtcod.BKGND_SET)
-                        libtcod.console_put_char(0, xt, yt, ' ', libtcod.BKGND_NONE)
-                    else:
-                        libtcod.console_set_char_background(0, xt, yt, libtcod.black, libtcod.BKGND_SET)
-                        libtcod.console_put_char(0, xt, yt, ' ', libtcod.BKGND_NONE)
-                else:
-                    tile.seen = True
-                    libtcod.console_set_char_background(0, xt, yt, tile.bcolour, libtcod.BKGND_SET)
-                    
-                    # Render entities in the world first
-                    if tile.entity:
-                        libtcod.console_set_default_foreground(0, tile.entity.colour)
-                        libtcod.console_put_char(0, xt, yt, tile.entity.char, libtcod.BKGND_NONE)
-                    elif tile.inventory:
-                        libtcod.console_set_default_foreground(0, tile.inventory.colour)
-                        libtcod.console_put_char(0, xt, yt, tile.inventory.char, libtcod.BKGND_NONE)
-                    elif tile.type == TileType.DOOR:
-                        libtcod.console_set_default_foreground(0, tile.door.colour)
-                        libtcod.console_put_char(0, xt, yt, tile.door.char, libtcod.BKGND_NONE)
-                    elif tile.type == TileType.WINDOW:
-                        libtcod.console_set_default_foreground(0, tile.window.colour)
-                        libtcod.console_put_char(0, xt, yt, tile.window.char, libtcod.BKGND_NONE)
-                    elif not tile.blocks_movement:
-                        libtcod.console_set_default_foreground(0, libtcod.black)
-                        libtcod.console_put_char(0, xt, yt, '.', libtcod.BKGND_NONE)
+                backend.current.console_set_char_background(0, xt, yt, back, libtcod.BKGND_SET)
+                if fore is not None:
+                    backend.current.console_set_default_foreground(0, fore)
+                backend.current.console_put_char(0, xt, yt, char, libtcod.BKGND_NONE)
+
+    #
+    # render_lighting()
+    #
+    def render_lighting(self, map, visible_map, x0, y0, x1, y1):
+        """Darken the background of visible tiles on the root console by their light level.  This is done after the map
+        has been drawn, whatever the render mode, so only the visible tiles which are less than fully lit are touched.
+        
+        Arguments:
+        map - map to render
+        visible_map - fov.FovResult from Map.compute_fov()
+        x0, y0, x1, y1 - world region to render (x1 and y1 exclusive)
+        
+        """
+        visible = visible_map.region(x0, y0, x1, y1)
+        if numpy_available and isinstance(visible, numpy.ndarray):
+            xs, ys = numpy.nonzero(visible)
+            cells = zip((xs + x0).tolist(), (ys + y0).tolist())
+        else:
+            cells = [(x, y) for x in range(x0, x1) for y in range(y0, y1) if visible[x - x0][y - y0]]
+
+        for x, y in cells:
+            level = map.lighting.light_at(x, y)
+            if level < LIGHT_MAX:
+                back = lighting.shade(map.tiles[x][y].bcolour, level)
+                backend.current.console_set_char_background(0, self.x_offset + x - x0, self.y_offset + y - y0, back,
+                                                            libtcod.BKGND_SET)
+
+    #
+    # offscreen_console()
+    #
+    def offscreen_console(self, width, height):
+        """Make sure the off-screen console exists and is the right size.  If it has to be (re)created, the shadow
+        buffer is reset so that every cell is drawn again.
+        
+        Arguments:
+        width - width of console
+        height - height of console
+        
+        """
+        if self.con is None or len(self.shadow) != height or len(self.shadow[0]) != width:
+            if self.con is not None:
+                backend.current.console_delete(self.con)
+            self.con = backend.current.console_new(width, height)
+            self.shadow = [[None] * width for y in range(height)]
+
+    #
+    # render_dirty()
+    #
+    def render_dirty(self, map, visible_map, x0, y0, x1, y1):
+        """Render the map onto an off-screen console, only touching cells which have changed since the last frame, and
+        blit it to the root console.
+        
+        Arguments:
+        map - map to render
+        visible_map - fov.FovResult from Map.compute_fov()
+        x0, y0, x1, y1 - world region to render (x1 and y1 exclusive)
+        
+        """
+        width = x1 - x0
+        height = y1 - y0
+        self.offscreen_console(width, height)
+
+        visible = visible_map.region(x0, y0, x1, y1)
+        for y in range(y0, y1):
+            shadow_row = self.shadow[y - y0]
+            for x in range(x0, x1):
+                char, fore, back = self.cell_appearance(map.tiles[x][y], visible[x - x0][y - y0])
+                if fore is None:
+                    fore = libtcod.black
+                
+                cell = char, fore.r, fore.g, fore.b, back.r, back.g, back.b
+                if shadow_row[x - x0] != cell:
+                    shadow_row[x - x0] = cell
+                    backend.current.console_put_char_ex(self.con, x - x0, y - y0, char, fore, back)
+
+        backend.current.console_blit(self.con, 0, 0, width, height, 0, self.x_offset, self.y_offset)
+
+    #
+    # tile_tables()
+    #
+    def tile_tables(self):
+        """Get arrays of TileDef attributes, indexed by TileDef.index, for looking up a whole view of tiles at once.
+        They are rebuilt if more tile definitions have been created, or the memory desaturation has changed.
+        
+        Returns:
+        dictionary of 'bcolour' and 'memory_colour' ((n, 3) arrays) and 'block_move' ((n,) array)
+        
+        """
+        key = len(TileDef.all), tile.memory_desaturation
+        if self.tables is None or self.tables['key'] != key:
+            self.tables = {
+                'key'           : key,
+                'bcolour'       : numpy.array([(d.bcolour.r, d.bcolour.g, d.bcolour.b) for d in TileDef.all], dtype = numpy.intc),
+                'memory_colour' : numpy.array([(d.memory_colour.r, d.memory_colour.g, d.memory_colour.b) for d in TileDef.all], dtype = numpy.intc),
+                'block_move'    : numpy.array([d.block_move for d in TileDef.all], dtype = numpy.bool_)
+            }
+        return self.tables
+
+    #
+    # render_numpy()
+    #
+    def render_numpy(self, map, visible_map, x0, y0, x1, y1):
+        """Render the map by composing the whole view as NumPy arrays: terrain colours, remembered tiles, the FOV mask
+        and then glyph layers for windows, doors, items and entities.  The arrays are pushed to an off-screen console with
+        one bulk fill each for background, foreground and characters, and blitted to the root console.
+        
+        Arguments:
+        map - map to render
+        visible_map - fov.FovResult from Map.compute_fov()
+        x0, y0, x1, y1 - world region to render (x1 and y1 exclusive)
+        
+        """
+        width = x1 - x0
+        height = y1 - y0
+        self.offscreen_console(width, height)
+        tables = self.tile_tables()
+
+        # Terrain and fog of war.  Arrays are indexed [x, y] until they are pushed.
+        visible = numpy.asarray(visible_map.region(x0, y0, x1, y1), dtype = numpy.bool_)
+        map.mark_seen(x0, y0, visible)
+        tdefs, seen = map.tile_window(x0, y0, x1, y1)
+
+        back = numpy.zeros((width, height, 3), dtype = numpy.intc)
+        back[seen] = tables['memory_colour'][tdefs[seen]]
+        back[visible] = tables['bcolour'][tdefs[visible]]
+
+        # Glyphs.  Visible open floor gets a black '.', then each layer overwrites the last, so that entities are drawn
+        # over items, which are drawn over doors and windows.
+        chars = numpy.empty((width, height), dtype = numpy.intc)
+        chars[:] = ord(' ')
+        chars[visible & ~tables['block_move'][tdefs]] = ord('.')
+        fore = numpy.zeros((width, height, 3), dtype = numpy.intc)
+
+        fixtures = map.fixtures.in_rect(x0, y0, x1 - 1, y1 - 1)
+        things = map.entities.in_rect(x0, y0, x1 - 1, y1 - 1)
+        layers = ([f for f in fixtures if map.tiles[f.x][f.y].type == TileType.WINDOW],
+                  [f for f in fixtures if map.tiles[f.x][f.y].type == TileType.DOOR],
+                  [e for e in things if map.tiles[e.x][e.y].inventory is e],
+                  [e for e in things if map.tiles[e.x][e.y].entity is e])
+        for layer in layers:
+            for e in layer:
+                vx, vy = e.x - x0, e.y - y0
+                if visible[vx, vy]:
+                    chars[vx, vy] = e.char if isinstance(e.char, int) else ord(e.char)
+                    fore[vx, vy] = e.colour.r, e.colour.g, e.colour.b
+
+        # Push to the console, which is stored row by row, so transpose to [y, x] first.
+        backend.current.console_fill_background(self.con, back[..., 0].T.ravel(), back[..., 1].T.ravel(), back[..., 2].T.ravel())
+        backend.current.console_fill_foreground(self.con, fore[..., 0].T.ravel(), fore[..., 1].T.ravel(), fore[..., 2].T.ravel())
+        backend.current.console_fill_char(self.con, chars.T.ravel())
+        backend.current.console_blit(self.con, 0, 0, width, height, 0, self.x_offset, self.y_offset)
+
+        # The shadow buffer no longer matches the console.
+        self.shadow = [[None] * width for y in range(height)]
+
+    #
+    # render_terrain()
+    #
+    def render_terrain(self, map, visible_map, x0, y0, x1, y1):
+        """Render the map from pre-rendered terrain: blit the remembered terrain for the whole view, then the lit terrain
+        for each run of visible tiles, then draw the visible windows, doors, items and entities over it.  Tiles are marked
+        as seen when the field of view changes, rather than every frame.
+        
+        Arguments:
+        map - map to render
+        visible_map - fov.FovResult from Map.compute_fov()
+        x0, y0, x1, y1 - world region to render (x1 and y1 exclusive)
+        
+        """
+        if self.terrain is None or self.terrain.map is not map:
+            if self.terrain is not None:
+                self.terrain.close()
+            self.terrain = TerrainCache(map)
+            self.runs_key = None
+
+        # The field of view has changed - find the visible runs, and mark what is in them as seen.
+        region = x0, y0, x1, y1
+        if self.runs_key is None or self.runs_key[0] is not visible_map or self.runs_key[1] != region:
+            self.runs_key = visible_map, region
+            self.runs = visible_runs(visible_map, x0, y0, x1, y1)
+            for y, start, end in self.runs:
+                for x in range(start, end):
+                    self.terrain.mark_seen(x, y)
+
+        self.terrain.blit_memory(x0, y0, x1, y1, self.x_offset, self.y_offset)
+        for y, start, end in self.runs:
+            self.terrain.blit_lit(start, y, end, y + 1, self.x_offset + start - x0, self.y_offset + y - y0)
+
+        # Dynamic objects: only the visible tiles with an entity, item, door or window on them are drawn cell by cell.
+        cells = set((e.x, e.y) for e in map.fixtures.in_rect(x0, y0, x1 - 1, y1 - 1))
+        cells.update((e.x, e.y) for e in map.entities.in_rect(x0, y0, x1 - 1, y1 - 1))
+        for x, y in cells:
+            if visible_map.is_visible(x, y):
+                char, fore, back = self.cell_appearance(map.tiles[x][y], True)
+                backend.current.console_put_char_ex(0, self.x_offset + x - x0, self.y_offset + y - y0, char,
+                                                    fore if fore is not None else libtcod.black, back)
+
+#
+# MinimapScreen
+#
+class MinimapScreen(Screen):
+    """Overview of the explored parts of the map.  The map is scaled down onto an image at two pixels per console cell
+    each way (see libtcod.image_blit_2x()).  Each pixel covers a square block of tiles, and is only worked out again when
+    one of its tiles may have changed: when it comes into view, or when the map reports a change to it.
+    """
+
+    #
+    # __init__()
+    #
+    def __init__(self, x_offset, y_offset, width, height):
+        """Create minimap screen.
+        
+        Arguments:
+        x_offset - absolute left location on screen
+        y_offset - absolute top location on screen
+        width - width of screen
+        height - height of screen
+        
+        """
+        super(MinimapScreen, self).__init__(x_offset, y_offset, width, height)
+        self.map = None            # map the image is of
+        self.image = None          # libtcod image, two pixels per cell each way
+        self.scale = 1             # width and height (in tiles) of the block each pixel covers
+        self.stale = set()         # (px, py) of pixels which need working out again
+        self.last_visible = None   # FOV result the image was last updated from
+        self.viewer_pixel = None   # pixel the viewer was last drawn on
+        self.last_drawn = None     # (map, map changes) as of the last render, see check_map()
+
+    #
+    # check_map()
+    #
+    def check_map(self, map):
+        """Mark the screen as dirty if the map has changed since it was last drawn.
+        
+        Arguments:
+        map - map to render
+        
+        """
+        if self.last_drawn != (map, map.changes):
+            self.invalidate()
+
+    #
+    # set_map()
+    #
+    def set_map(self, map):
+        """Start showing a (different) map.  The image is recreated, and every pixel will be worked out on the next render.
+        
+        Arguments:
+        map - map to show
+        
+        """
+        if self.map is not None:
+            self.map.tile_watchers.remove(self.tile_changed)
+        if self.image is not None:
+            backend.current.image_delete(self.image)
+
+        pixels_x, pixels_y = self.width * 2, self.height * 2
+        self.map = map
+        self.scale = max(1, -(-map.x_max // pixels_x), -(-map.y_max // pixels_y))
+        self.image = backend.current.image_new(pixels_x, pixels_y)
+        self.stale = set((px, py) for px in range(-(-map.x_max // self.scale)) for py in range(-(-map.y_max // self.scale)))
+        self.last_visible = None
+        self.viewer_pixel = None
+        map.tile_watchers.append(self.tile_changed)
+
+    #
+    # tile_changed()
+    #
+    def tile_changed(self, x, y):
+        """Called by the map when a tile may have changed."""
+        self.stale.add((x // self.scale, y // self.scale))
+
+    #
+    # pixel_colour()
+    #
+    def pixel_colour(self, px, py):
+        """Work out the colour of a pixel: black if none of its tiles have been seen, otherwise the colour of the seen
+        tiles, with tiles that block movement (ie walls) taking priority so that outlines show up.
+        
+        Arguments:
+        px - x-position of pixel
+        py - y-position of pixel
+        
+        """
+        colour = libtcod.black
+        tiles = self.map.tiles
+        for x in range(px * self.scale, min(self.map.x_max, (px + 1) * self.scale)):
+            column = tiles[x]
+            for y in range(py * self.scale, min(self.map.y_max, (py + 1) * self.scale)):
+                tile = column[y]
+                if tile.seen:
+                    if tile.block_move:
+                        return tile.bcolour
+                    colour = tile.bcolour
+        return colour
+
+    #
+    # render()
+    #
+    def render(self, map, fov_entity):
+        """Render minimap.  This should come after the map screen has been rendered, as that marks tiles as seen.
+        
+        Arguments:
+        map - map to render
+        fov_entity - entity whose view is shown, and whose position is marked
+        
+        """
+        if map is not self.map:
+            self.set_map(map)
+        self.last_drawn = map, map.changes
+
+        # Tiles in view may have been seen for the first time.  The FOV is cached by the map, so this is the same result
+        # until the view changes.
+        visible = map.compute_fov(fov_entity)
+        if visible is not self.last_visible:
+            self.last_visible = visible
+            for px in range(visible.x0 // self.scale, (visible.x1 - 1) // self.scale + 1):
+                for py in range(visible.y0 // self.scale, (visible.y1 - 1) // self.scale + 1):
+                    self.stale.add((px, py))
+
+        # Move the viewer's marker
+        viewer_pixel = fov_entity.x // self.scale, fov_entity.y // self.scale
+        if viewer_pixel != self.viewer_pixel:
+            if self.viewer_pixel is not None:
+                self.stale.add(self.viewer_pixel)
+            self.viewer_pixel = viewer_pixel
+            self.stale.add(viewer_pixel)
+
+        for px, py in self.stale:
+            colour = libtcod.white if (px, py) == viewer_pixel else self.pixel_colour(px, py)
+            backend.current.image_put_pixel(self.image, px, py, colour)
+        self.stale.clear()
+
+        backend.current.image_blit_2x(self.image, 0, self.x_offset, self.y_offset)
 
 #
 # MessageScreebn
@@ -115,7 +535,7 @@ class MessageScreen(Screen):
     #
     # __init__()
     #
-    def __init__(self, x_offset, y_offset, width, height):
+    def __init__(self, x_offset, y_offset, width, height, max_messages = MESSAGE_HISTORY, spill_file = None):
         """Create message screen.
         
         Arguments:
@@ -123,10 +543,12 @@ class MessageScreen(Screen):
         y_offset - absolute top location on screen
         width - width of screen
         height - height of screen
+        max_messages - number of messages to keep (see MessageLog)
+        spill_file - file to write older messages to, or None
         
         """
         super(MessageScreen, self).__init__(x_offset, y_offset, width, height)
-        self.messages = []
+        self.log = MessageLog(width, max_messages, spill_file)
                         
     #
     # add_message()
@@ -138,28 +560,21 @@ class MessageScreen(Screen):
         msg - message
         
         """
-        self.messages.append(msg)
+        self.log.add(msg)
+        self.invalidate()
         
     #
     # render()
     #
     def render(self):
-        """Render message window.
+        """Render message window.  Newer messages are brighter."""
+        self.clear()
 
-        TODO: split messages which are too long to fit on one line!
-        """
-        msg_count = self.height - 1
-        draw_msgs = self.messages[-msg_count:]
-        
-        lindex = cindex = cindex0 = len(draw_msgs) - 1
-        for msg in reversed(draw_msgs):
-            colour = 255 - (cindex0 - cindex) * 40
-            libtcod.console_set_default_foreground(0, libtcod.Color(colour, colour, colour))
-            
-            # Pad message to fill the window so we overwrite any previous characters.
-            libtcod.console_print(0, self.x_offset, self.y_offset + lindex, msg.ljust(self.width))
-            cindex -= 1
-            lindex -= 1
+        lines = self.log.recent(self.height - 1)
+        for lindex, (age, line) in enumerate(lines):
+            colour = 255 - age * 40
+            backend.current.console_set_default_foreground(0, libtcod.Color(colour, colour, colour))
+            backend.current.console_print(0, self.x_offset, self.y_offset + lindex, line)
 
 #
 # InventoryScreen
@@ -181,8 +596,19 @@ class InventoryScreen(Screen):
         
         """
         super(InventoryScreen, self).__init__(x_offset, y_offset, width, height)
-        self.action_filter = None
-        self.char_entity_map = {}
+        self._action_filter = None
+        self.view = None          # InventoryView of the inventory last shown
+        self.char_entity_map = {}  # character code -> item, for the inventory last shown
+
+    @property
+    def action_filter(self):
+        """Gets the action the inventory is being shown for, eg "drop", or None."""
+        return self._action_filter
+
+    @action_filter.setter
+    def action_filter(self, value):
+        self._action_filter = value
+        self.invalidate()
     
     #
     # show_and_activate()
@@ -196,54 +622,68 @@ class InventoryScreen(Screen):
         """
         super(InventoryScreen, self).show_and_activate()
         self.action_filter = filter
+
+    #
+    # hide_and_deactivate()
+    #
+    def hide_and_deactivate(self):
+        """The inventory is drawn over the map, so the map needs redrawing once it is hidden."""
+        super(InventoryScreen, self).hide_and_deactivate()
+        if Screens.map is not None:
+            Screens.map.invalidate()
     
     #
-    # render_inventory_types()
+    # get_view()
+    #
+    def get_view(self, inventory):
+        """Get the view model of an inventory, rebuilding it only if the inventory has changed since it was built.
+        
+        Arguments:
+        inventory - the Inventory to show
+        
+        """
+        if self.view is None or self.view.inventory is not inventory or not self.view.current:
+            self.view = InventoryView(inventory)
+            self.char_entity_map = self.view.char_entity_map
+        return self.view
+
+    #
+    # render_section()
     #
-    def render_types(self, inventory, x_offset, y_offset, type, name, char_list):
-        """Helper method to render a set of items of a particular type from an inventory.
+    def render_section(self, view, x_offset, y_offset, name, entries):
+        """Helper method to render a section (items of one type) of an inventory.
         
         Arguments:
-        inventory - the inventory to render
+        view - the InventoryView being rendered
         x_offset - screen x-location (absolute) to start at
         y_offset - screen y-location (absolute) to start at
-        type - the EntityType of the inventory items to select
-        name - the text header to display for this type
-        char_list - the list of characters (subset of [A-Za-z]) to use for these entities.
+        name - the text header to display for this section
+        entries - the section's (char, item) list
         
         Returns:
-        number of items rendered.
+        number of rows used by items, at least 1.
         
         """
-        types = [elem for elem in inventory if elem.type == type]
-
-        libtcod.console_set_default_foreground(0, libtcod.white)
-        libtcod.console_print(0, x_offset, y_offset, name)
+        backend.current.console_set_default_foreground(0, libtcod.white)
+        backend.current.console_print(0, x_offset, y_offset, name)
         
         # If there are none to display, then print '(none)' in grey
-        if len(types) == 0:
-            libtcod.console_set_default_foreground(0, libtcod.gray)
-            libtcod.console_print(0, x_offset, y_offset + 2, "(none)")
-            return 0
-        else:
-            index = 0
-            for item in types:
-                if self.action_filter:
-                  func = self.action_filter.lower() + "_me"
-                  if hasattr(item, func):
-                      libtcod.console_set_default_foreground(0, libtcod.white)
-                  else:
-                      libtcod.console_set_default_foreground(0, libtcod.gray)
-                      
-                entity_char = char_list[index]
-                item_string = "{0} {1}".format(entity_char, item.name)
-                
-                # Add char->entity mapping for lookup and print
-                self.char_entity_map[ord(entity_char)] = item
-                libtcod.console_print(0, x_offset, y_offset + 2 + index, item_string)
-                index += 1
+        if not entries:
+            backend.current.console_set_default_foreground(0, libtcod.gray)
+            backend.current.console_print(0, x_offset, y_offset + 2, "(none)")
+            return 1
+
+        # Items which would fall off the bottom of the screen are not drawn.
+        visible = max(0, min(len(entries), self.y_offset + self.height - (y_offset + 2)))
+        for index, (entity_char, item) in enumerate(entries[:visible]):
+            if self.action_filter and not view.applies(item, self.action_filter):
+                backend.current.console_set_default_foreground(0, libtcod.gray)
+            else:
+                backend.current.console_set_default_foreground(0, libtcod.white)
+            item_string = "{0} {1}".format(entity_char or " ", item.name)
+            backend.current.console_print(0, x_offset, y_offset + 2 + index, item_string)
         
-            return len(types)
+        return len(entries)
                 
     #
     # render()
@@ -256,22 +696,22 @@ class InventoryScreen(Screen):
         
         """
         # Background
-        libtcod.console_set_default_background(0, libtcod.black)
-        libtcod.console_set_default_foreground(0, libtcod.black)
-        libtcod.console_rect(0, self.x_offset, self.y_offset, self.width, self.height, True, libtcod.BKGND_SET)
+        backend.current.console_set_default_background(0, libtcod.black)
+        backend.current.console_set_default_foreground(0, libtcod.black)
+        backend.current.console_rect(0, self.x_offset, self.y_offset, self.width, self.height, True, libtcod.BKGND_SET)
         
-        libtcod.console_set_default_foreground(0, libtcod.white)
-        libtcod.console_print(0, self.x_offset + 1, self.y_offset + 1, entity.name)
+        backend.current.console_set_default_foreground(0, libtcod.white)
+        backend.current.console_print(0, self.x_offset + 1, self.y_offset + 1, entity.name)
         
         if entity.inventory is None:
-            libtcod.console_print(0, self.x_offset + 1, self.y_offset + 3, "This entity has no inventory.  %s" % DEBUG_MSG)
+            backend.current.console_print(0, self.x_offset + 1, self.y_offset + 3, "This entity has no inventory.  %s" % DEBUG_MSG)
         else:
-            char_list = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
-            
+            view = self.get_view(entity.inventory)
+
             # Draw actions text - highlight the selected one
-            libtcod.console_set_color_control(libtcod.COLCTRL_1, libtcod.blue, libtcod.black)
-            libtcod.console_set_color_control(libtcod.COLCTRL_2, libtcod.blue, libtcod.white)
-            libtcod.console_set_color_control(libtcod.COLCTRL_3, libtcod.black, libtcod.white)
+            backend.current.console_set_color_control(libtcod.COLCTRL_1, libtcod.blue, libtcod.black)
+            backend.current.console_set_color_control(libtcod.COLCTRL_2, libtcod.blue, libtcod.white)
+            backend.current.console_set_color_control(libtcod.COLCTRL_3, libtcod.black, libtcod.white)
 
             action_text = "%cU%cse%c   %cD%crop%c   %cT%chrow%c   %cC%consume%c   %cE%cquip%c   %cW%cear%c"
             action_text_format = [libtcod.COLCTRL_1, libtcod.COLCTRL_STOP, libtcod.COLCTRL_STOP] * 6
@@ -281,29 +721,13 @@ class InventoryScreen(Screen):
                 action_text_format[index * 3 + 1] = libtcod.COLCTRL_3
                           
             action_text = action_text % tuple(action_text_format)
-            libtcod.console_print(0, self.x_offset + 1, self.y_offset + 3, action_text)
+            backend.current.console_print(0, self.x_offset + 1, self.y_offset + 3, action_text)
             
-            # Set up screen offsets for rendering
-            lcol = self.x_offset + 1
-            rcol = self.x_offset + 25
-            lrow = rrow = self.y_offset + 5
-        
-            # In the case of no items, render_types will return 0, but still render a line (none) - so we need to
-            # take this line into account when adjusting offsets.
-            char_index      = 0
-            num_weapons     = self.render_types(entity.inventory, lcol, lrow, EntityType.WEAPON, "WEAPONS", char_list[char_index:])
-            lrow           += max(1, num_weapons) + 3
-            char_index     += num_weapons
-            num_clothing    = self.render_types(entity.inventory, rcol, rrow, EntityType.CLOTHING, "CLOTHING", char_list[char_index:])
-            rrow           += max(1, num_clothing) + 3
-            char_index     += num_clothing
-            num_comestibles = self.render_types(entity.inventory, lcol, lrow, EntityType.COMESTIBLE, "COMESTIBLES", char_list[char_index:])
-            lrow           += max(1, num_comestibles) + 3
-            char_index     += num_comestibles
-            num_medecine    = self.render_types(entity.inventory, rcol, rrow, EntityType.MEDECINE, "MEDECINE", char_list[char_index:])
-            rrow           += max(1, num_medecine) + 3
-            char_index     += num_medecine
-            num_other       = self.render_types(entity.inventory, lcol, lrow, EntityType.OTHER, "OTHER", char_list[char_index:])
+            # Lay the sections out in two columns.  A section with no items still takes a line, for '(none)'.
+            columns = self.x_offset + 1, self.x_offset + 25
+            rows = [self.y_offset + 5, self.y_offset + 5]
+            for name, column, entries in view.sections:
+                rows[column] += self.render_section(view, columns[column], rows[column], name, entries) + 3
                         
 #
 # Screens
@@ -312,9 +736,19 @@ class Screens:
     """This class holds screen instances for global access via class attributes."""
     
     map = None
+    mini = None
     msg = None
     inv = None
 
+#
+# invalidate_all()
+#
+def invalidate_all():
+    """Mark every screen as needing to be drawn again, eg after the whole console has been disturbed."""
+    for screen in (Screens.map, Screens.mini, Screens.msg, Screens.inv):
+        if screen is not None:
+            screen.invalidate()
+
 #
 # render_entity_info()
 #